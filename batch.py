@@ -0,0 +1,297 @@
+"""
+Headless batch mode: run recordings through the whole pipeline (denoise,
+transcribe, revise, SVG) without the button, several files at a time.
+
+Usage:
+    python batch.py recordings/ [more files or directories] [-o batch_output] [-j 2]
+    python batch.py --manifest files.txt
+
+Each worker process keeps its own whisper server. For every input a.wav the
+output directory gets a.svg (and a.gcode with --gcode), and a.json with the
+transcript, the revised text and the time each stage took. summary.json
+sums the stage timings over the run.
+
+Runs resume where they left off: a file whose a.json says it was finished
+with the same font, layout and model settings is skipped. After changing
+the font or the prompt, the files are processed again; --force redoes
+everything.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shlex
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import tracing
+
+logger = logging.getLogger("batch")
+
+
+def find_recordings(paths, manifest=None):
+    """
+    List the WAV files to process.
+
+    Args:
+        paths: Files and directories (searched recursively for .wav files;
+               the *_reduced.wav copies the pipeline archives are left out)
+        manifest: Text file with one path per line (relative to the manifest,
+                  # starts a comment)
+
+    Returns:
+        list of file paths, in order, without duplicates
+    """
+    paths = list(paths)
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest) as file:
+            for line in file:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    paths.append(os.path.join(base, line))
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                found.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith(".wav") and not name.endswith("_reduced.wav"))
+        else:
+            found.append(path)
+    return list(dict.fromkeys(found))
+
+
+def output_names(files):
+    """A unique output name (the file name without extension) for each input"""
+    names = {}
+    used = set()
+    for path in files:
+        name = os.path.splitext(os.path.basename(path))[0]
+        candidate, number = name, 1
+        while candidate in used:
+            number += 1
+            candidate = f"{name}-{number}"
+        used.add(candidate)
+        names[path] = candidate
+    return names
+
+
+def settings_fingerprint(options):
+    """Hash of everything that changes the output of a recording"""
+    import control
+    import revise
+
+    settings = {
+        "font": os.path.abspath(options["font"]),
+        "layout": control.layout_options,
+        "revise": options["revise"],
+        "model": revise.MODEL_NAME,
+        "prompt": revise.PROMPT_TEMPLATE,
+        "whisper_model": control.whisper_model,
+        "gcode": options["gcode"],
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def is_done(record_path, source, fingerprint):
+    """True if record_path says source was already processed with these settings"""
+    try:
+        with open(record_path) as file:
+            record = json.load(file)
+    except (OSError, ValueError):
+        return False
+    stat = os.stat(source)
+    return (record.get("status") in ("ok", "no speech") and record.get("settings") == fingerprint
+            and record.get("source_size") == stat.st_size and record.get("source_mtime") == stat.st_mtime)
+
+
+def _init_worker(options):
+    """Configure control.py in a worker process"""
+    import control
+    import revise
+    from multiprocessing.util import Finalize
+    from whisper_worker import WhisperPool
+
+    tracing.configure(options["log_level"])
+    control.font_path = options["font"]
+    control.save_denoised_audio = False
+    # Files are processed in parallel, so each one gets a single whisper process
+    control.transcribe_processes = 1
+    control.whisper_threads = options["threads"]
+    if options["whisper_cli"]:
+        control.use_whisper_server = False
+    else:
+        kwargs = dict(port=None, threads=options["threads"])
+        if options["whisper_command"]:
+            kwargs["command"] = shlex.split(options["whisper_command"])
+        else:
+            kwargs.update(server=control.whisper_server, model=control.whisper_model)
+        try:
+            control.whisper_worker = WhisperPool(1, **kwargs).start()
+        except Exception as e:
+            logging.getLogger("batch").warning("Could not start a whisper server, using whisper-cli: %s", e)
+            control.use_whisper_server = False
+        else:
+            # Stop the server when the pool shuts this worker down
+            Finalize(control.whisper_worker, control.whisper_worker.stop, exitpriority=10)
+    if options["ollama_url"]:
+        revise.OLLAMA_API_URL = options["ollama_url"]
+
+
+def process_file(source, name, options):
+    """
+    Run one recording through the pipeline.
+
+    Returns:
+        dict: The file's record (also written to <output_dir>/<name>.json)
+    """
+    import control
+
+    output_dir = options["output_dir"]
+    stat = os.stat(source)
+    record = {"source": source, "name": name, "status": "failed", "settings": options["settings"],
+              "source_size": stat.st_size, "source_mtime": stat.st_mtime}
+    trace = tracing.Trace(name)
+    try:
+        with tracing.use_trace(trace):
+            audio, segments = control.prepare_audio(source)
+            record["speech_seconds"] = round(len(audio) / control.RATE, 3)
+            if not len(audio):
+                record["status"] = "no speech"
+            else:
+                transcript = control.transcribe_text(audio, segments)
+                text = control.revise_text(transcript) if options["revise"] else transcript
+                plan = control.layout_text(text)
+                svg_filename = os.path.join(output_dir, name + ".svg")
+                gcode_filename = os.path.join(output_dir, name + ".gcode") if options["gcode"] else None
+                if control.write_outputs(text, plan, svg_filename, gcode_filename) is None:
+                    raise RuntimeError("the SVG could not be written")
+                record.update(status="ok", transcript=transcript, text=text, svg=svg_filename, gcode=gcode_filename)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    result = trace.record()
+    record["total"] = result["total"]
+    record["stages"] = result["stages"]
+
+    # Written last and atomically: a record on disk means the file is finished
+    record_path = os.path.join(output_dir, name + ".json")
+    with open(record_path + ".tmp", "w") as file:
+        json.dump(record, file, indent=2)
+    os.replace(record_path + ".tmp", record_path)
+    return record
+
+
+def summarize(records, skipped, wall_time, workers):
+    """Totals and per-stage timings of a run"""
+    stages = {}
+    for record in records:
+        for stage, seconds in record.get("stages", {}).items():
+            stages.setdefault(stage, []).append(seconds)
+    statuses = {}
+    for record in records:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    return {
+        "processed": len(records),
+        "skipped": skipped,
+        "statuses": statuses,
+        "workers": workers,
+        "wall_time": round(wall_time, 3),
+        "files_per_minute": round(len(records) / wall_time * 60, 2) if wall_time and records else 0.0,
+        "stages": {stage: {"total": round(sum(times), 3), "mean": round(sum(times) / len(times), 3),
+                           "max": round(max(times), 3), "files": len(times)}
+                   for stage, times in stages.items()},
+        "files": [{key: record.get(key) for key in ("name", "source", "status", "total", "stages", "error")}
+                  for record in records],
+    }
+
+
+def run_batch(files, output_dir, workers=2, threads=2, font=None, revise=True, gcode=False, force=False,
+              whisper_command=None, whisper_cli=False, ollama_url=None, log_level="INFO"):
+    """
+    Process recordings with a pool of worker processes.
+
+    Returns:
+        dict: The summary (also written to <output_dir>/summary.json)
+    """
+    import control
+
+    os.makedirs(output_dir, exist_ok=True)
+    if font is None:
+        # control.font_path is relative to the repository
+        font = os.path.join(os.path.dirname(os.path.abspath(control.__file__)), control.font_path)
+    options = dict(output_dir=os.path.abspath(output_dir), threads=threads, font=font,
+                   revise=revise, gcode=gcode, whisper_command=whisper_command, whisper_cli=whisper_cli,
+                   ollama_url=ollama_url, log_level=log_level)
+    options["settings"] = settings_fingerprint(options)
+
+    names = output_names(files)
+    todo = [path for path in files
+            if force or not is_done(os.path.join(output_dir, names[path] + ".json"), path, options["settings"])]
+    skipped = len(files) - len(todo)
+    if skipped:
+        logger.info("Skipping %d files that are already done", skipped)
+
+    records = []
+    start = time.perf_counter()
+    if todo:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo)), mp_context=context,
+                                 initializer=_init_worker, initargs=(options,)) as executor:
+            futures = {executor.submit(process_file, path, names[path], options): path for path in todo}
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {"source": path, "name": names[path], "status": "failed", "error": str(e)}
+                records.append(record)
+                logger.info("[%d/%d] %s: %s%s", done, len(todo), path, record["status"],
+                            f" ({record['error']})" if record.get("error") else "")
+    wall_time = time.perf_counter() - start
+
+    summary = summarize(sorted(records, key=lambda record: files.index(record["source"])),
+                        skipped, wall_time, workers)
+    with open(os.path.join(output_dir, "summary.json"), "w") as file:
+        json.dump(summary, file, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process recordings without the button")
+    parser.add_argument("inputs", nargs="*", help="WAV files or directories of them")
+    parser.add_argument("--manifest", help="Text file listing one recording per line")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="Where the outputs go")
+    parser.add_argument("-j", "--workers", type=int, default=2, help="Recordings processed at the same time")
+    parser.add_argument("-t", "--threads", type=int, default=2, help="whisper threads per worker")
+    parser.add_argument("--font", help="Font file for the SVG (default: control.font_path)")
+    parser.add_argument("--no-revise", dest="revise", action="store_false", help="Skip the grammar revision")
+    parser.add_argument("--gcode", action="store_true", help="Also write G-code")
+    parser.add_argument("--force", action="store_true", help="Process files that are already done")
+    parser.add_argument("--whisper-command", help="Command to start the whisper server "
+                                                  "(e.g. 'python fakes.py whisper-server')")
+    parser.add_argument("--whisper-cli", action="store_true", help="Use whisper-cli instead of a server")
+    parser.add_argument("--ollama-url", help="Ollama generate endpoint (default: revise.OLLAMA_API_URL)")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    tracing.configure(args.log_level)
+    files = find_recordings(args.inputs, args.manifest)
+    if not files:
+        parser.error("no recordings given")
+    summary = run_batch(files, args.output_dir, workers=args.workers, threads=args.threads, font=args.font,
+                        revise=args.revise, gcode=args.gcode, force=args.force,
+                        whisper_command=args.whisper_command, whisper_cli=args.whisper_cli,
+                        ollama_url=args.ollama_url, log_level=args.log_level)
+    logger.info("%d files processed, %d skipped in %.1f s: %s", summary["processed"], summary["skipped"],
+                summary["wall_time"], summary["statuses"])
+    for stage, timing in summary["stages"].items():
+        logger.info("  %-10s total %7.2f s  mean %6.2f s", stage, timing["total"], timing["mean"])
+    return 0 if all(record["status"] != "failed" for record in summary["files"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+"""
+Denoise quality sweep: score noise reduction settings on a corpus of clips
+by PESQ, STOI and runtime, to find the fastest settings that still sound good.
+
+Usage:
+    python benchmarks/denoise_eval.py --clean clean/ --noisy noisy/ [--grid prop_decrease=0.5,0.75,1 n_fft=512,1024]
+    python benchmarks/denoise_eval.py --synthetic 8 [--snr 5] [--min-pesq 2.0 --min-stoi 0.85] [--json FILE]
+
+Clips are pairs of 16-bit mono WAV files with the same name in --clean and
+--noisy (or --synthetic generates speech-like clips and noisy copies). Each
+--grid entry is a reduce_noise_in_audio setting with the values to try
+(n_fft, stationary, engine, n_std_thresh_stationary, time_mask_smooth_ms, ...);
+every combination is run on every clip in a pool of worker processes.
+
+The clips are memory-mapped, so each one is read once however many settings
+use it. Denoised clips are cached in --cache-dir by clip and settings: a
+repeated or extended sweep only runs the settings it hasn't seen and reports
+the runtime measured the first time. Runtimes are wall-clock seconds per clip
+inside a worker; use -j 1 for timings without other workers competing.
+
+PESQ and STOI need the pesq and pystoi packages (see requirements.txt);
+without them those columns are empty. SI-SDR (scale-invariant
+signal-to-distortion ratio, in dB) is always computed. The "none" row
+scores the noisy clips themselves.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+logger = logging.getLogger("denoise_eval")
+
+RATE = 16000
+DEFAULT_GRID = ["prop_decrease=0.5,0.75,1.0", "n_fft=512,1024", "n_std_thresh_stationary=1.0,1.5,2.0"]
+METRICS = ["pesq", "stoi", "si_sdr"]
+
+# Clips memory-mapped by this process, by path
+_clips = {}
+
+
+def parse_value(text):
+    """A grid value: int, float, true/false or a string"""
+    lowered = text.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_grid(entries):
+    """
+    Turn ["name=v1,v2", ...] into the list of settings dicts to try.
+
+    Returns:
+        list of dicts, every combination of the values
+    """
+    names, values = [], []
+    for entry in entries:
+        name, _, options = entry.partition("=")
+        if not name or not options:
+            raise ValueError(f"grid entries look like name=value1,value2, not {entry!r}")
+        names.append(name.strip())
+        values.append([parse_value(option.strip()) for option in options.split(",")])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def settings_name(settings):
+    """Short label of a settings dict"""
+    if settings is None:
+        return "none"
+    return " ".join(f"{name}={value}" for name, value in settings.items()) or "defaults"
+
+
+def find_clips(clean_dir, noisy_dir):
+    """Pairs (name, clean path, noisy path) of the WAV files found in both directories"""
+    clips = []
+    for name in sorted(os.listdir(noisy_dir)):
+        clean = os.path.join(clean_dir, name)
+        if name.lower().endswith(".wav") and os.path.exists(clean):
+            clips.append((os.path.splitext(name)[0], clean, os.path.join(noisy_dir, name)))
+    return clips
+
+
+def make_synthetic_clips(directory, count, seconds, snr_db, seed=0):
+    """
+    Write count clean clips and noisy copies (white noise plus mains hum at
+    snr_db) to directory/clean and directory/noisy
+
+    Returns:
+        tuple: (clean directory, noisy directory)
+    """
+    import numpy as np
+
+    from noise import write_wav
+    from pipeline_bench import synthetic_speech
+
+    clean_dir = os.path.join(directory, "clean")
+    noisy_dir = os.path.join(directory, "noisy")
+    os.makedirs(clean_dir, exist_ok=True)
+    os.makedirs(noisy_dir, exist_ok=True)
+    for number in range(count):
+        rng = np.random.default_rng(seed + number)
+        clean = synthetic_speech(seconds, RATE, snr_db=60, seed=seed + number).astype(np.float64)
+        t = np.arange(len(clean)) / RATE
+        noise = rng.normal(0, 1, len(clean)) + 0.5 * np.sin(2 * np.pi * 50 * t)
+        noise *= np.sqrt(np.mean(clean ** 2) / np.mean(noise ** 2)) * 10 ** (-snr_db / 20)
+        noisy = clean + noise
+        scale = 0.9 * 32767 / max(np.max(np.abs(noisy)), 1)
+        name = f"synthetic_{number}.wav"
+        write_wav(os.path.join(clean_dir, name), RATE, np.rint(clean * scale).astype(np.int16))
+        write_wav(os.path.join(noisy_dir, name), RATE, np.rint(noisy * scale).astype(np.int16))
+    return clean_dir, noisy_dir
+
+
+def load_clip(path):
+    """Memory-map a clip once per process"""
+    from noise import map_wav
+
+    if path not in _clips:
+        _clips[path] = map_wav(path)
+    return _clips[path]
+
+
+def cache_key(path, settings):
+    """Identifies the denoised output of a clip (by path, size and modification time) with settings"""
+    stat = os.stat(path)
+    identity = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns, settings], sort_keys=True)
+    return hashlib.sha256(identity.encode()).hexdigest()[:24]
+
+
+def denoised_clip(path, settings, cache_dir):
+    """
+    Denoise a clip with settings, or load the cached result.
+
+    Returns:
+        tuple: (denoised samples, seconds the denoising took, True if it came from the cache)
+    """
+    import numpy as np
+
+    from noise import reduce_noise
+
+    key = cache_key(path, settings)
+    samples_file = os.path.join(cache_dir, key + ".npy")
+    info_file = os.path.join(cache_dir, key + ".json")
+    if os.path.exists(info_file):
+        with open(info_file) as file:
+            info = json.load(file)
+        return np.load(samples_file, mmap_mode="r"), info["seconds"], True
+
+    rate, noisy = load_clip(path)
+    if settings.get("engine", "numpy") != "numpy" or not settings.get("stationary", True):
+        # Import noisereduce before the clock starts, it takes seconds
+        import noisereduce  # noqa: F401
+    start = time.perf_counter()
+    denoised = reduce_noise(noisy, rate, **settings)
+    seconds = time.perf_counter() - start
+
+    # Other workers may be writing the same cache; whoever finishes last wins
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary = f"{samples_file}.{os.getpid()}.tmp.npy"
+    np.save(temporary, np.asarray(denoised))
+    os.replace(temporary, samples_file)
+    with open(f"{info_file}.{os.getpid()}.tmp", "w") as file:
+        json.dump({"seconds": seconds, "settings": settings, "clip": path}, file)
+    os.replace(f"{info_file}.{os.getpid()}.tmp", info_file)
+    return denoised, seconds, False
+
+
+def si_sdr(clean, estimate):
+    """Scale-invariant signal-to-distortion ratio of estimate against clean, in dB"""
+    import numpy as np
+
+    length = min(len(clean), len(estimate))
+    clean = np.asarray(clean[:length], dtype=np.float64)
+    estimate = np.asarray(estimate[:length], dtype=np.float64)
+    target = clean * (np.dot(estimate, clean) / max(np.dot(clean, clean), 1e-12))
+    distortion = estimate - target
+    return float(10 * np.log10(max(np.dot(target, target), 1e-12) / max(np.dot(distortion, distortion), 1e-12)))
+
+
+def score(clean, estimate, rate):
+    """PESQ, STOI and SI-SDR of estimate; a metric whose package is missing is None"""
+    from noise import pesq_score, stoi_score
+
+    scores = {"si_sdr": si_sdr(clean, estimate)}
+    for name, function in (("pesq", pesq_score), ("stoi", stoi_score)):
+        try:
+            scores[name] = float(function(clean, estimate, rate))
+        except ImportError:
+            scores[name] = None
+    return scores
+
+
+def evaluate(name, clean_path, noisy_path, settings, cache_dir):
+    """
+    Score one clip with one settings dict (None scores the noisy clip itself).
+
+    Returns:
+        dict: clip, settings, seconds, audio_seconds, cached and the metrics
+    """
+    rate, clean = load_clip(clean_path)
+    _, noisy = load_clip(noisy_path)
+    if settings is None:
+        estimate, seconds, cached = noisy, 0.0, False
+    else:
+        estimate, seconds, cached = denoised_clip(noisy_path, settings, cache_dir)
+    result = {"clip": name, "settings": settings, "seconds": seconds, "audio_seconds": len(noisy) / rate,
+              "cached": cached}
+    result.update(score(clean, estimate, rate))
+    return result
+
+
+def summarize(results, sweep):
+    """Per-settings means of the metrics and total runtime, in the order of sweep"""
+    rows = []
+    for settings in sweep:
+        runs = [result for result in results if result["settings"] == settings]
+        audio_seconds = sum(run["audio_seconds"] for run in runs)
+        seconds = sum(run["seconds"] for run in runs)
+        row = {"name": settings_name(settings), "settings": settings, "clips": len(runs),
+               "seconds": round(seconds, 4), "realtime_factor": round(seconds / audio_seconds, 4) if audio_seconds else 0.0,
+               "cached": sum(run["cached"] for run in runs)}
+        for metric in METRICS:
+            values = [run[metric] for run in runs if run[metric] is not None]
+            row[metric] = round(sum(values) / len(values), 4) if values else None
+        rows.append(row)
+    return rows
+
+
+def best_settings(rows, min_pesq=None, min_stoi=None, min_si_sdr=None):
+    """The fastest row (other than "none") meeting the quality floors, or None"""
+    floors = {"pesq": min_pesq, "stoi": min_stoi, "si_sdr": min_si_sdr}
+    candidates = [row for row in rows if row["settings"] is not None
+                  and all(floor is None or (row[metric] is not None and row[metric] >= floor)
+                          for metric, floor in floors.items())]
+    return min(candidates, key=lambda row: row["seconds"], default=None)
+
+
+def run_sweep(clips, sweep, cache_dir, workers):
+    """Score every clip with every settings dict (and unprocessed) in a process pool"""
+    tasks = [(name, clean, noisy, settings, cache_dir) for settings in [None] + sweep for name, clean, noisy in clips]
+    # Settings run in the order given, so each worker maps a few clips and reuses them
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(evaluate, *zip(*tasks), chunksize=max(1, len(tasks) // (workers * 4))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clean", help="Directory of clean clips")
+    parser.add_argument("--noisy", help="Directory of the same clips with noise")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="Generate N synthetic clips instead")
+    parser.add_argument("--seconds", type=float, default=8.0, help="Length of the synthetic clips")
+    parser.add_argument("--snr", type=float, default=5.0, help="Noise level of the synthetic clips (dB)")
+    parser.add_argument("--grid", nargs="+", default=DEFAULT_GRID, metavar="NAME=V1,V2",
+                        help="Settings to sweep (reduce_noise_in_audio arguments)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--cache-dir", default="denoise_eval_cache", help="Where denoised clips are cached")
+    parser.add_argument("--min-pesq", type=float, help="Quality floor for the recommendation")
+    parser.add_argument("--min-stoi", type=float, help="Quality floor for the recommendation")
+    parser.add_argument("--min-si-sdr", type=float, help="Quality floor for the recommendation")
+    parser.add_argument("--json", metavar="FILE", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    sweep = parse_grid(args.grid)
+    if args.synthetic:
+        # Kept with the cache and named by their parameters, so the cached
+        # outputs stay valid between runs
+        synthetic_dir = os.path.join(args.cache_dir, f"clips_{args.synthetic}x{args.seconds:g}s_{args.snr:g}dB")
+        if not os.path.isdir(synthetic_dir):
+            make_synthetic_clips(synthetic_dir + ".tmp", args.synthetic, args.seconds, args.snr)
+            os.replace(synthetic_dir + ".tmp", synthetic_dir)
+        clean_dir, noisy_dir = os.path.join(synthetic_dir, "clean"), os.path.join(synthetic_dir, "noisy")
+    elif args.clean and args.noisy:
+        clean_dir, noisy_dir = args.clean, args.noisy
+    else:
+        parser.error("give --clean and --noisy directories, or --synthetic N")
+    clips = find_clips(clean_dir, noisy_dir)
+    if not clips:
+        parser.error(f"no clips with the same name in {clean_dir} and {noisy_dir}")
+
+    logger.info("%d clips x %d settings on %d workers", len(clips), len(sweep), args.workers)
+    start = time.perf_counter()
+    results = run_sweep(clips, sweep, args.cache_dir, args.workers)
+    wall_time = time.perf_counter() - start
+
+    rows = summarize(results, [None] + sweep)
+    missing = [metric for metric in METRICS if all(row[metric] is None for row in rows)]
+    if missing:
+        logger.warning("Not scored (install the package): %s", ", ".join(missing))
+
+    width = max(len(row["name"]) for row in rows)
+    print(f"{'settings':<{width}}{'pesq':>8}{'stoi':>8}{'si_sdr':>8}{'seconds':>9}{'rtf':>8}{'cached':>8}")
+    for row in rows:
+        metrics = "".join(f"{row[metric]:>8.3f}" if row[metric] is not None else f"{'-':>8}" for metric in METRICS)
+        print(f"{row['name']:<{width}}{metrics}{row['seconds']:>9.3f}{row['realtime_factor']:>8.4f}"
+              f"{row['cached']:>5}/{row['clips']:<2}")
+    best = best_settings(rows, args.min_pesq, args.min_stoi, args.min_si_sdr)
+    if best is None:
+        print("No settings meet the quality floor")
+    else:
+        print(f"Fastest settings meeting the floor: {best['name']}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"python": sys.version.split()[0], "clips": [name for name, _, _ in clips],
+                       "wall_time": round(wall_time, 3), "workers": args.workers, "settings": rows,
+                       "best": best and best["settings"], "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Layout benchmark: how the txt_svg text path scales from one word to many
+pages, for each bundled font.
+
+Usage:
+    python benchmarks/layout_bench.py [--words 1 10 100 1000 5000] [--fonts Vera.ttf PrettyNeat.ttf]
+                                      [--repeat 3] [--json FILE]
+
+For every font and corpus size it times
+  - char_to_path on each character of the corpus's alphabet (FreeType decode
+    plus svgpathtools conversion, no cache)
+  - plan_layout (measuring and line breaking)
+  - layout_sentence with an empty and with a warm glyph cache
+  - sentence_to_path (the svgpathtools Path of the page)
+and reports glyphs per second, the contours, points and curve segments
+emitted, and the peak memory and the allocated blocks still alive after
+it returns (tracemalloc, in a separate untimed run) of layout_sentence. A second table compares writing the SVG
+with write_plan_svg (streamed) and with svgpathtools' wsvg: file size and
+write time. sentence_to_path and wsvg get slow on big pages and are
+skipped above --max-path-words and --max-wsvg-words.
+
+The font's metrics are built once per font before anything is timed and
+reported on their own (metrics ms), so the first corpus isn't charged for them.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+FONT_DIR = os.path.join(REPO_DIR, "txt_svg")
+DEFAULT_FONTS = ["Vera.ttf", "PrettyNeat.ttf"]
+# Same size and spacing as control.py
+CHAR_SIZE = 20 * 28
+LAYOUT_OPTIONS = dict(char_spacing=40, word_spacing=200, max_width=8000, line_spacing=1000)
+
+# Text the corpora are cut from, repeated as often as needed
+CORPUS = ("Note that these widths are in font units, which depend on the font size and other attributes. "
+          "Words should flow naturally to the next line when they reach the boundary. The quick brown fox "
+          "jumps over the lazy dog, while 12 zebras quietly graze near 3 jeeps! Can the plotter keep up with "
+          "everything I say? It draws each line of text with a pen, one stroke at a time.").split()
+
+
+def corpus(words):
+    """A text of the given number of words"""
+    return " ".join(CORPUS[index % len(CORPUS)] for index in range(words))
+
+
+def load_face(font):
+    from freetype import Face
+
+    face = Face(font if os.path.isabs(font) else os.path.join(FONT_DIR, font))
+    face.set_char_size(CHAR_SIZE)
+    return face
+
+
+def best_time(function, repeat):
+    """Median and fastest of repeat calls of function, in seconds, and its last result"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), min(times), result
+
+
+def count_segments(buffer):
+    """Lines and Bezier curves in the contours of a PathBuffer"""
+    from txt_svg.outline import decode_contour
+
+    points = (buffer.points[:, 0] + 1j * buffer.points[:, 1]).tolist()
+    tags = buffer.tags.tolist()
+    offsets = buffer.offsets.tolist()
+    return sum(len(decode_contour(points[start:end], tags[start:end])[1])
+               for start, end in zip(offsets[:-1], offsets[1:]))
+
+
+def measure_memory(function):
+    """Peak traced memory (KB) and allocated blocks still alive after one call of function"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        result = function()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    del result
+    return round(peak / 1024, 1), blocks
+
+
+def bench_layout(face, text, repeat, max_path_words):
+    """Time the layout functions on one text; returns a dict of results"""
+    from txt_svg.glyph_cache import GlyphCache
+    from txt_svg.tsvg import char_to_path, layout_sentence, plan_layout, sentence_to_path
+
+    glyphs = sum(1 for char in text if not char.isspace())
+    alphabet = sorted(set(text) - {" "})
+    result = {"words": len(text.split()), "glyphs": glyphs}
+
+    median, _, _ = best_time(lambda: [char_to_path(face, char) for char in alphabet], repeat)
+    result["char_to_path_glyphs_per_s"] = round(len(alphabet) / median)
+
+    median, _, plan = best_time(lambda: plan_layout(face, text, **LAYOUT_OPTIONS), repeat)
+    result["plan_ms"] = round(median * 1000, 3)
+    result["lines"] = plan.line_count
+
+    # A fresh cache every call: every distinct glyph is decoded once
+    median, _, buffer = best_time(lambda: layout_sentence(face, text, glyph_cache=GlyphCache(), **LAYOUT_OPTIONS),
+                                  repeat)
+    result["layout_cold_ms"] = round(median * 1000, 3)
+    result["layout_cold_glyphs_per_s"] = round(glyphs / median)
+    warm = GlyphCache()
+    layout_sentence(face, text, glyph_cache=warm, **LAYOUT_OPTIONS)
+    median, _, buffer = best_time(lambda: layout_sentence(face, text, glyph_cache=warm, **LAYOUT_OPTIONS), repeat)
+    result["layout_warm_ms"] = round(median * 1000, 3)
+    result["layout_warm_glyphs_per_s"] = round(glyphs / median)
+
+    result["contours"] = buffer.contour_count
+    result["points"] = len(buffer)
+    result["segments"] = count_segments(buffer)
+    result["layout_peak_kb"], result["layout_blocks"] = measure_memory(
+        lambda: layout_sentence(face, text, glyph_cache=GlyphCache(), **LAYOUT_OPTIONS))
+
+    if result["words"] <= max_path_words:
+        median, _, _ = best_time(lambda: sentence_to_path(face, text, glyph_cache=warm, **LAYOUT_OPTIONS), repeat)
+        result["sentence_to_path_ms"] = round(median * 1000, 3)
+        result["sentence_to_path_peak_kb"], result["sentence_to_path_blocks"] = measure_memory(
+            lambda: sentence_to_path(face, text, glyph_cache=warm, **LAYOUT_OPTIONS))
+    return result
+
+
+def bench_svg(face, text, directory, repeat, max_wsvg_words):
+    """Write the text's SVG with write_plan_svg and with wsvg; returns {writer: (bytes, ms)}"""
+    from txt_svg.glyph_cache import GlyphCache
+    from txt_svg.svg_writer import write_plan_svg
+    from txt_svg.tsvg import plan_layout, sentence_to_path
+
+    cache = GlyphCache()
+    plan = plan_layout(face, text, **LAYOUT_OPTIONS)
+    results = {}
+    filename = os.path.join(directory, "streamed.svg")
+    median, _, _ = best_time(lambda: write_plan_svg(face, plan, filename, glyph_cache=cache), repeat)
+    results["write_plan_svg"] = (os.path.getsize(filename), round(median * 1000, 3))
+
+    if len(text.split()) <= max_wsvg_words:
+        from svgpathtools import wsvg
+
+        path = sentence_to_path(face, text, glyph_cache=cache, **LAYOUT_OPTIONS)
+        filename = os.path.join(directory, "wsvg.svg")
+        median, _, _ = best_time(lambda: wsvg(path, filename=filename), repeat)
+        results["wsvg"] = (os.path.getsize(filename), round(median * 1000, 3))
+    return results
+
+
+def run(fonts, sizes, repeat, max_path_words, max_wsvg_words):
+    """Benchmark every font and corpus size; returns ({font: metrics seconds}, results)"""
+    from txt_svg.metrics import font_metrics
+    from txt_svg.tsvg import char_to_path
+
+    # Import svgpathtools before anything is timed
+    char_to_path(load_face(fonts[0]), "a")
+    metrics = {}
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="layout_bench_") as directory:
+        for font in fonts:
+            face = load_face(font)
+            start = time.perf_counter()
+            font_metrics(face)
+            metrics[font] = time.perf_counter() - start
+            results[font] = {}
+            for words in sizes:
+                text = corpus(words)
+                result = bench_layout(face, text, repeat, max_path_words)
+                result["svg"] = {writer: {"bytes": size, "ms": ms}
+                                 for writer, (size, ms) in bench_svg(face, text, directory, repeat,
+                                                                     max_wsvg_words).items()}
+                results[font][words] = result
+    return metrics, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", nargs="+", type=int, default=[1, 10, 100, 1000, 5000],
+                        help="Corpus sizes in words")
+    parser.add_argument("--fonts", nargs="+", default=DEFAULT_FONTS, help="Font files (in txt_svg/ or absolute)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs of each function")
+    parser.add_argument("--max-path-words", type=int, default=1000,
+                        help="Largest corpus converted to svgpathtools paths")
+    parser.add_argument("--max-wsvg-words", type=int, default=100, help="Largest corpus written with wsvg")
+    parser.add_argument("--json", metavar="FILE", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    metrics, results = run(args.fonts, args.words, args.repeat, args.max_path_words, args.max_wsvg_words)
+
+    print(f"{'font':<16}{'words':>7}{'glyphs':>8}{'lines':>6}{'plan ms':>9}{'cold ms':>9}{'warm ms':>9}"
+          f"{'glyphs/s':>10}{'segments':>10}{'peak KB':>9}{'blocks':>8}{'to_path ms':>11}")
+    for font, sizes in results.items():
+        for words, result in sizes.items():
+            to_path = result.get("sentence_to_path_ms")
+            print(f"{font:<16}{words:>7}{result['glyphs']:>8}{result['lines']:>6}{result['plan_ms']:>9.2f}"
+                  f"{result['layout_cold_ms']:>9.2f}{result['layout_warm_ms']:>9.2f}"
+                  f"{result['layout_warm_glyphs_per_s']:>10}{result['segments']:>10}"
+                  f"{result['layout_peak_kb']:>9.0f}{result['layout_blocks']:>8}"
+                  f"{to_path if to_path is not None else '-':>11}")
+    print()
+    print(f"{'font':<16}{'words':>7}  {'write_plan_svg KB':>17}{'ms':>9}  {'wsvg KB':>9}{'ms':>9}")
+    for font, sizes in results.items():
+        for words, result in sizes.items():
+            streamed = result["svg"]["write_plan_svg"]
+            line = f"{font:<16}{words:>7}  {streamed['bytes'] / 1024:>17.1f}{streamed['ms']:>9.2f}"
+            if "wsvg" in result["svg"]:
+                wsvg = result["svg"]["wsvg"]
+                line += f"  {wsvg['bytes'] / 1024:>9.1f}{wsvg['ms']:>9.2f}"
+            print(line)
+    print()
+    for font, sizes in results.items():
+        rates = ", ".join(f"{result['char_to_path_glyphs_per_s']}" for result in sizes.values())
+        print(f"{font}: metrics {metrics[font] * 1000:.1f} ms, char_to_path glyphs/s by corpus: {rates}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "layout": LAYOUT_OPTIONS,
+                       "metrics_ms": {font: round(seconds * 1000, 3) for font, seconds in metrics.items()},
+                       "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+End-to-end latency benchmark: synthetic recordings through the whole
+dictation pipeline (VAD, denoise, transcribe, revise, layout, SVG), with
+the stand-in whisper and Ollama servers from fakes.py in place of the models.
+
+Usage:
+    python benchmarks/pipeline_bench.py [--lengths 5 15 45] [--repeat 5] [--json FILE]
+    python benchmarks/pipeline_bench.py --save-baseline baseline.json
+    python benchmarks/pipeline_bench.py --baseline baseline.json [--tolerance 0.2]
+
+The fakes take fixed, configurable times (--whisper-delay, --realtime-factor,
+--ollama-delay, --token-delay), so the numbers measure the pipeline's own
+overhead and concurrency rather than the models. Every recording is run
+once through the stages one after another for the per-stage p50/p95
+latency, then (with --pipeline) all of them are submitted back to back to
+the staged Pipeline for its throughput. Peak RSS is this process's, the
+whisper servers run in their own processes.
+
+With --baseline the p50/p95 of each stage and the throughput are compared
+with a saved run; anything more than --tolerance worse is reported and the
+exit code is 1, so the benchmark can guard a change against regressions.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+RATE = 16000
+# Stages reported, in pipeline order ("write" is the SVG file)
+STAGES = ["vad", "denoise", "transcribe", "revise", "layout", "write"]
+# Latencies below this are noise, never reported as regressions
+MIN_REGRESSION_MS = 5.0
+
+
+def synthetic_speech(seconds, rate=RATE, snr_db=15.0, seed=0):
+    """
+    Speech-like int16 audio: voiced syllables with harmonics and pauses
+    between phrases, over steady background noise.
+
+    Args:
+        seconds: Length of the recording
+        snr_db: Level of the syllables above the noise
+        seed: Seed of the random phrase lengths and noise
+
+    Returns:
+        numpy int16 array
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    count = int(seconds * rate)
+    speech = np.zeros(count)
+    position = int(rng.uniform(0.3, 0.6) * rate)
+    while position < count:
+        length = min(int(rng.uniform(0.8, 3.0) * rate), count - position)
+        t = np.arange(length) / rate
+        pitch = rng.uniform(100, 220) * (1 + 0.1 * np.sin(2 * np.pi * 0.7 * t))
+        phase = 2 * np.pi * np.cumsum(pitch) / rate
+        voiced = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 8))
+        # About four syllables a second
+        envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3.5, 4.5) * t), 0, None) ** 0.5
+        speech[position:position + length] = voiced * envelope
+        position += length + int(rng.uniform(0.3, 0.9) * rate)
+    noise = rng.normal(0, 1, count)
+    speech_rms = np.sqrt(np.mean(speech[speech != 0] ** 2)) if speech.any() else 1.0
+    audio = speech / speech_rms + noise * 10 ** (-snr_db / 20)
+    return (audio / np.max(np.abs(audio)) * 0.5 * 32767).astype(np.int16)
+
+
+def make_recordings(directory, lengths, repeat, seed=0):
+    """Write repeat recordings of each length; returns [(path, seconds)]"""
+    from noise import write_wav
+
+    recordings = []
+    for seconds in lengths:
+        for number in range(repeat):
+            path = os.path.join(directory, f"synthetic_{seconds:g}s_{number}.wav")
+            write_wav(path, RATE, synthetic_speech(seconds, seed=seed + number))
+            recordings.append((path, seconds))
+    return recordings
+
+
+def percentile(values, fraction):
+    """Linearly interpolated percentile of values (fraction in 0..1)"""
+    values = sorted(values)
+    if not values:
+        return None
+    index = (len(values) - 1) * fraction
+    low = int(index)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (index - low)
+
+
+def latency_summary(values):
+    """p50/p95/max in milliseconds of a list of seconds"""
+    return {"p50_ms": round(percentile(values, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "max_ms": round(max(values) * 1000, 2),
+            "count": len(values)}
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def configure(output_dir, args):
+    """Point control.py at the fakes and the benchmark's own files; returns the fake Ollama server"""
+    import control
+    import revise
+    from fakes import FakeOllamaServer
+    from whisper_worker import fake_worker
+
+    control.font_path = os.path.join(REPO_DIR, "txt_svg", "PrettyNeat.ttf")
+    control.save_denoised_audio = False
+    control.noise_profile_path = os.path.join(output_dir, "noise_profile.npz")
+    control.svg_output_filename = os.path.join(output_dir, "output.svg")
+    control.outputs_dir = os.path.join(output_dir, "outputs")
+    control.transcribe_processes = args.whisper_processes
+
+    ollama = FakeOllamaServer(delay=args.ollama_delay, token_delay=args.token_delay).start()
+    revise.OLLAMA_API_URL = f"{ollama.url}/api/generate"
+    if not args.cache:
+        # Repeated recordings would be served from the cache after the first
+        revise.CACHE_PATH = None
+
+    if args.whisper_cli:
+        script = os.path.join(output_dir, "whisper-cli")
+        with open(script, "w") as file:
+            file.write(f"#!/bin/sh\nexec {sys.executable} {os.path.join(REPO_DIR, 'fakes.py')} whisper-cli "
+                       f"--delay {args.whisper_delay} --realtime-factor {args.realtime_factor} "
+                       f"--words-per-second {args.words_per_second} \"$@\"\n")
+        os.chmod(script, 0o755)
+        control.whisper_cli = script
+        control.use_whisper_server = False
+    else:
+        control.whisper_worker = fake_worker(args.whisper_processes, delay=args.whisper_delay,
+                                             realtime_factor=args.realtime_factor,
+                                             words_per_second=args.words_per_second).start()
+    return ollama
+
+
+def run_serial(recordings):
+    """Each recording through the stages one after another; returns per-run records"""
+    import control
+    import tracing
+
+    runs = []
+    for path, seconds in recordings:
+        trace = tracing.Trace(os.path.basename(path))
+        with tracing.use_trace(trace):
+            audio, segments = control.prepare_audio(path)
+            transcript = control.transcribe_text(audio, segments)
+            text = control.revise_text(transcript)
+            plan = control.layout_text(text)
+            control.write_outputs(text, plan)
+        record = trace.record()
+        runs.append({"seconds": seconds, "total": record["total"], "stages": record["stages"],
+                     "words": len(text.split())})
+    return runs
+
+
+def run_pipeline(recordings, queue_size):
+    """Submit every recording to the staged Pipeline at once; returns (per-job seconds, wall time)"""
+    import control
+    import tracing
+    from pipeline import Job, Pipeline
+
+    latencies = []
+    failed = []
+
+    def done(job):
+        if job.completed:
+            latencies.append(time.perf_counter() - job.created)
+        else:
+            failed.append(job.id)
+
+    pipeline = Pipeline([("denoise", control.denoise_job),
+                         ("transcribe", control.transcribe_job),
+                         ("revise", control.revise_job),
+                         ("layout", control.layout_job),
+                         ("plot", control.plot_job)],
+                        queue_size=queue_size, on_done=done).start()
+    start = time.perf_counter()
+    for path, _ in recordings:
+        pipeline.submit(Job(trace=tracing.Trace(), recording=path, denoise_future=None))
+    pipeline.join()
+    wall_time = time.perf_counter() - start
+    pipeline.stop()
+    if failed:
+        raise RuntimeError(f"{len(failed)} pipeline jobs did not complete")
+    return latencies, wall_time
+
+
+def run(args):
+    """Run the benchmark and return its results as a dict"""
+    import control
+    import tracing
+
+    tracing.configure(args.log_level)
+    with tempfile.TemporaryDirectory(prefix="pipeline_bench_") as output_dir:
+        recordings = make_recordings(output_dir, args.lengths, args.repeat, args.seed)
+        ollama = configure(output_dir, args)
+        try:
+            # One untimed run so imports, the font and the connections are warm
+            run_serial(recordings[:1])
+            start = time.perf_counter()
+            runs = run_serial(recordings)
+            serial_time = time.perf_counter() - start
+            if args.pipeline:
+                pipeline_latencies, pipeline_time = run_pipeline(recordings, args.queue_size)
+        finally:
+            if control.whisper_worker is not None:
+                control.whisper_worker.stop()
+            ollama.stop()
+
+    audio_seconds = sum(seconds for _, seconds in recordings)
+    results = {
+        "python": sys.version.split()[0],
+        "settings": {"lengths": args.lengths, "repeat": args.repeat, "whisper_cli": args.whisper_cli,
+                     "whisper_processes": args.whisper_processes, "whisper_delay": args.whisper_delay,
+                     "realtime_factor": args.realtime_factor, "words_per_second": args.words_per_second,
+                     "ollama_delay": args.ollama_delay, "token_delay": args.token_delay, "cache": args.cache},
+        "stages": {stage: latency_summary([run["stages"].get(stage, 0.0) for run in runs]) for stage in STAGES},
+        "end_to_end": latency_summary([run["total"] for run in runs]),
+        "by_length": {f"{seconds:g}s": latency_summary([run["total"] for run in runs if run["seconds"] == seconds])
+                      for seconds in args.lengths},
+        "throughput": {"dictations_per_minute": round(len(runs) / serial_time * 60, 2),
+                       "audio_seconds_per_second": round(audio_seconds / serial_time, 2)},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if args.pipeline:
+        results["pipeline"] = {
+            "end_to_end": latency_summary(pipeline_latencies),
+            "throughput": {"dictations_per_minute": round(len(recordings) / pipeline_time * 60, 2),
+                           "audio_seconds_per_second": round(audio_seconds / pipeline_time, 2)},
+        }
+        results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Find what got worse than the baseline.
+
+    Returns:
+        list of (metric, baseline value, current value) more than tolerance
+        (a fraction) worse; latencies lower than MIN_REGRESSION_MS are ignored
+    """
+    regressions = []
+    latencies = [(f"{stage} {key}", results["stages"].get(stage, {}), baseline["stages"].get(stage, {}))
+                 for stage in STAGES for key in ("p50_ms", "p95_ms")]
+    latencies += [(f"end_to_end {key}", results["end_to_end"], baseline["end_to_end"])
+                  for key in ("p50_ms", "p95_ms")]
+    if "pipeline" in results and "pipeline" in baseline:
+        latencies += [(f"pipeline end_to_end {key}", results["pipeline"]["end_to_end"],
+                       baseline["pipeline"]["end_to_end"]) for key in ("p50_ms", "p95_ms")]
+    for name, current, old in latencies:
+        key = name.split()[-1]
+        if key not in current or key not in old:
+            continue
+        if current[key] > old[key] * (1 + tolerance) and current[key] - old[key] > MIN_REGRESSION_MS:
+            regressions.append((name, old[key], current[key]))
+
+    throughputs = [("dictations_per_minute", results["throughput"], baseline["throughput"])]
+    if "pipeline" in results and "pipeline" in baseline:
+        throughputs.append(("pipeline dictations_per_minute", results["pipeline"]["throughput"],
+                            baseline["pipeline"]["throughput"]))
+    for name, current, old in throughputs:
+        key = name.split()[-1]
+        if current[key] < old[key] / (1 + tolerance):
+            regressions.append((name, old[key], current[key]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lengths", nargs="+", type=float, default=[5, 15, 45],
+                        help="Seconds of audio per recording")
+    parser.add_argument("--repeat", type=int, default=5, help="Recordings of each length")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pipeline", action="store_true", help="Also measure the staged pipeline's throughput")
+    parser.add_argument("--queue-size", type=int, default=1, help="Queue size of the staged pipeline")
+    parser.add_argument("--whisper-cli", action="store_true", help="Use a fake whisper-cli instead of servers")
+    parser.add_argument("--whisper-processes", type=int, default=2, help="Fake whisper servers")
+    parser.add_argument("--whisper-delay", type=float, default=0.2, help="Seconds each transcription takes")
+    parser.add_argument("--realtime-factor", type=float, default=0.02,
+                        help="Extra transcription seconds per second of audio")
+    parser.add_argument("--words-per-second", type=float, default=2.5, help="Words the fake transcripts have")
+    parser.add_argument("--ollama-delay", type=float, default=0.1, help="Seconds before each answer starts")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds per streamed word")
+    parser.add_argument("--cache", action="store_true", help="Keep the revision cache on")
+    parser.add_argument("--json", metavar="FILE", help="Also write the results to this JSON file")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Save the results as a baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Fraction a metric may be worse than the baseline")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(f"{'stage':<12}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage, summary in [*results["stages"].items(), ("end to end", results["end_to_end"])]:
+        print(f"{stage:<12}{summary['p50_ms']:>10.1f}{summary['p95_ms']:>10.1f}{summary['max_ms']:>10.1f}")
+    for length, summary in results["by_length"].items():
+        print(f"  {length:<10}{summary['p50_ms']:>10.1f}{summary['p95_ms']:>10.1f}{summary['max_ms']:>10.1f}")
+    print(f"serial:   {results['throughput']['dictations_per_minute']:.1f} dictations/min, "
+          f"{results['throughput']['audio_seconds_per_second']:.1f} s of audio/s")
+    if "pipeline" in results:
+        pipeline = results["pipeline"]
+        print(f"pipeline: {pipeline['throughput']['dictations_per_minute']:.1f} dictations/min, "
+              f"{pipeline['throughput']['audio_seconds_per_second']:.1f} s of audio/s, "
+              f"p50 {pipeline['end_to_end']['p50_ms']:.0f} ms, p95 {pipeline['end_to_end']['p95_ms']:.0f} ms")
+    print(f"peak RSS: {results['peak_rss_mb']:.1f} MB")
+
+    for filename in (args.json, args.save_baseline):
+        if filename:
+            with open(filename, "w") as file:
+                json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("settings") != results["settings"]:
+            print("warning: the baseline was run with different settings")
+        regressions = compare(results, baseline, args.tolerance)
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old} -> {new}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
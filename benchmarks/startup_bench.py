@@ -0,0 +1,96 @@
+"""
+Cold-start benchmark: how long importing each module of the pipeline takes in
+a fresh interpreter, and which heavy dependencies the import pulls in.
+
+Usage:
+    python benchmarks/startup_bench.py [--repeat 5] [--modules control txt_svg ...]
+
+Each measurement runs in its own `python -c` process so nothing is cached
+between runs (apart from the OS file cache). Modules whose own imports fail
+(e.g. missing hardware libraries) are reported as errors instead of timings.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules of the pipeline, in the order control.py uses them
+DEFAULT_MODULES = ["txt_svg", "txt_svg.svg_writer", "txt_svg.gcode", "noise", "revise",
+                   "record", "led_indicator", "tracing", "control"]
+
+# Dependencies that should only load on first use
+HEAVY_MODULES = ["numpy", "scipy", "noisereduce", "freetype", "svgpathtools", "requests",
+                 "pyaudio", "gpiozero", "lgpio", "pesq"]
+
+# Runs in the child process: time the import, then report what got loaded
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = {heavy!r}
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in heavy if m in sys.modules]}}))
+"""
+
+
+def measure(module, python=sys.executable):
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        dict: seconds (import time), loaded (heavy modules imported), or error
+    """
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    result = subprocess.run([python, "-c", code], cwd=REPO_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit code {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(modules, repeat):
+    """Measure each module `repeat` times and summarize"""
+    results = {}
+    for module in modules:
+        runs = [measure(module) for _ in range(repeat)]
+        errors = [run["error"] for run in runs if "error" in run]
+        if errors:
+            results[module] = {"error": errors[0]}
+            continue
+        seconds = [run["seconds"] for run in runs]
+        results[module] = {
+            "median_ms": statistics.median(seconds) * 1000,
+            "min_ms": min(seconds) * 1000,
+            "loaded": runs[0]["loaded"],
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="Modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--json", metavar="FILE", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.modules, args.repeat)
+    print(f"{'module':<22}{'median ms':>10}{'min ms':>10}  heavy imports")
+    for module, result in results.items():
+        if "error" in result:
+            print(f"{module:<22}{'error':>10}{'':>10}  {result['error']}")
+        else:
+            loaded = ", ".join(result["loaded"]) or "-"
+            print(f"{module:<22}{result['median_ms']:>10.1f}{result['min_ms']:>10.1f}  {loaded}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "modules": results},
+                      file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,188 +2,584 @@ import subprocess
 import os
 import time
 import threading
-
-# Import the necessary libraries
-from gpiozero import Button
-from gpiozero.pins.lgpio import LGPIOFactory
-
-# Import the record_audio function from record.py
-from record import record_audio
+import logging
+import tempfile
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 # Import the necessary functions from revise.py for transcript revision
-from revise import correct_and_rephrase, save_transcript
+from revise import correct_and_rephrase, correct_by_sentence, get_client, save_transcript
 
 # Import the necessary functions from txt_svg module
-from txt_svg.tsvg import sentence_to_path, Face
-from svgpathtools import wsvg
-from freetype import Face
-from noise import reduce_noise_in_audio  # Import the noise reduction function
+from txt_svg.tsvg import iter_layout_lines, plan_layout
+from txt_svg.svg_writer import write_plan_svg
+from txt_svg.gcode import write_gcode
+from noise import NoiseProfile, denoise, denoise_stream, estimate_noise_profile, read_wav, to_int16, write_wav  # Import the noise reduction functions
+from vad import detect_speech, join_segments, joined_segments, non_speech, speech_seconds
+from record import RATE, Recorder, encode_wav
+from whisper_worker import WhisperError, WhisperPool
+from parallel_transcribe import transcribe_parallel
+from pipeline import Job, Pipeline
 
 # Import LED indicator functions
-from led_indicator import set_ready_to_record, set_recording, set_processing, cleanup
+import led_indicator
+from led_indicator import set_ready_to_record, set_recording, set_processing, set_busy, cleanup
 
-# Create a pin factory using lgpio
-pin_factory = LGPIOFactory()
+# Logging and per-stage timings (set PLOTTER_TRACE_FILE to record them)
+import tracing
+from tracing import span
 
-# Create a button connected to GPIO pin 17 using the lgpio factory
-button = Button(17, pin_factory=pin_factory)
+logger = logging.getLogger("control")
+
+# GPIO pin of the record button
+BUTTON_PIN = 17
+# The button, created by init_hardware()
+button = None
 
 # Global variables to track recording state
 recording = False
 recording_thread = None
 stop_recording_flag = threading.Event()
 latest_filename = None
+# Noise reduction runs alongside the recording; this holds the Future of the
+# current one (its result is the denoised audio) and the recording it belongs to
+denoise_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="denoise")
+denoise_future = None
+denoise_recording = None
+# Denoised audio is handed to whisper in memory; a copy is saved next to the
+# recording in the background when this is set
+save_denoised_audio = True
+archive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+# Seconds of audio the denoiser may fall behind the recorder
+denoise_buffer_seconds = 30
 recordings_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
-# Fixed SVG output filename
+# Noise profile of the room (see noise.save_noise_profile); if the file doesn't
+# exist the profile is measured from the start of each recording
+noise_profile_path = os.path.join(recordings_dir, "noise_profile.npz")
+noise_profile = None
+# Trim silence with voice activity detection (see vad.py) so denoise and
+# transcription only see the speech, not the whole button-hold time
+use_vad = True
+# Revise the transcript one sentence at a time, several at once (see
+# revise.correct_by_sentence), instead of in one request
+revise_by_sentence = True
+# Fixed SVG output filename (with the pipeline: a copy of the newest dictation's SVG)
 svg_output_filename = "output.svg"
+# Process dictations in a pipeline (see pipeline.py) so a new recording can
+# start while the previous one is still being denoised or transcribed. Each
+# dictation gets its own SVG (and G-code) file in outputs_dir. With
+# use_pipeline off, each dictation is processed before the next can start.
+use_pipeline = True
+pipeline_queue_size = 1
+outputs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "outputs")
+dictations = None
+# What the LED currently shows, see update_led(); changes are made on their
+# own thread so the pipeline workers don't wait for the blinkers to stop
+led_state = None
+led_lock = threading.Lock()
+led_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="led")
+# Set to a filename (e.g. "output.gcode") to also write G-code the Mega2560 can run directly
+gcode_output_filename = None
+
+# whisper.cpp command line tool and model
+whisper_cli = "./whisper.cpp/build/bin/whisper-cli"
+whisper_model = "./whisper.cpp/models/ggml-tiny.en.bin"
+# Keep the model loaded in a whisper-server process (see whisper_worker.py);
+# whisper-cli is only used if the server can't be started
+whisper_server = "./whisper.cpp/build/bin/whisper-server"
+use_whisper_server = True
+whisper_worker = None
+# Recordings longer than parallel_min_seconds are cut at pauses and the pieces
+# transcribed by transcribe_processes whisper processes at once, each using
+# whisper_threads threads (4 cores on the Pi 5 -> 2 x 2). Pieces cut inside
+# speech overlap by segment_overlap_seconds.
+transcribe_processes = 2
+whisper_threads = 2
+parallel_min_seconds = 30
+segment_overlap_seconds = 1.0
+# How in-memory audio reaches whisper-cli: "stdin" pipes a WAV into `-f -`,
+# "shm" writes a temporary file on tmpfs (/dev/shm) for builds that can't read stdin
+whisper_audio_input = "stdin"
+
+# Font used for the output, opened on first use by get_font_face()
+font_path = './txt_svg/PrettyNeat.ttf'
+font_face = None
+# Layout settings shared by the SVG and G-code output
+layout_options = dict(char_spacing=40, word_spacing=200, max_width=8000, line_spacing=1000, line_breaking='optimal')
+
+def get_font_face():
+    """Return the output font face, loading it the first time"""
+    global font_face
+    if font_face is None:
+        from freetype import Face
+        font_face = Face(font_path)
+        font_face.set_char_size(20 * 28)  # Font size similar to the tsvg.py example
+    return font_face
+
+def get_noise_profile():
+    """Return the saved noise profile, loading it the first time, or None if there is none"""
+    global noise_profile
+    if noise_profile is None and os.path.exists(noise_profile_path):
+        noise_profile = NoiseProfile.load(noise_profile_path)
+        logger.info("Using noise profile %s", noise_profile_path)
+    return noise_profile
 
-# Ensure recordings directory exists
-os.makedirs(recordings_dir, exist_ok=True)
+def init_hardware():
+    """Set up the status LED and the record button"""
+    global button
+    from gpiozero import Button
+    from gpiozero.pins.lgpio import LGPIOFactory
+    
+    # Create a pin factory using lgpio
+    pin_factory = LGPIOFactory()
+    led_indicator.init(pin_factory)
+    
+    # Create a button connected to GPIO pin 17 using the lgpio factory
+    button = Button(BUTTON_PIN, pin_factory=pin_factory)
+    button.when_pressed = toggle_recording
+    return button
 
-# Create and set up the font face
-font_face = Face('./txt_svg/PrettyNeat.ttf')
-font_face.set_char_size(20 * 28)  # Font size similar to the tsvg.py example
+def layout_text(text_content):
+    """
+    Measure the words of the text and break it into lines
+    
+    Returns:
+        LayoutPlan for write_plan_svg / iter_layout_lines
+    """
+    with span("layout") as stage:
+        plan = plan_layout(get_font_face(), text_content.strip(), **layout_options)
+        stage.set(words=sum(len(line) for line in plan.lines), lines=plan.line_count)
+    return plan
 
-def convert_text_to_svg(text_content, output_filename=None):
+def convert_text_to_svg(text_content, output_filename=None, plan=None):
     """
-    Convert the transcription text string to an SVG path and save it
+    Convert the transcription text string to SVG paths and save them
+    
+    The SVG is streamed to the file one text line at a time, so the whole
+    drawing is never held in memory.
     
     Args:
         text_content: The text content to convert (string)
         output_filename: Optional filename to save the SVG to. If None, a filename will be generated.
+        plan: Optional LayoutPlan of the text from layout_text, to avoid laying it out twice
+    
+    Returns:
+        The filename the SVG was saved to, or None on error
     """
-    print("Converting transcription to SVG")
+    logger.info("Converting transcription to SVG")
     try:
-        # Clean up the text if needed
-        clean_text = text_content.strip()
+        if not output_filename:
+            output_filename = f"output_{time.strftime('%Y%m%d-%H%M%S')}.svg"
         
-        # Generate the SVG path
-        svg_path = sentence_to_path(font_face, clean_text, 
-                                   char_spacing=40, 
-                                   word_spacing=200, 
-                                   max_width=8000, 
-                                   line_spacing=1000)
+        # Lay out the text and write the SVG file line by line
+        if plan is None:
+            plan = layout_text(text_content)
+        with span("write", format="svg") as stage:
+            paths = write_plan_svg(get_font_face(), plan, output_filename)
+            stage.set(paths=paths)
+        logger.info("SVG visualization saved to %s", output_filename)
         
-        # If output filename is provided, save the SVG file
-        if output_filename:
-            # Save the SVG file
-            wsvg(svg_path, filename=output_filename)
-            print(f"SVG visualization saved to {output_filename}")
-        
-        return svg_path
+        return output_filename
         
     except Exception as e:
-        print(f"Error converting text to SVG: {str(e)}")
+        logger.error("Error converting text to SVG: %s", e)
         return None
 
-def transcribe_audio(filename):
+def convert_text_to_gcode(text_content, output_filename, plan=None):
     """
-    Transcribe the recorded audio file using whisper.cpp and convert to SVG directly
-    without saving intermediate text files
+    Convert the transcription text string straight to plotter G-code and save it
+    
+    Uses the same layout as convert_text_to_svg, mapped to machine coordinates
+    the way the Processing sketch maps SVG files (see txt_svg/gcode.py).
+    
+    Args:
+        text_content: The text content to convert (string)
+        output_filename: Filename to save the G-code to
+        plan: Optional LayoutPlan of the text from layout_text
+    
+    Returns:
+        The filename the G-code was saved to, or None on error
     """
-    print(f"Transcribing {filename}...")
+    logger.info("Converting transcription to G-code")
     try:
-        process = subprocess.Popen(
-            ["./whisper.cpp/build/bin/whisper-cli", "-f", filename, "-m", "./whisper.cpp/models/ggml-tiny.en.bin", "-nt", "-np"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        stdout, stderr = process.communicate()
-        
-        if process.returncode == 0:
-            print("Transcription complete")
-            
-            # Instead of saving to a file, we have the transcription in the stdout variable
-            transcription_text = stdout
-            
-            # Revise the transcript using the correct_and_rephrase function
-            revised_text = correct_and_rephrase(transcription_text)
-            
-            # Use the fixed SVG output filename
-            if revised_text:
-                print("Transcript revised successfully")
-                # Convert the revised transcription directly to SVG
-                convert_text_to_svg(revised_text, svg_output_filename)
-                
-                # For debugging/logging purposes, we can still save the revised text if needed
-                # print(f"Revised transcript: {revised_text}")
-            else:
-                print("Using original transcript")
-                # If revision fails, convert the original transcription to SVG
-                convert_text_to_svg(transcription_text, svg_output_filename)
-            
-            return transcription_text
+        if plan is None:
+            plan = layout_text(text_content)
+        with span("write", format="gcode") as stage:
+            writer = write_gcode(iter_layout_lines(get_font_face(), plan), output_filename, optimize=True)
+            stage.set(strokes=writer.contours, moves=writer.moves)
+        logger.info("G-code with %d strokes saved to %s", writer.contours, output_filename)
+        logger.info("Pen-up travel: %.0f mm -> %.0f mm", writer.travel_before, writer.travel_after)
+        return output_filename
+    except Exception as e:
+        logger.error("Error converting text to G-code: %s", e)
+        return None
+
+def get_whisper_worker():
+    """Return the running transcription worker, starting it the first time (None if disabled or it fails)"""
+    global whisper_worker, use_whisper_server
+    if whisper_worker is None and use_whisper_server:
+        try:
+            whisper_worker = WhisperPool(transcribe_processes, server=whisper_server, model=whisper_model,
+                                         threads=whisper_threads).start()
+        except (OSError, WhisperError) as e:
+            logger.warning("Could not start the whisper server, using whisper-cli: %s", e)
+            use_whisper_server = False
+    return whisper_worker
+
+def run_whisper(audio):
+    """
+    Run whisper-cli on a WAV file or on audio held in memory
+    
+    Args:
+        audio: Path of a WAV file, or int16 samples at RATE
+    
+    Returns:
+        (returncode, stdout, stderr) of whisper-cli
+    """
+    worker = get_whisper_worker()
+    if worker is not None:
+        try:
+            return 0, worker.transcribe(audio), ""
+        except WhisperError as e:
+            logger.warning("Whisper server failed, falling back to whisper-cli: %s", e)
+    
+    command = [whisper_cli, "-f", None, "-m", whisper_model, "-nt", "-np", "-t", str(whisper_threads)]
+    if isinstance(audio, str):
+        command[2] = audio
+        result = subprocess.run(command, capture_output=True)
+    elif whisper_audio_input == "stdin":
+        command[2] = "-"
+        result = subprocess.run(command, input=encode_wav(audio, RATE), capture_output=True)
+    else:
+        memory_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        with tempfile.NamedTemporaryFile(suffix=".wav", dir=memory_dir) as file:
+            file.write(encode_wav(audio, RATE))
+            file.flush()
+            command[2] = file.name
+            result = subprocess.run(command, capture_output=True)
+    return (result.returncode, result.stdout.decode(errors="replace"),
+            result.stderr.decode(errors="replace"))
+
+def whisper_text(audio):
+    """Transcribe int16 samples, raising WhisperError if whisper fails"""
+    returncode, stdout, stderr = run_whisper(audio)
+    if returncode != 0:
+        raise WhisperError(f"whisper-cli exited with code {returncode}: {stderr.strip()[-200:]}")
+    return stdout.strip()
+
+def transcribe_text(audio, segments=None):
+    """
+    Transcribe audio with whisper.cpp
+    
+    Args:
+        audio: Path of a WAV file, or int16 samples at RATE held in memory
+        segments: Speech segments of the audio (vad.Segment), used to cut long
+                  recordings at pauses; detected if not given
+    
+    Returns:
+        The transcript
+    
+    Raises:
+        WhisperError: if whisper failed
+    """
+    if isinstance(audio, str):
+        logger.info("Transcribing %s...", audio)
+    else:
+        logger.info("Transcribing %.1f s of audio...", len(audio) / RATE)
+    with span("transcribe") as stage:
+        if (not isinstance(audio, str) and transcribe_processes > 1
+                and len(audio) > parallel_min_seconds * RATE):
+            if segments is None:
+                segments = detect_speech(audio, RATE)
+            text, chunks = transcribe_parallel(audio, segments, whisper_text, transcribe_processes,
+                                               overlap_seconds=segment_overlap_seconds)
+            stage.set(chunks=len(chunks))
+        else:
+            text = whisper_text(audio)
+        stage.set(chars=len(text))
+    logger.info("Transcription complete")
+    return text
+
+def revise_text(transcription_text):
+    """Return the transcript with its grammar corrected, or unchanged if revision fails"""
+    with span("revise") as stage:
+        if revise_by_sentence:
+            revised_text = correct_by_sentence(transcription_text)
         else:
-            print(f"Transcription failed with error: {stderr}")
+            revised_text = correct_and_rephrase(transcription_text)
+        stage.set(revised=bool(revised_text))
+    if revised_text:
+        logger.info("Transcript revised successfully")
+        logger.debug("Revised transcript: %s", revised_text)
+        return revised_text
+    logger.info("Using original transcript")
+    return transcription_text
+
+def write_outputs(text, plan=None, svg_filename=None, gcode_filename=None):
+    """
+    Write the SVG (and G-code, if gcode_filename is set) of the text from one layout
+    
+    Returns:
+        The SVG filename, or None if it couldn't be written
+    """
+    if plan is None:
+        plan = layout_text(text)
+    svg_filename = convert_text_to_svg(text, svg_filename or svg_output_filename, plan=plan)
+    if gcode_filename:
+        convert_text_to_gcode(text, gcode_filename, plan=plan)
+    return svg_filename
+
+def transcribe_audio(audio, segments=None):
+    """
+    Transcribe audio using whisper.cpp and convert to SVG directly
+    without saving intermediate text files
+    
+    Args:
+        audio: Path of a WAV file, or int16 samples at RATE held in memory
+        segments: Speech segments of the audio (vad.Segment), used to cut long
+                  recordings at pauses; detected if not given
+    """
+    try:
+        try:
+            transcription_text = transcribe_text(audio, segments)
+        except WhisperError as e:
+            logger.error("Transcription failed with error: %s", e)
             return None
+        
+        # Revise the transcript, falling back to the original if that fails
+        text = revise_text(transcription_text)
+        
+        # Convert the transcription directly to SVG (and G-code) from one layout
+        write_outputs(text, svg_filename=svg_output_filename, gcode_filename=gcode_output_filename)
+        return transcription_text
     except Exception as e:
-        print(f"Error during transcription: {str(e)}")
+        logger.error("Error during transcription: %s", e)
         return None
 
 def toggle_recording():
     global recording, recording_thread, stop_recording_flag, latest_filename
     
     if not recording:
+        if use_pipeline and dictations is not None and dictations.full:
+            # Backpressure: the earlier dictations have to move on first
+            logger.warning("Still processing earlier dictations, not recording yet")
+            return
         # Start recording - set LED to red
-        print("Starting recording...")
-        set_recording()  # Turn LED red during recording
+        logger.info("Starting recording...")
         recording = True
+        if use_pipeline:
+            update_led()
+        else:
+            set_recording()  # Turn LED red during recording
         stop_recording_flag.clear()
+        # Time the stages of this dictation (no-op unless tracing is enabled)
+        tracing.start_trace()
         recording_thread = threading.Thread(target=start_recording)
         recording_thread.start()
     else:
         # Stop recording
-        print("Stopping recording...")
+        logger.info("Stopping recording...")
         recording = False
         stop_recording_flag.set()
         if recording_thread:
             recording_thread.join()
-        print("Recording stopped")
+        logger.info("Recording stopped")
+        
+        if use_pipeline:
+            # The recording thread queued the dictation; the button is free again
+            update_led()
+            return
         
         # Set LED to blue to indicate processing
         set_processing()  # Turn LED blue during processing
         
-        # Apply noise reduction to the recorded audio
-        if latest_filename:
-            # Check if the file exists
-            if not os.path.exists(latest_filename):
-                print(f"ERROR: Recording file not found at {latest_filename}")
-                set_ready_to_record()
-                return
-                
-            print(f"File exists: {latest_filename}")
-            
-            # Create the noise-reduced filename
-            noise_reduced_filename = latest_filename.replace('.wav', '_reduced.wav')
-            print(f"Reducing noise in recording: {latest_filename}")
-            
-            try:
-                reduce_noise_in_audio(latest_filename, noise_reduced_filename, prop_decrease=0.75)
-                print(f"Noise reduction complete. Output saved to: {noise_reduced_filename}")
-                
-                # Check if the reduced file exists
-                if not os.path.exists(noise_reduced_filename):
-                    print(f"ERROR: Noise-reduced file not found at {noise_reduced_filename}")
-                    set_ready_to_record()
-                    return
-                    
-                # Transcribe the noise-reduced audio
-                transcribe_audio(noise_reduced_filename)
-                
-                # Set LED back to green to indicate ready for next recording
-                set_ready_to_record()  # Turn LED green when ready
-            except Exception as e:
-                print(f"Error during processing: {str(e)}")
-                set_ready_to_record()
+        try:
+            process_recording()
+        finally:
+            tracing.finish_trace()
+            # Set LED back to green to indicate ready for next recording
+            set_ready_to_record()  # Turn LED green when ready
+
+def update_led(pipeline=None):
+    """
+    Show the state of the device on the LED
+    
+    Red while recording, amber while the pipeline is too full to take another
+    dictation, blue while dictations are being processed, green when idle.
+    """
+    global led_state
+    with led_lock:
+        if recording:
+            state = "recording"
+        elif dictations is not None and dictations.full:
+            state = "busy"
+        elif dictations is not None and dictations.in_flight:
+            state = "processing"
         else:
-            print("No recording file available")
-            set_ready_to_record()
+            state = "ready"
+        if state != led_state:
+            led_state = state
+            led_executor.submit({"recording": set_recording, "busy": set_busy, "processing": set_processing,
+                                 "ready": set_ready_to_record}[state])
+
+def prepare_audio(filename, future=None):
+    """
+    Denoise a recording and cut out the silence
+    
+    Args:
+        filename: The recording's WAV file
+        future: Future of the denoiser that ran alongside the recording, if any
+    
+    Returns:
+        tuple: (int16 samples of the speech, empty if there is none;
+                its speech segments (vad.Segment), None without VAD)
+    """
+    if future is not None:
+        # Most of the audio was already denoised while recording; wait for
+        # the tail, then drop the silence before transcribing
+        with span("denoise") as stage:
+            audio = future.result()
+            stage.set(seconds=len(audio) / RATE)
+        audio, segments = trim_silence(audio)
+    else:
+        logger.info("Reducing noise in recording: %s", filename)
+        rate, samples = read_wav(filename)
+        profile = get_noise_profile()
+        segments = None
+        if use_vad:
+            with span("vad") as stage:
+                segments = detect_speech(samples, rate)
+                stage.set(segments=len(segments), speech_seconds=round(speech_seconds(segments), 2))
+                if profile is None and segments:
+                    # Measure the noise where nobody is talking
+                    noise = non_speech(samples, segments)
+                    if len(noise) >= rate // 4:
+                        profile = estimate_noise_profile(noise, rate)
+                samples = join_segments(samples, segments)
+                segments = joined_segments(segments)
+        with span("denoise") as stage:
+            audio = to_int16(denoise(samples, rate, profile=profile, prop_decrease=0.75)) if len(samples) else samples
+            stage.set(seconds=len(audio) / RATE)
+    logger.info("Noise reduction complete")
+    return audio, segments
+
+def archive_denoised(filename, audio):
+    """Keep a copy of the denoised audio without making the transcription wait for the SD card"""
+    if save_denoised_audio:
+        archive_executor.submit(write_wav, filename.replace('.wav', '_reduced.wav'), RATE, audio)
+
+def process_recording():
+    """Denoise, transcribe and lay out the latest recording"""
+    # Apply noise reduction to the recorded audio
+    if not latest_filename:
+        logger.warning("No recording file available")
+        return
+    
+    # Check if the file exists
+    if not os.path.exists(latest_filename):
+        logger.error("Recording file not found at %s", latest_filename)
+        return
+    
+    try:
+        future = denoise_future if denoise_recording == latest_filename else None
+        audio, segments = prepare_audio(latest_filename, future)
+        if not len(audio):
+            logger.info("No speech detected in %s", latest_filename)
+            return
+        archive_denoised(latest_filename, audio)
+        
+        # Transcribe the noise-reduced audio straight from memory
+        transcribe_audio(audio, segments)
+    except Exception as e:
+        logger.error("Error during processing: %s", e)
+
+def denoise_job(job):
+    """Pipeline stage: denoise the job's recording and cut out the silence"""
+    audio, job.segments = prepare_audio(job.recording, job.denoise_future)
+    job.denoise_future = None
+    if not len(audio):
+        logger.info("No speech detected in %s", job.recording)
+        return False
+    archive_denoised(job.recording, audio)
+    job.audio = audio
+
+def transcribe_job(job):
+    """Pipeline stage: transcribe the denoised audio"""
+    job.transcript = transcribe_text(job.audio, job.segments)
+    job.audio = None
+    if not job.transcript.strip():
+        logger.info("Nothing was transcribed from %s", job.recording)
+        return False
+
+def revise_job(job):
+    """Pipeline stage: correct the grammar of the transcript"""
+    job.text = revise_text(job.transcript)
+
+def layout_job(job):
+    """Pipeline stage: break the text into lines"""
+    job.plan = layout_text(job.text)
+
+def plot_job(job):
+    """Pipeline stage: write the job's own SVG (and G-code) file"""
+    os.makedirs(outputs_dir, exist_ok=True)
+    svg_filename = os.path.join(outputs_dir, f"dictation_{job.id}.svg")
+    gcode_filename = os.path.join(outputs_dir, f"dictation_{job.id}.gcode") if gcode_output_filename else None
+    job.svg_filename = write_outputs(job.text, job.plan, svg_filename, gcode_filename)
+    if job.svg_filename is None:
+        return False
+    if svg_output_filename:
+        # The plotter sketch reads one fixed file; swap the newest drawing in whole
+        shutil.copyfile(job.svg_filename, svg_output_filename + ".tmp")
+        os.replace(svg_output_filename + ".tmp", svg_output_filename)
+
+def job_done(job):
+    """Called when a dictation leaves the pipeline"""
+    if job.trace is not None:
+        tracing.finish_trace(job.trace)
+    stages = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in job.timings.items())
+    if job.completed:
+        logger.info("Dictation %s done (%s): %s", job.id, stages, job.svg_filename)
+    else:
+        logger.info("Dictation %s ended early (%s)", job.id, stages)
+
+def start_pipeline():
+    """Create and start the dictation pipeline"""
+    global dictations
+    dictations = Pipeline([("denoise", denoise_job),
+                           ("transcribe", transcribe_job),
+                           ("revise", revise_job),
+                           ("layout", layout_job),
+                           ("plot", plot_job)],
+                          queue_size=pipeline_queue_size, on_change=update_led, on_done=job_done).start()
+    return dictations
+
+def trim_silence(audio):
+    """
+    Cut the silence out of a recording, keeping the speech segments in order.
+
+    Args:
+        audio: int16 samples at RATE
+
+    Returns:
+        tuple: (int16 array of the speech (empty if there is none),
+                the speech segments' positions in it, None without VAD)
+    """
+    if not use_vad:
+        return audio, None
+    with span("vad") as stage:
+        segments = detect_speech(audio, RATE)
+        speech = join_segments(audio, segments)
+        stage.set(segments=len(segments), speech_seconds=round(speech_seconds(segments), 2),
+                  recorded_seconds=round(len(audio) / RATE, 2))
+    logger.info("Speech: %.1f s in %d segments out of %.1f s recorded",
+                speech_seconds(segments), len(segments), len(audio) / RATE)
+    return speech, joined_segments(segments)
 
 def start_recording():
     # Using a timestamp to create unique filenames
-    global latest_filename
+    global latest_filename, denoise_future, denoise_recording
     
+    trace = tracing.active_trace()
     timestamp = time.strftime("%Y%m%d-%H%M%S")
     filename = f"recording_{timestamp}.wav"
     # Create full path for the recording
@@ -192,73 +588,81 @@ def start_recording():
     # Ensure recordings directory exists again (just to be safe)
     os.makedirs(recordings_dir, exist_ok=True)
     
-    # Print full path for debugging
-    print(f"Will save recording to: {full_path}")
+    logger.debug("Will save recording to: %s", full_path)
     
-    # Initialize PyAudio
-    import pyaudio
-    import wave
+    # Chunks are written to the file as they are captured, so stopping only
+    # has to finish the WAV header. The denoiser reads the same chunks from
+    # the recorder's ring buffer and works through them while we record.
+    recorder = Recorder(full_path, ring_seconds=denoise_buffer_seconds)
+    denoise_future = None
+    try:
+        with span("record", trace) as stage:
+            recorder.start()
+            denoise_recording = full_path
+            denoise_future = denoise_executor.submit(denoise_stream, recorder.ring, None, RATE,
+                                                     profile=get_noise_profile(), prop_decrease=0.75)
+            # Record until stop flag is set
+            stop_recording_flag.wait()
+            recorder.stop()
+            stage.set(seconds=recorder.seconds)
+        if recorder.ring.overruns:
+            # The streamed output is missing audio; denoise the saved file instead
+            logger.warning("Denoiser fell behind, %d samples were dropped", recorder.ring.overruns)
+            denoise_future.result()
+            denoise_future = None
+    except Exception as e:
+        logger.error("Error recording audio: %s", e)
+        return
     
-    audio = pyaudio.PyAudio()
-    stream = audio.open(format=pyaudio.paInt16,
-                        channels=1,
-                        rate=16000,
-                        input=True,
-                        frames_per_buffer=1024)
+    if recorder.frames_recorded:
+        logger.info("Audio saved to %s", full_path)
+        latest_filename = full_path
+        if use_pipeline:
+            dictations.submit(Job(trace=trace, recording=full_path, denoise_future=denoise_future))
+    else:
+        logger.warning("No audio data was recorded")
+
+def main():
+    tracing.configure()
+    
+    # Ensure recordings directory exists
+    os.makedirs(recordings_dir, exist_ok=True)
     
-    frames = []
+    # Set up the LED and the button press event
+    init_hardware()
+    # Load the font and the whisper model now rather than on the first dictation
+    get_font_face()
+    get_whisper_worker()
+    threading.Thread(target=get_client().warm_up, name="ollama-warm-up", daemon=True).start()
+    if use_pipeline:
+        start_pipeline()
     
-    # Record until stop flag is set
+    # Keep the script running
+    logger.info("Press the button to start/stop recording. Press Ctrl+C to exit.")
     try:
-        while not stop_recording_flag.is_set():
-            data = stream.read(1024)
-            frames.append(data)
-    finally:
-        # Clean up
-        stream.stop_stream()
-        stream.close()
-        audio.terminate()
+        # Initially set LED to green to indicate ready to record
+        set_ready_to_record()
         
-        # Save the recorded audio
-        if frames:
-            try:
-                wave_file = wave.open(full_path, 'wb')
-                wave_file.setnchannels(1)
-                wave_file.setsampwidth(audio.get_sample_size(pyaudio.paInt16))
-                wave_file.setframerate(16000)
-                wave_file.writeframes(b''.join(frames))
-                wave_file.close()
-                print(f"Audio saved to {full_path}")
-                
-                # Verify the file exists and set latest_filename only after successful save
-                if os.path.exists(full_path):
-                    print(f"Verified file exists: {full_path}")
-                    latest_filename = full_path
-                else:
-                    print(f"ERROR: File was not saved properly: {full_path}")
-            except Exception as e:
-                print(f"Error saving audio file: {str(e)}")
-        else:
-            print("No audio data was recorded")
-
-# Set up button press event
-button.when_pressed = toggle_recording
+        while True:
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        logger.info("Exiting...")
+        # Ensure recording is stopped before exiting
+        if recording:
+            stop_recording_flag.set()
+            if recording_thread:
+                recording_thread.join()
+        
+        # Finish the dictations already queued
+        if dictations is not None:
+            dictations.stop()
+        # Let the last denoised copy finish writing
+        archive_executor.shutdown(wait=True)
+        if whisper_worker is not None:
+            whisper_worker.stop()
+        
+        # Clean up LED resources
+        cleanup()
 
-# Keep the script running
-print("Press the button to start/stop recording. Press Ctrl+C to exit.")
-try:
-    # Initially set LED to green to indicate ready to record
-    set_ready_to_record()
-    
-    while True:
-        time.sleep(0.1)
-except KeyboardInterrupt:
-    print("Exiting...")
-    # Ensure recording is stopped before exiting
-    if recording:
-        stop_recording_flag.set()
-        if recording_thread:
-            recording_thread.join()
-    
-    # Clean up LED resources
-    cleanup()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Stand-ins for the external services the pipeline talks to, for testing and
+benchmarking without the real binaries or models.
+
+FakeWhisperServer speaks the part of whisper.cpp's whisper-server HTTP API
+that whisper_worker.WhisperWorker uses (GET /health, POST /inference). It can
+run in-process or as a command, like the real server:
+
+    python fakes.py whisper-server --port 8910 [--transcript TEXT] [--delay S] [--load-time S] [--log-bytes N]
+
+Like whisper-server it logs to stderr on every job (--log-bytes per job), so
+a parent that doesn't read the pipe gets stuck the same way.
+
+and a whisper-cli stand-in that reads a WAV file (or `-f -` for stdin):
+
+    python fakes.py whisper-cli -f audio.wav [--transcript TEXT] [--delay S]
+
+FakeOllamaServer answers Ollama's /api/generate the way revise.OllamaClient
+calls it, including streamed (NDJSON) answers:
+
+    python fakes.py ollama --port 11434 [--reply TEXT] [--prefix TEXT] [--token-delay S]
+"""
+import argparse
+import io
+import json
+import re
+import sys
+import threading
+import time
+import wave
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_multipart(content_type, body):
+    """Return the fields of a multipart/form-data body as {name: bytes}"""
+    message = BytesParser().parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+    fields = {}
+    for part in message.get_payload():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = part.get_payload(decode=True)
+    return fields
+
+
+class FakeServer:
+    """
+    Base class: an HTTP server on a background thread.
+
+    Args:
+        host, port: Where to listen (port 0 picks a free one)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        handler = type("Handler", (_Handler,), {"fake": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.requests = []
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def handle(self, handler, method):
+        """Answer one request; returns (status, content type, body bytes or iterable of chunks)"""
+        raise NotImplementedError
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+        self.fake.requests.append((method, self.path))
+        status, content_type, body = self.fake.handle(self, method)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if isinstance(body, bytes):
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        # Stream an iterable of chunks with chunked transfer encoding
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in body:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self._respond("POST")
+
+
+# Words fake transcripts are made of
+_WORDS = ("the pen plotter draws every word i say in my own handwriting and it "
+          "takes a little while for each line to appear on the paper").split()
+
+
+def fake_transcript(seconds, transcript=None, words_per_second=0.0):
+    """
+    What the fake whisper returns for seconds of audio: transcript if given,
+    else words_per_second * seconds words in sentences of eight, else
+    "[N.NN seconds of audio]"
+    """
+    if transcript is not None:
+        return transcript
+    count = int(round(seconds * words_per_second))
+    if not count:
+        return f"[{seconds:.2f} seconds of audio]"
+    words = [_WORDS[index % len(_WORDS)] for index in range(count)]
+    sentences = [" ".join(words[start:start + 8]) for start in range(0, count, 8)]
+    return " ".join(sentence[0].upper() + sentence[1:] + "." for sentence in sentences)
+
+
+def wav_seconds(data):
+    with wave.open(io.BytesIO(data)) as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+class FakeWhisperServer(FakeServer):
+    """
+    Stand-in for whisper.cpp's whisper-server.
+
+    Args:
+        transcript: Text returned for every job; by default it describes the
+                    audio received ("[N.NN seconds of audio]")
+        delay: Seconds each job takes
+        load_time: Seconds before the health check reports ready (model loading)
+        realtime_factor: Extra seconds each job takes per second of audio
+        words_per_second: Return made-up sentences this many words per second
+                          of audio long instead of the description
+        log: Text file each job writes log_bytes of timing output to, like
+             the real server does on stderr (the command line server logs to
+             stderr by default)
+        log_bytes: Size of the log output of each job
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, transcript=None, delay=0.0, load_time=0.0,
+                 realtime_factor=0.0, words_per_second=0.0, log=None, log_bytes=4096):
+        super().__init__(host, port)
+        self.transcript = transcript
+        self.delay = delay
+        self.realtime_factor = realtime_factor
+        self.words_per_second = words_per_second
+        self.log = log
+        self.log_bytes = log_bytes
+        self.ready_at = time.monotonic() + load_time
+        self.jobs = 0
+
+    def _log_job(self, seconds):
+        if self.log is None or not self.log_bytes:
+            return
+        line = f"whisper_print_timings: job {self.jobs}, {seconds:.2f} s of audio, encode time = {self.delay * 1000:.2f} ms\n"
+        text = (line * (self.log_bytes // len(line) + 1))[:self.log_bytes]
+        self.log.write(text)
+        self.log.flush()
+
+    def handle(self, handler, method):
+        if handler.path == "/health":
+            if time.monotonic() < self.ready_at:
+                return 503, "application/json", b'{"status":"loading model"}'
+            return 200, "application/json", b'{"status":"ok"}'
+        if method == "POST" and handler.path == "/inference":
+            fields = parse_multipart(handler.headers["Content-Type"], handler.body)
+            seconds = wav_seconds(fields["file"])
+            time.sleep(self.delay + self.realtime_factor * seconds)
+            self.jobs += 1
+            self._log_job(seconds)
+            text = fake_transcript(seconds, self.transcript, self.words_per_second)
+            if fields.get("response_format", b"json") == b"text":
+                return 200, "text/plain", (text + "\n").encode()
+            return 200, "application/json", json.dumps({"text": text}).encode()
+        return 404, "text/plain", b"not found"
+
+
+class FakeOllamaServer(FakeServer):
+    """
+    Stand-in for Ollama's /api/generate.
+
+    Args:
+        reply: Answer to every prompt; by default the text quoted at the end of
+               the prompt (revise.PROMPT_TEMPLATE) is sent back unchanged
+        prefix: Text put in front of each answer, e.g. "Corrected text: " to
+                exercise the prefix stripping
+        delay: Seconds before the answer starts
+        token_delay: Seconds between streamed words
+        load_time: Seconds the first request takes extra (loading the model)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, reply=None, prefix="", delay=0.0, token_delay=0.0, load_time=0.0):
+        super().__init__(host, port)
+        self.reply = reply
+        self.prefix = prefix
+        self.delay = delay
+        self.token_delay = token_delay
+        self.load_time = load_time
+        self.payloads = []
+
+    def answer(self, prompt):
+        if self.reply is not None:
+            return self.prefix + self.reply
+        match = re.search(r": '(.*)'\.$", prompt, re.DOTALL)
+        return self.prefix + (match.group(1) if match else prompt)
+
+    def handle(self, handler, method):
+        if method != "POST" or handler.path != "/api/generate":
+            return 404, "text/plain", b"not found"
+        payload = json.loads(handler.body or b"{}")
+        self.payloads.append(payload)
+        if self.load_time:
+            time.sleep(self.load_time)
+            self.load_time = 0
+        time.sleep(self.delay)
+        model = payload.get("model", "")
+        prompt = payload.get("prompt", "")
+        if not prompt:
+            # Ollama only loads the model
+            return 200, "application/json", json.dumps({"model": model, "response": "", "done": True}).encode()
+        text = self.answer(prompt)
+        if not payload.get("stream", True):
+            return 200, "application/json", json.dumps({"model": model, "response": text, "done": True}).encode()
+
+        def stream():
+            for word in re.findall(r"\s*\S+", text):
+                yield json.dumps({"model": model, "response": word, "done": False}).encode() + b"\n"
+                time.sleep(self.token_delay)
+            yield json.dumps({"model": model, "response": "", "done": True}).encode() + b"\n"
+
+        return 200, "application/x-ndjson", stream()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stand-in service")
+    commands = parser.add_subparsers(dest="service", required=True)
+    whisper = commands.add_parser("whisper-server", help="Fake whisper.cpp server")
+    whisper.add_argument("--host", default="127.0.0.1")
+    whisper.add_argument("--port", type=int, default=8910)
+    whisper.add_argument("--load-time", type=float, default=0.0)
+    whisper.add_argument("--log-bytes", type=int, default=4096, help="Bytes written to stderr per job")
+    cli = commands.add_parser("whisper-cli", help="Fake whisper.cpp command line tool")
+    cli.add_argument("-f", "--file", required=True)
+    cli.add_argument("-np", "--no-prints", action="store_true")
+    for command in (whisper, cli):
+        command.add_argument("--transcript")
+        command.add_argument("--delay", type=float, default=0.0)
+        command.add_argument("--realtime-factor", type=float, default=0.0)
+        command.add_argument("--words-per-second", type=float, default=0.0)
+        # Accept (and ignore) the model options the real tools take
+        command.add_argument("-m", "--model")
+        command.add_argument("-t", "--threads")
+        command.add_argument("-nt", "--no-timestamps", action="store_true")
+    ollama = commands.add_parser("ollama", help="Fake Ollama server")
+    ollama.add_argument("--host", default="127.0.0.1")
+    ollama.add_argument("--port", type=int, default=11434)
+    ollama.add_argument("--reply")
+    ollama.add_argument("--prefix", default="")
+    ollama.add_argument("--delay", type=float, default=0.0)
+    ollama.add_argument("--token-delay", type=float, default=0.0)
+    ollama.add_argument("--load-time", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.service == "whisper-server":
+        server = FakeWhisperServer(args.host, args.port, args.transcript, args.delay, args.load_time,
+                                   args.realtime_factor, args.words_per_second, sys.stderr, args.log_bytes)
+        server.serve_forever()
+    elif args.service == "whisper-cli":
+        if args.file == "-":
+            data = sys.stdin.buffer.read()
+        else:
+            with open(args.file, "rb") as file:
+                data = file.read()
+        seconds = wav_seconds(data)
+        time.sleep(args.delay + args.realtime_factor * seconds)
+        print(fake_transcript(seconds, args.transcript, args.words_per_second))
+    elif args.service == "ollama":
+        server = FakeOllamaServer(args.host, args.port, args.reply, args.prefix, args.delay,
+                                  args.token_delay, args.load_time)
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,13 @@
-from gpiozero import RGBLED
-from gpiozero.pins.lgpio import LGPIOFactory
 from time import sleep
 import threading
 
-# Initialize the pin factory
-factory = LGPIOFactory()
+# RGB LED pins (red 16, Green 20, Blue 21)
+RED_PIN = 16
+GREEN_PIN = 20
+BLUE_PIN = 21
 
-# Initialize the RGB LED with the specified pins (red 16, Green 20, Blue 21)
-rgb_led = RGBLED(red=16, green=20, blue=21, pin_factory=factory)
+# The RGB LED, created by init(); until then the state functions only track state
+rgb_led = None
 
 # Create threading events to control LED states
 recording_active = threading.Event()
@@ -17,20 +17,42 @@ processing_active = threading.Event()
 recording_thread = None
 processing_thread = None
 
+def init(pin_factory=None):
+    """
+    Open the GPIO pins of the RGB LED and show the ready state
+    
+    Args:
+        pin_factory: gpiozero pin factory to use; defaults to lgpio
+    """
+    global rgb_led
+    if rgb_led is not None:
+        return rgb_led
+    from gpiozero import RGBLED
+    if pin_factory is None:
+        from gpiozero.pins.lgpio import LGPIOFactory
+        pin_factory = LGPIOFactory()
+    rgb_led = RGBLED(red=RED_PIN, green=GREEN_PIN, blue=BLUE_PIN, pin_factory=pin_factory)
+    set_ready_to_record()
+    return rgb_led
+
+def _set_color(color):
+    if rgb_led is not None:
+        rgb_led.color = color
+
 def _recording_blinker():
     """LED blinking function for recording state - runs in its own thread"""
     while recording_active.is_set():
-        rgb_led.color = (1, 0, 0)  # Red on
+        _set_color((1, 0, 0))  # Red on
         sleep(0.5)
-        rgb_led.color = (0, 0, 0)  # Off
+        _set_color((0, 0, 0))  # Off
         sleep(0.5)
 
 def _processing_blinker():
     """LED blinking function for processing state - runs in its own thread"""
     while processing_active.is_set():
-        rgb_led.color = (0, 0, 1)  # Blue on
+        _set_color((0, 0, 1))  # Blue on
         sleep(0.5)
-        rgb_led.color = (0, 0, 0)  # Off
+        _set_color((0, 0, 0))  # Off
         sleep(0.5)
 
 def set_ready_to_record():
@@ -46,7 +68,7 @@ def set_ready_to_record():
     if processing_thread and processing_thread.is_alive():
         processing_thread.join(1.0)  # Wait for thread with timeout
         
-    rgb_led.color = (0, 1, 0)  # Green
+    _set_color((0, 1, 0))  # Green
 
 def set_recording():
     """Set LED to red to indicate recording in progress"""
@@ -72,6 +94,19 @@ def set_processing():
     processing_thread.daemon = True  # Thread will die when main program exits
     processing_thread.start()
 
+def set_busy():
+    """Set LED to solid amber: still processing, can't take another recording yet"""
+    recording_active.clear()
+    processing_active.clear()
+    
+    global recording_thread, processing_thread
+    if recording_thread and recording_thread.is_alive():
+        recording_thread.join(1.0)
+    if processing_thread and processing_thread.is_alive():
+        processing_thread.join(1.0)
+    
+    _set_color((1, 0.5, 0))  # Amber
+
 def cleanup():
     """Turn off LED and release resources"""
     # Clear all active flags
@@ -79,14 +114,13 @@ def cleanup():
     processing_active.clear()
     
     # Wait for threads to finish
-    global recording_thread, processing_thread
+    global recording_thread, processing_thread, rgb_led
     if recording_thread and recording_thread.is_alive():
         recording_thread.join(1.0)  # Wait with a timeout
     if processing_thread and processing_thread.is_alive():
         processing_thread.join(1.0)  # Wait with a timeout
         
-    rgb_led.color = (0, 0, 0)  # Off
-    rgb_led.close()
-
-# Initial state is ready to record
-set_ready_to_record() 
\ No newline at end of file
+    if rgb_led is not None:
+        rgb_led.color = (0, 0, 0)  # Off
+        rgb_led.close()
+        rgb_led = None
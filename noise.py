@@ -1,7 +1,10 @@
-import noisereduce as nr
-from scipy.io import wavfile
+import functools
+import os
 
-def reduce_noise_in_audio(input_file_path, output_file_path, prop_decrease=0.75, stationary=True, **kwargs):
+import numpy as np
+
+def reduce_noise_in_audio(input_file_path, output_file_path, prop_decrease=0.75, stationary=True,
+                          engine='numpy', noise_profile=None, **kwargs):
     """
     Reduces noise in an audio file and saves the result to a new file.
     
@@ -11,6 +14,15 @@ def reduce_noise_in_audio(input_file_path, output_file_path, prop_decrease=0.75,
         prop_decrease (float): How much to reduce the noise by (0.0 to 1.0)
                               Lower values preserve more of the original signal
         stationary (bool): Whether the noise is constant throughout the clip
+        engine (str): 'numpy' for the built-in spectral gate (StreamingDenoiser),
+                      'noisereduce' for noisereduce.reduce_noise. The numpy
+                      engine hands what it can't do to noisereduce:
+                      non-stationary reduction, multi-channel audio and
+                      options only noisereduce has (see NUMPY_ENGINE_OPTIONS).
+        noise_profile: NoiseProfile, or path to one saved with save_noise_profile
+                       (numpy engine only). By default the profile is measured
+                       over the whole recording, as noisereduce does, or over
+                       its first noise_seconds if that option is given.
         **kwargs: Additional parameters to pass to noisereduce.reduce_noise:
             - n_fft (int): FFT window size, default is 2048
             - win_length (int): Window length, default is n_fft
@@ -20,9 +32,88 @@ def reduce_noise_in_audio(input_file_path, output_file_path, prop_decrease=0.75,
             - n_std_thresh_stationary (float): Number of std devs for stationary noise threshold
             - n_std_thresh_nonstationary (float): Number of std devs for non-stationary noise threshold
             - use_tqdm (bool): Whether to show progress bar
+            The numpy engine takes n_fft, hop_length, time_mask_smooth_ms,
+            freq_mask_smooth_hz and n_std_thresh_stationary, plus the
+            StreamingDenoiser options noise_seconds and dtype.
     """
-    # Load the audio file
-    fs, data = wavfile.read(input_file_path)
+    if engine not in ('numpy', 'noisereduce'):
+        raise ValueError(f"Unknown noise reduction engine: {engine}")
+    import wave
+    
+    # 16-bit mono files are read without scipy, which takes a while to import
+    try:
+        fs, data = read_wav(input_file_path)
+        wavfile = None
+    except (ValueError, wave.Error, EOFError):
+        from scipy.io import wavfile
+        fs, data = wavfile.read(input_file_path)
+    
+    reduced_noise = reduce_noise(data, fs, prop_decrease=prop_decrease, stationary=stationary,
+                                 engine=engine, noise_profile=noise_profile, **kwargs)
+    
+    # Write the cleaned audio to a new file, in the format it came in
+    if wavfile is None:
+        write_wav(output_file_path, fs, reduced_noise)
+    else:
+        wavfile.write(output_file_path, fs, reduced_noise)
+
+
+# Options of reduce_noise that the numpy engine understands
+NUMPY_ENGINE_OPTIONS = {'n_fft', 'hop_length', 'time_mask_smooth_ms', 'freq_mask_smooth_hz',
+                        'n_std_thresh_stationary', 'n_std_thresh', 'noise_seconds', 'dtype', 'use_tqdm'}
+
+
+def reduce_noise(data, fs, prop_decrease=0.75, stationary=True, engine='numpy', noise_profile=None, **kwargs):
+    """
+    Reduce the noise in audio held in memory.
+    Takes the same settings as reduce_noise_in_audio.
+    
+    Args:
+        data: Samples of the recording, integer or float
+        fs: Sample rate in Hz
+    
+    Returns:
+        The denoised samples, with the dtype and scale of data from the numpy
+        engine, whatever noisereduce.reduce_noise returns otherwise
+    """
+    if engine not in ('numpy', 'noisereduce'):
+        raise ValueError(f"Unknown noise reduction engine: {engine}")
+    data = np.asarray(data)
+    if engine == 'numpy':
+        unsupported = sorted(set(kwargs) - NUMPY_ENGINE_OPTIONS)
+        if not stationary or data.ndim != 1 or unsupported:
+            if noise_profile is not None:
+                raise ValueError("noise_profile needs the numpy engine: stationary reduction of mono audio"
+                                 + (f", without {', '.join(unsupported)}" if unsupported else ""))
+            engine = 'noisereduce'
+    
+    if engine == 'numpy':
+        if 'n_std_thresh_stationary' in kwargs:
+            kwargs['n_std_thresh'] = kwargs.pop('n_std_thresh_stationary')
+        kwargs.pop('use_tqdm', None)
+        if isinstance(noise_profile, str):
+            noise_profile = NoiseProfile.load(noise_profile)
+        elif noise_profile is None and 'noise_seconds' not in kwargs:
+            # Like noisereduce's stationary mode, measure the noise over the whole clip
+            # rather than its start, which may already be speech
+            n_fft = kwargs.get('n_fft', N_FFT)
+            noise_profile = estimate_noise_profile(data, fs, n_fft, kwargs.get('hop_length'))
+        # A saved profile holds absolute levels: bring the samples to the scale it was measured at
+        factor = noise_profile.scale / full_scale(data.dtype) if noise_profile is not None else 1.0
+        if factor == 1.0:
+            reduced = denoise(data, fs, profile=noise_profile, prop_decrease=prop_decrease, **kwargs)
+        else:
+            reduced = denoise(data * factor, fs, profile=noise_profile, prop_decrease=prop_decrease,
+                              **kwargs) / factor
+        if data.dtype.kind in 'iu':
+            info = np.iinfo(data.dtype)
+            return np.clip(np.rint(reduced), info.min, info.max).astype(data.dtype)
+        return reduced.astype(data.dtype)
+    if noise_profile is not None:
+        raise ValueError("noise_profile only works with the numpy engine")
+    
+    # noisereduce takes a while to import, so load it on first use
+    import noisereduce as nr
     
     # Prepare parameters dictionary with default values
     params = {
@@ -36,17 +127,533 @@ def reduce_noise_in_audio(input_file_path, output_file_path, prop_decrease=0.75,
     params.update(kwargs)
     
     # Reduce noise using noisereduce with the parameters
-    reduced_noise = nr.reduce_noise(**params)
-    
-    # Write the cleaned audio to a new file
-    wavfile.write(output_file_path, fs, reduced_noise)
+    return nr.reduce_noise(**params)
 
 
+def read_wav(path):
+    """
+    Read a 16-bit mono WAV file without going through scipy.
 
+    Returns:
+        tuple: (sample rate, int16 array)
+    """
+    import wave
+
+    with wave.open(path, 'rb') as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError(f"{path} is not 16-bit mono audio")
+        return wav.getframerate(), np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+
+
+def map_wav(path):
+    """
+    Memory-map the samples of a 16-bit mono WAV file instead of reading them.
+
+    The samples are paged in from the file as they are used, and processes
+    mapping the same file share one copy in the OS page cache.
+
+    Returns:
+        tuple: (sample rate, read-only int16 numpy.memmap)
+    """
+    import struct
+
+    with open(path, 'rb') as file:
+        riff, _, wave_id = struct.unpack('<4sI4s', file.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"{path} is not a WAV file")
+        rate = None
+        while True:
+            header = file.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                audio_format, channels, rate, _, _, bits = struct.unpack('<HHIIHH', file.read(16))
+                if audio_format != 1 or channels != 1 or bits != 16:
+                    raise ValueError(f"{path} is not 16-bit mono audio")
+                file.seek(size - 16 + size % 2, 1)
+            elif chunk_id == b'data':
+                if rate is None:
+                    raise ValueError(f"{path} has no fmt chunk before its data")
+                offset = file.tell()
+                # Recorders that were cut off may leave a wrong size behind
+                size = min(size, os.path.getsize(path) - offset)
+                break
+            else:
+                file.seek(size + size % 2, 1)
+    if size < 2:
+        return rate, np.zeros(0, dtype='<i2')
+    return rate, np.memmap(path, dtype='<i2', mode='r', offset=offset, shape=(size // 2,))
+
+
+def write_wav(path, sr, samples):
+    """Write int16 samples to a mono WAV file"""
+    from record import WavWriter
+
+    with WavWriter(path, rate=sr, preallocate_seconds=0) as writer:
+        writer.write(samples)
+
+
+def save_noise_profile(input_file_path, profile_path, seconds=None, n_fft=None, hop_length=None):
+    """
+    Measure the noise profile of a recording of the room and save it for reuse.
+
+    Args:
+        input_file_path: WAV file containing only background noise
+        profile_path: Where to save the profile (.npz)
+        seconds: Only use the first `seconds` of the file (default: all of it)
+        n_fft, hop_length: STFT settings the profile will be used with
+
+    Returns:
+        NoiseProfile
+    """
+    fs, data = read_wav(input_file_path)
+    if seconds is not None:
+        data = data[:int(seconds * fs)]
+    profile = estimate_noise_profile(data, fs, n_fft or N_FFT, hop_length)
+    profile.save(profile_path)
+    return profile
+
+
+# Spectral gating settings, the same defaults as noisereduce.reduce_noise
+N_FFT = 1024
+N_STD_THRESH = 1.5
+FREQ_MASK_SMOOTH_HZ = 500
+TIME_MASK_SMOOTH_MS = 50
+TOP_DB = 80.0
+# Length of the start of a recording used as the noise sample (the user has
+# only just pressed the button, so this is room noise)
+NOISE_SECONDS = 0.5
+
+_EPS = np.finfo(np.float64).eps
+
+
+def full_scale(dtype):
+    """Largest sample magnitude of a dtype: 2 ** (bits - 1) for integers, 1.0 for floats"""
+    dtype = np.dtype(dtype)
+    return 2.0 ** (dtype.itemsize * 8 - 1) if dtype.kind in 'iu' else 1.0
+
+
+def _hann(n):
+    """Periodic Hann window, as scipy.signal.stft uses"""
+    return 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n) / n)
+
+
+def _triangle(n_grad):
+    """Normalized triangular smoothing kernel of length 2 * n_grad + 1 (see noisereduce)"""
+    half = np.arange(1, n_grad + 2) / (n_grad + 1)
+    kernel = np.concatenate((half, half[-2::-1]))
+    return kernel / kernel.sum()
+
+
+@functools.lru_cache(maxsize=8)
+def _gate_setup(sr, n_fft, hop_length, freq_mask_smooth_hz, time_mask_smooth_ms, dtype):
+    """
+    Window and mask smoothing filters for one STFT configuration.
+
+    Cached so repeated recordings with the same settings reuse the same
+    buffers instead of rebuilding them (the frequency smoothing matrix alone
+    is n_fft / 2 + 1 squared).
+
+    Returns:
+        tuple: (window, frequency smoothing matrix or None, time kernel or None)
+    """
+    dtype = np.dtype(dtype)
+    window = _hann(n_fft).astype(dtype)
+    window.flags.writeable = False
+    if freq_mask_smooth_hz is None and time_mask_smooth_ms is None:
+        return window, None, None
+    n_grad_freq = 1 if freq_mask_smooth_hz is None else int(freq_mask_smooth_hz / (sr / (n_fft / 2)))
+    n_grad_time = 1 if time_mask_smooth_ms is None else int(time_mask_smooth_ms / (hop_length / sr * 1000))
+    if n_grad_freq < 1 or n_grad_time < 1:
+        raise ValueError("Mask smoothing range is shorter than one STFT bin or frame")
+    if n_grad_freq == 1 and n_grad_time == 1:
+        return window, None, None
+    kernel = _triangle(n_grad_freq)
+    bins = np.arange(n_fft // 2 + 1)
+    offset = bins[None, :] - bins[:, None]
+    matrix = np.where(np.abs(offset) <= n_grad_freq,
+                      kernel[np.clip(offset + n_grad_freq, 0, 2 * n_grad_freq)], 0.0).astype(dtype)
+    matrix.flags.writeable = False
+    return window, matrix, _triangle(n_grad_time).astype(dtype)
+
+
+def _frames(x, n_fft, hop_length):
+    """All complete frames of x, one per row"""
+    if len(x) < n_fft:
+        return np.zeros((0, n_fft))
+    return np.lib.stride_tricks.sliding_window_view(x, n_fft)[::hop_length]
+
+
+def _overlap_add(frames, hop_length):
+    """Overlap-add rows spaced hop_length apart; returns (len(frames) - 1) * hop + n_fft samples"""
+    count, n_fft = frames.shape
+    out = np.zeros((count - 1) * hop_length + n_fft, dtype=frames.dtype)
+    if n_fft % hop_length == 0:
+        # Add the frames a hop-sized column at a time
+        columns = out.reshape(-1, hop_length)
+        parts = frames.reshape(count, n_fft // hop_length, hop_length)
+        for j in range(n_fft // hop_length):
+            columns[j:j + count] += parts[:, j]
+    else:
+        for k in range(count):
+            out[k * hop_length:k * hop_length + n_fft] += frames[k]
+    return out
+
+
+class NoiseProfile:
+    """
+    Per-frequency statistics of the background noise, in dB.
+
+    Attributes:
+        mean_db: Mean level of each STFT bin
+        std_db: Standard deviation of each bin's level
+        sr, n_fft, hop_length: STFT the statistics were measured with
+        scale: Full-scale sample value of the audio they were measured on
+               (32768.0 for 16-bit PCM, 1.0 for float audio; see full_scale)
+    """
+
+    def __init__(self, mean_db, std_db, sr, n_fft, hop_length, scale=32768.0):
+        self.mean_db = np.asarray(mean_db)
+        self.std_db = np.asarray(std_db)
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.scale = float(scale)
+
+    def threshold(self, n_std_thresh=N_STD_THRESH):
+        """Level above which a bin counts as signal"""
+        return self.mean_db + n_std_thresh * self.std_db
+
+    def save(self, path):
+        """Save the profile to a .npz file"""
+        with open(path, 'wb') as file:
+            np.savez(file, mean_db=self.mean_db, std_db=self.std_db,
+                     stft=np.array([self.sr, self.n_fft, self.hop_length]), scale=self.scale)
+
+    @classmethod
+    def load(cls, path):
+        """Load a profile written by save()"""
+        with np.load(path) as data:
+            sr, n_fft, hop_length = (int(v) for v in data['stft'])
+            # Profiles saved without a scale were measured on 16-bit recordings
+            scale = float(data['scale']) if 'scale' in data else 32768.0
+            return cls(data['mean_db'], data['std_db'], sr, n_fft, hop_length, scale)
+
+
+def estimate_noise_profile(noise, sr, n_fft=N_FFT, hop_length=None, scale=None):
+    """
+    Measure the noise statistics of a noise-only clip.
+
+    Uses the same STFT framing and dB floor as noisereduce, so the thresholds
+    match what noisereduce computes for the same clip.
+
+    Args:
+        noise: Samples containing only background noise
+        sr: Sample rate in Hz
+        scale: Full-scale sample value of the noise (default: from its dtype)
+
+    Returns:
+        NoiseProfile
+    """
+    hop_length = hop_length or n_fft // 4
+    if scale is None:
+        scale = full_scale(np.asarray(noise).dtype)
+    window = _hann(n_fft)
+    padded = np.pad(np.asarray(noise, dtype=float), n_fft // 2)
+    spectra = np.fft.rfft(_frames(padded, n_fft, hop_length) * window, axis=1) / window.sum()
+    db = 20 * np.log10(np.abs(spectra) + _EPS)
+    if len(db):
+        db = np.maximum(db, db.max(axis=0) - TOP_DB)
+    else:
+        db = np.zeros((1, n_fft // 2 + 1))
+    return NoiseProfile(db.mean(axis=0), db.std(axis=0), sr, n_fft, hop_length, scale)
+
+
+class StreamingDenoiser:
+    """
+    Stationary spectral gating over audio that arrives in pieces.
+
+    Same algorithm as noisereduce's stationary mode: STFT bins below the
+    noise threshold are attenuated by prop_decrease, the mask is smoothed over
+    frequency and time, and the signal is rebuilt by overlap-add. Frames are
+    processed as soon as their samples (plus the few frames of look-ahead the
+    time smoothing needs) have arrived, so the output lags the input by well
+    under a tenth of a second and memory use doesn't grow with the recording.
+    Feeding a recording in any number of pieces gives the same output as
+    feeding it at once, up to floating point rounding.
+
+    Unlike noisereduce, the level floor (max - 80 dB per bin) is only applied
+    to the noise profile, since the maximum of a bin over the whole recording
+    isn't known while it streams in. Bins are compared with the threshold as
+    power rather than dB, which skips a logarithm per bin, and the work is
+    done in float32 by default.
+
+    Args:
+        sr: Sample rate in Hz
+        profile: NoiseProfile to use; by default one is measured from the
+                 first `noise_seconds` of the input
+        prop_decrease: How much to reduce the noise by (0.0 to 1.0)
+        n_std_thresh: Standard deviations above the mean noise level a bin must
+                      reach to count as signal
+        n_fft, hop_length: STFT size and step (hop defaults to n_fft // 4)
+        freq_mask_smooth_hz, time_mask_smooth_ms: Mask smoothing ranges
+        noise_seconds: Length of the noise sample taken from the input
+        dtype: Floating point type of the computation (float32 or float64)
+    """
+
+    def __init__(self, sr, profile=None, prop_decrease=1.0, n_std_thresh=N_STD_THRESH, n_fft=N_FFT,
+                 hop_length=None, freq_mask_smooth_hz=FREQ_MASK_SMOOTH_HZ,
+                 time_mask_smooth_ms=TIME_MASK_SMOOTH_MS, noise_seconds=NOISE_SECONDS, dtype=np.float32):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length or n_fft // 4
+        self.prop_decrease = prop_decrease
+        self.n_std_thresh = n_std_thresh
+        self.noise_samples = int(noise_seconds * sr)
+        self.dtype = np.dtype(dtype)
+        self.window, self._freq_smoothing, self._time_kernel = _gate_setup(
+            sr, n_fft, self.hop_length, freq_mask_smooth_hz, time_mask_smooth_ms, self.dtype.name)
+        self._window_power = self.window ** 2
+        self._lookahead = len(self._time_kernel) // 2 if self._time_kernel is not None else 0
+        # Mask of a frame that is all below the threshold (also used outside the signal)
+        self._quiet = self._smooth_freq(np.full((1, n_fft // 2 + 1), 1.0 - prop_decrease, dtype=self.dtype))[0]
+
+        self.profile = None
+        self._power_threshold = None
+        self._head = []  # input held back until the noise profile is known
+        if profile is not None:
+            self._set_profile(profile)
+
+        # Input is kept in "padded" coordinates: n_fft // 2 zeros precede the first sample
+        self.samples_in = 0
+        self.samples_out = 0
+        self._input = np.zeros(n_fft // 2, dtype=self.dtype)
+        self._input_start = 0        # padded index of self._input[0]
+        self._next_frame = 0         # next frame to analyze
+        self._spectra = np.zeros((0, n_fft // 2 + 1), dtype=np.result_type(self.dtype, 1j))  # analyzed, not yet synthesized
+        self._masks = np.tile(self._quiet, (self._lookahead, 1))       # from frame _next_synth - lookahead
+        self._next_synth = 0         # next frame to synthesize
+        self._output = np.zeros(n_fft, dtype=self.dtype)  # overlap-add sums from padded index _output_start
+        self._norm = np.zeros(n_fft, dtype=self.dtype)
+        self._output_start = 0
+
+    def _smooth_freq(self, masks):
+        if self._freq_smoothing is None:
+            return masks
+        return masks @ self._freq_smoothing
+
+    def _set_profile(self, profile):
+        if profile.n_fft != self.n_fft or profile.hop_length != self.hop_length:
+            raise ValueError("Noise profile was measured with a different STFT size")
+        self.profile = profile
+        # db > threshold  <=>  |X| / window.sum() + eps > 10 ** (threshold / 20)
+        magnitude = (10 ** (profile.threshold(self.n_std_thresh) / 20) - _EPS) * float(self.window.sum())
+        self._power_threshold = (np.maximum(magnitude, 0) ** 2).astype(self.dtype)
+
+    def process(self, samples):
+        """
+        Denoise the next piece of audio.
+
+        Args:
+            samples: 1-D array of new input samples
+
+        Returns:
+            float array of the denoised samples that are complete so far
+            (possibly empty; the rest comes from later calls and flush())
+        """
+        samples = np.asarray(samples, dtype=self.dtype)
+        self.samples_in += len(samples)
+        if self.profile is None:
+            self._head.append(samples)
+            if self.samples_in < self.noise_samples:
+                return np.zeros(0, dtype=self.dtype)
+            samples = np.concatenate(self._head)
+            self._head = []
+            self._set_profile(estimate_noise_profile(samples[:self.noise_samples], self.sr,
+                                                     self.n_fft, self.hop_length))
+        self._input = np.concatenate((self._input, samples))
+        self._analyze()
+        self._synthesize(self._next_frame - self._lookahead)
+        return self._emit(self._next_synth * self.hop_length)
+
+    def flush(self):
+        """
+        Finish the stream.
+
+        Returns:
+            float array of the remaining denoised samples
+        """
+        if self.profile is None:
+            head = np.concatenate(self._head) if self._head else np.zeros(0, dtype=self.dtype)
+            self._head = []
+            self._set_profile(estimate_noise_profile(head[:self.noise_samples], self.sr,
+                                                     self.n_fft, self.hop_length))
+            self._input = np.concatenate((self._input, head))
+        # Pad with zeros until every frame that starts inside the signal is complete
+        end = self.n_fft // 2 + self.samples_in
+        last_frame = max(-(-end // self.hop_length) - 1, 0)
+        missing = last_frame * self.hop_length + self.n_fft - (self._input_start + len(self._input))
+        if missing > 0:
+            self._input = np.concatenate((self._input, np.zeros(missing, dtype=self.dtype)))
+        self._analyze()
+        self._synthesize(self._next_frame)
+        return self._emit(end, final=True)
+
+    def _analyze(self):
+        """Compute spectra and frequency-smoothed masks of the frames whose samples have arrived"""
+        offset = self._next_frame * self.hop_length - self._input_start
+        frames = _frames(self._input[offset:], self.n_fft, self.hop_length)
+        if not len(frames):
+            return
+        spectra = np.fft.rfft(frames * self.window, axis=1)
+        power = spectra.real ** 2 + spectra.imag ** 2
+        masks = np.where(power > self._power_threshold, self.dtype.type(1.0),
+                         self.dtype.type(1.0 - self.prop_decrease))
+        self._spectra = np.concatenate((self._spectra, spectra))
+        self._masks = np.concatenate((self._masks, self._smooth_freq(masks)))
+        self._next_frame += len(frames)
+        # Keep only the samples later frames still need
+        keep_from = self._next_frame * self.hop_length - self._input_start
+        self._input = self._input[keep_from:]
+        self._input_start += keep_from
+
+    def _synthesize(self, until):
+        """Apply the time-smoothed masks to the frames before `until` and overlap-add them"""
+        count = until - self._next_synth
+        if count <= 0:
+            return
+        lookahead = self._lookahead
+        if len(self._masks) < count + 2 * lookahead:
+            # Frames past the end of the analyzed audio count as quiet
+            missing = count + 2 * lookahead - len(self._masks)
+            self._masks = np.concatenate((self._masks, np.tile(self._quiet, (missing, 1))))
+        if self._time_kernel is None:
+            masks = self._masks[:count]
+        else:
+            masks = np.zeros((count, self._masks.shape[1]), dtype=self.dtype)
+            for j, weight in enumerate(self._time_kernel):
+                masks += weight * self._masks[j:j + count]
+
+        # The STFT scaling by 1 / window.sum() cancels out in the inverse
+        frames = np.fft.irfft(self._spectra[:count] * masks, n=self.n_fft, axis=1) * self.window
+        start = self._next_synth * self.hop_length - self._output_start
+        block = _overlap_add(frames, self.hop_length)
+        norm = _overlap_add(np.broadcast_to(self._window_power, frames.shape), self.hop_length)
+        needed = start + len(block) - len(self._output)
+        if needed > 0:
+            self._output = np.concatenate((self._output, np.zeros(needed, dtype=self.dtype)))
+            self._norm = np.concatenate((self._norm, np.zeros(needed, dtype=self.dtype)))
+        self._output[start:start + len(block)] += block
+        self._norm[start:start + len(norm)] += norm
+
+        self._spectra = self._spectra[count:]
+        self._masks = self._masks[count:]
+        self._next_synth = until
+
+    def _emit(self, until, final=False):
+        """Return the finished output samples before padded index `until`"""
+        count = until - self._output_start
+        if not final:
+            count = min(count, self._next_synth * self.hop_length - self._output_start)
+        if count <= 0:
+            return np.zeros(0, dtype=self.dtype)
+        output = self._output[:count]
+        norm = self._norm[:count]
+        output = np.where(norm > 1e-10, output / np.where(norm > 1e-10, norm, 1.0), output)
+        # Drop the padding in front of the first sample
+        skip = max(self.n_fft // 2 - self._output_start, 0)
+        self._output = self._output[count:]
+        self._norm = self._norm[count:]
+        self._output_start += count
+        output = output[skip:]
+        self.samples_out += len(output)
+        return output
+
+
+def denoise(y, sr, **kwargs):
+    """
+    Denoise a whole recording with StreamingDenoiser in one go.
+
+    Args:
+        y: 1-D array of samples
+        sr: Sample rate in Hz
+        **kwargs: StreamingDenoiser options
+
+    Returns:
+        float array of the same length as y
+    """
+    denoiser = StreamingDenoiser(sr, **kwargs)
+    return np.concatenate((denoiser.process(y), denoiser.flush()))
+
+
+def to_int16(samples):
+    """Round float samples to 16-bit PCM"""
+    return np.clip(np.rint(samples), -32768, 32767).astype(np.int16)
+
+
+def denoise_stream(source, output_file_path, sr, **kwargs):
+    """
+    Denoise audio while it is being recorded.
+
+    Reads new samples from `source` (a record.RingBuffer) until it is closed
+    and denoises them as they arrive.
+
+    Args:
+        source: RingBuffer the recorder writes to
+        output_file_path: WAV file to write the denoised audio to as it becomes
+                          available, or None to only return it
+        sr: Sample rate in Hz
+        **kwargs: StreamingDenoiser options
+
+    Returns:
+        int16 array: The denoised recording
+    """
+    from record import WavWriter
+
+    denoiser = StreamingDenoiser(sr, **kwargs)
+    writer = WavWriter(output_file_path, rate=sr) if output_file_path else None
+    pieces = []
+    try:
+        while True:
+            samples = source.read()
+            if samples is None:
+                break
+            pieces.append(to_int16(denoiser.process(samples)))
+            if writer:
+                writer.write(pieces[-1])
+        pieces.append(to_int16(denoiser.flush()))
+        if writer:
+            writer.write(pieces[-1])
+    finally:
+        if writer:
+            writer.close()
+    return np.concatenate(pieces)
+
+
+
+
+def pesq_score(clean, denoised, sr):
+    """
+    PESQ score of denoised audio against the clean recording (wideband at
+    16 kHz and up, narrowband below; the pesq package takes 8 or 16 kHz).
+    The signals are cut to the shorter of the two.
+    """
+    from pesq import pesq
+
+    length = min(len(clean), len(denoised))
+    mode = 'wb' if sr >= 16000 else 'nb'
+    return pesq(sr, np.asarray(clean[:length], dtype=np.float64), np.asarray(denoised[:length], dtype=np.float64), mode)
+
+
+def stoi_score(clean, denoised, sr, extended=False):
+    """STOI intelligibility (0 to 1) of denoised audio against the clean recording"""
+    from pystoi import stoi
+
+    length = min(len(clean), len(denoised))
+    return stoi(np.asarray(clean[:length], dtype=np.float64), np.asarray(denoised[:length], dtype=np.float64),
+                sr, extended=extended)
 
-import numpy as np
-from scipy.io import wavfile
-from pesq import pesq
 
 def evaluate_noise_reduction_pesq(original_filepath, denoised_filepath):
     """
@@ -59,6 +666,8 @@ def evaluate_noise_reduction_pesq(original_filepath, denoised_filepath):
     Returns:
     - float: PESQ score indicating the perceptual quality of the denoised audio.
     """
+    from scipy.io import wavfile
+    
     # Load the audio files
     fs_orig, audio_orig = wavfile.read(original_filepath)
     fs_denoised, audio_denoised = wavfile.read(denoised_filepath)
@@ -73,17 +682,8 @@ def evaluate_noise_reduction_pesq(original_filepath, denoised_filepath):
     if audio_denoised.ndim > 1:
         audio_denoised = np.mean(audio_denoised, axis=1)
     
-    # Truncate both signals to the same length
-    min_len = min(len(audio_orig), len(audio_denoised))
-    audio_orig = audio_orig[:min_len]
-    audio_denoised = audio_denoised[:min_len]
-    
-    # Set the mode: 'wb' for wideband (>=16kHz) or 'nb' for narrowband (<16kHz)
-    mode = 'wb' if fs_orig >= 16000 else 'nb'
-    
     # Compute and return the PESQ score
-    pesq_score = pesq(fs_orig, audio_orig, audio_denoised, mode)
-    return pesq_score
+    return pesq_score(audio_orig, audio_denoised, fs_orig)
 
 # Example usage:
 # if __name__ == "__main__":
@@ -0,0 +1,140 @@
+"""
+Transcribe a long recording in pieces at the same time.
+
+The audio is cut into chunks at silences between the speech segments found by
+vad.py, the chunks are transcribed concurrently (each by its own whisper
+process), and the texts are put back together in order. Where a chunk has to
+be cut in the middle of speech, neighbouring chunks overlap a little so a word
+on the cut is heard whole by one of them, and the words both chunks heard are
+removed again when merging.
+
+    text = transcribe_parallel(samples, segments, worker_pool.transcribe, workers=2)
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from record import RATE
+
+MIN_CHUNK_SECONDS = 10.0
+# whisper works on 30 s windows; longer chunks are transcribed in several passes
+MAX_CHUNK_SECONDS = 30.0
+OVERLAP_SECONDS = 1.0
+# Longest run of repeated words looked for where two overlapping chunks meet
+MAX_OVERLAP_WORDS = 8
+
+
+class Chunk:
+    """
+    A piece of the audio to transcribe on its own.
+
+    Attributes:
+        start, end: Sample indices (end exclusive)
+        overlap: True if it starts inside speech and repeats the end of the previous chunk
+    """
+
+    __slots__ = ('start', 'end', 'overlap')
+
+    def __init__(self, start, end, overlap=False):
+        self.start = start
+        self.end = end
+        self.overlap = overlap
+
+    def __repr__(self):
+        return f"Chunk({self.start}-{self.end}{', overlap' if self.overlap else ''})"
+
+
+def plan_chunks(segments, total_samples, chunk_seconds, sr=RATE, overlap_seconds=OVERLAP_SECONDS):
+    """
+    Group consecutive speech segments into chunks of about chunk_seconds.
+
+    Chunks are cut in the middle of the silence between two segments. Where two
+    segments touch (vad split one stretch of speech) there is no silence, so the
+    next chunk starts overlap_seconds early instead.
+
+    Args:
+        segments: Speech segments (vad.Segment) in order, positions in the audio
+        total_samples: Length of the audio
+        chunk_seconds: Target chunk length; a chunk holds at least one segment
+        sr: Sample rate in Hz
+        overlap_seconds: Audio shared by chunks cut inside speech
+
+    Returns:
+        list of Chunk covering the audio from start to end
+    """
+    if not segments:
+        return [Chunk(0, total_samples)]
+    limit = int(chunk_seconds * sr)
+    overlap = int(overlap_seconds * sr)
+    chunks = [Chunk(0, total_samples)]
+    for previous, segment in zip(segments, segments[1:]):
+        current = chunks[-1]
+        if segment.end - current.start <= limit:
+            continue
+        if segment.start > previous.end:
+            cut = (previous.end + segment.start) // 2
+            current.end = cut
+            chunks.append(Chunk(cut, total_samples))
+        else:
+            current.end = previous.end
+            chunks.append(Chunk(max(previous.end - overlap, current.start), total_samples, overlap=True))
+    return chunks
+
+
+def _normalize(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def merge_transcripts(texts, overlaps=None, max_overlap_words=MAX_OVERLAP_WORDS):
+    """
+    Join chunk transcripts in order, dropping the words overlapping chunks both heard.
+
+    Args:
+        texts: Transcript of each chunk
+        overlaps: For each chunk, whether it overlaps the previous one; only
+                  there are repeated words removed (default: nowhere)
+        max_overlap_words: Longest repeat looked for
+
+    Returns:
+        str
+    """
+    words = []
+    for index, text in enumerate(texts):
+        new = text.split()
+        if overlaps and overlaps[index] and words:
+            tail = [_normalize(word) for word in words[-max_overlap_words:]]
+            head = [_normalize(word) for word in new[:max_overlap_words]]
+            for count in range(min(len(tail), len(head)), 0, -1):
+                if tail[-count:] == head[:count]:
+                    new = new[count:]
+                    break
+        words.extend(new)
+    return " ".join(words)
+
+
+def transcribe_parallel(audio, segments, transcribe, workers, sr=RATE, min_chunk_seconds=MIN_CHUNK_SECONDS,
+                        max_chunk_seconds=MAX_CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS):
+    """
+    Transcribe the chunks of a recording concurrently.
+
+    Args:
+        audio: int16 samples
+        segments: Speech segments of the audio (vad.detect_speech)
+        transcribe: Function taking an int16 array and returning its text;
+                    called from `workers` threads at once
+        workers: Number of chunks transcribed at the same time
+        sr: Sample rate in Hz
+        min_chunk_seconds, max_chunk_seconds: Bounds of the chunk length; within
+                    them the audio is split evenly between the workers
+        overlap_seconds: See plan_chunks
+
+    Returns:
+        tuple: (text, chunks)
+    """
+    seconds = len(audio) / sr
+    chunk_seconds = min(max(seconds / workers, min_chunk_seconds), max_chunk_seconds)
+    chunks = plan_chunks(segments, len(audio), chunk_seconds, sr, overlap_seconds)
+    if len(chunks) == 1:
+        return transcribe(audio), chunks
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcribe") as executor:
+        texts = list(executor.map(lambda chunk: transcribe(audio[chunk.start:chunk.end]), chunks))
+    return merge_transcripts(texts, [chunk.overlap for chunk in chunks]), chunks
@@ -0,0 +1,209 @@
+"""
+Staged job pipeline: each stage runs on its own worker thread(s) and hands
+jobs to the next stage through a bounded queue.
+
+While one dictation is being transcribed the next can already be denoised
+and a third recorded, so back-to-back dictations are limited by the slowest
+stage rather than the sum of all of them. The queues are small on purpose:
+when a stage falls behind, the stages before it block on a full queue and
+submit() reports the pipeline as full (backpressure), instead of recordings
+piling up in memory.
+
+    pipeline = Pipeline([("denoise", denoise_job), ("transcribe", transcribe_job)],
+                        on_done=report).start()
+    pipeline.submit(Job(recording="recordings/a.wav"))
+    ...
+    pipeline.stop()  # finishes the queued jobs
+"""
+import itertools
+import logging
+import queue
+import threading
+import time
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Jobs that may wait in front of each stage
+QUEUE_SIZE = 1
+
+_STOP = object()
+_ids = itertools.count(1)
+
+
+class Job:
+    """
+    One dictation moving through the pipeline.
+
+    Stage functions read and set attributes on it (recording, audio,
+    transcript, ...); any keyword argument becomes an attribute.
+
+    Attributes:
+        id: Unique id, used in the names of the job's output files
+        trace: tracing.Trace of the job, or None
+        timings: Seconds spent in each stage
+        waits: Seconds spent waiting in front of each stage
+        error: The exception that ended the job, if one did
+        completed: False if a stage ended the job early
+    """
+
+    def __init__(self, job_id=None, trace=None, **fields):
+        self.id = job_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{next(_ids)}"
+        self.trace = trace
+        self.created = time.perf_counter()
+        self.timings = {}
+        self.waits = {}
+        self.error = None
+        self.completed = False
+        self.__dict__.update(fields)
+
+    def __repr__(self):
+        return f"Job({self.id})"
+
+
+class Pipeline:
+    """
+    Runs jobs through a fixed sequence of stages.
+
+    Args:
+        stages: List of (name, function) or (name, function, workers). The
+                function is called with the Job; returning False ends the job
+                early (e.g. nothing was said). An exception ends it with
+                job.error set.
+        queue_size: Jobs that may wait in front of each stage
+        on_change: Called with the pipeline whenever the number of jobs in it changes
+        on_done: Called with each job when it leaves the pipeline
+    """
+
+    def __init__(self, stages, queue_size=QUEUE_SIZE, on_change=None, on_done=None):
+        self.stages = []
+        for stage in stages:
+            name, function, workers = (tuple(stage) + (1,))[:3]
+            self.stages.append((name, function, workers))
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in self.stages]
+        self.on_change = on_change
+        self.on_done = on_done
+        self.in_flight = 0
+        self.busy = {name: 0 for name, _, _ in self.stages}
+        self._threads = []
+        self._stopped_workers = [0] * len(self.stages)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def start(self):
+        for index, (name, _, workers) in enumerate(self.stages):
+            for number in range(workers):
+                thread = threading.Thread(target=self._work, args=(index,), name=f"{name}-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    @property
+    def full(self):
+        """True if a new job can't be queued without waiting"""
+        return self.queues[0].full()
+
+    def occupancy(self):
+        """Jobs waiting in front of and running in each stage, {name: (queued, running)}"""
+        with self._lock:
+            return {name: (stage_queue.qsize(), self.busy[name])
+                    for (name, _, _), stage_queue in zip(self.stages, self.queues)}
+
+    def submit(self, job, block=True, timeout=None):
+        """
+        Queue a job for the first stage.
+
+        Args:
+            block: Wait for room in the queue; with block=False a full
+                   pipeline refuses the job
+            timeout: Longest wait in seconds when blocking
+
+        Returns:
+            bool: True if the job was queued
+        """
+        with self._lock:
+            self.in_flight += 1
+        job.queued = time.perf_counter()
+        try:
+            self.queues[0].put(job, block, timeout)
+        except queue.Full:
+            with self._lock:
+                self.in_flight -= 1
+            return False
+        self._changed()
+        return True
+
+    def _changed(self):
+        if self.on_change is not None:
+            try:
+                self.on_change(self)
+            except Exception:
+                logger.exception("Pipeline on_change callback failed")
+
+    def _work(self, index):
+        name, function, workers = self.stages[index]
+        stage_queue = self.queues[index]
+        next_queue = self.queues[index + 1] if index + 1 < len(self.queues) else None
+        while True:
+            job = stage_queue.get()
+            if job is _STOP:
+                self._worker_stopped(index)
+                return
+            job.waits[name] = time.perf_counter() - job.queued
+            with self._lock:
+                self.busy[name] += 1
+            if index == 0:
+                # There is room for another job now
+                self._changed()
+            start = time.perf_counter()
+            try:
+                with tracing.use_trace(job.trace):
+                    proceed = function(job) is not False
+            except Exception as e:
+                logger.error("Job %s failed in %s: %s", job.id, name, e)
+                job.error = e
+                proceed = False
+            job.timings[name] = time.perf_counter() - start
+            if proceed and next_queue is not None:
+                job.queued = time.perf_counter()
+                # Blocks while the next stage is backed up
+                next_queue.put(job)
+            with self._lock:
+                self.busy[name] -= 1
+            if not proceed or next_queue is None:
+                job.completed = proceed
+                self._finish(job)
+
+    def _finish(self, job):
+        if self.on_done is not None:
+            try:
+                self.on_done(job)
+            except Exception:
+                logger.exception("Pipeline on_done callback failed")
+        with self._lock:
+            self.in_flight -= 1
+            self._idle.notify_all()
+        self._changed()
+
+    def _worker_stopped(self, index):
+        # The last worker of a stage to stop passes the stop on to the next stage
+        with self._lock:
+            self._stopped_workers[index] += 1
+            last = self._stopped_workers[index] == self.stages[index][2]
+        if last and index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1][2]):
+                self.queues[index + 1].put(_STOP)
+
+    def join(self, timeout=None):
+        """Wait until every submitted job has left the pipeline; returns False on timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self.in_flight == 0, timeout)
+
+    def stop(self, timeout=None):
+        """Finish the queued jobs, then stop the workers"""
+        for _ in range(self.stages[0][2]):
+            self.queues[0].put(_STOP)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
@@ -1,69 +1,310 @@
-import pyaudio
-import wave
+import os
+import struct
 import sys
 import signal
+import threading
 import time
 
-def record_audio(output_filename="output.wav", format=pyaudio.paInt16, channels=1, rate=16000, chunk=1024):
+import numpy as np
+
+# Recording format used throughout the pipeline (what whisper.cpp expects)
+RATE = 16000
+CHANNELS = 1
+CHUNK = 1024
+SAMPLE_WIDTH = 2  # bytes, 16-bit PCM
+
+WAV_HEADER_SIZE = 44
+
+
+def wav_header(data_bytes, rate=RATE, channels=CHANNELS, sample_width=SAMPLE_WIDTH):
+    """The 44-byte header of a PCM WAV file holding data_bytes of audio"""
+    block_align = channels * sample_width
+    return struct.pack('<4sI4s4sIHHIIHH4sI',
+                       b'RIFF', 36 + data_bytes, b'WAVE',
+                       b'fmt ', 16, 1, channels, rate,
+                       rate * block_align, block_align, sample_width * 8,
+                       b'data', data_bytes)
+
+
+def encode_wav(samples, rate=RATE):
+    """Encode mono int16 samples as an in-memory WAV file (bytes)"""
+    data = np.asarray(samples).astype('<i2', copy=False).tobytes()
+    return wav_header(len(data), rate) + data
+
+
+class WavWriter:
+    """
+    Writes 16-bit PCM audio to a WAV file as it arrives.
+
+    The header is written up front with placeholder sizes and patched when the
+    file is closed, so closing takes the same time however long the recording
+    is. Disk space for `preallocate_seconds` of audio is reserved up front (where
+    the filesystem supports it) so the SD card isn't extended on every chunk;
+    the file is truncated to the audio actually written on close.
+
+    Args:
+        filename: Path of the WAV file to create
+        rate: Sample rate in Hz
+        channels: Number of interleaved channels
+        sample_width: Bytes per sample
+        preallocate_seconds: How much audio to reserve space for up front
+    """
+
+    def __init__(self, filename, rate=RATE, channels=CHANNELS, sample_width=SAMPLE_WIDTH, preallocate_seconds=60):
+        self.filename = filename
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.data_bytes = 0
+        self._file = open(filename, 'wb')
+        if preallocate_seconds and hasattr(os, 'posix_fallocate'):
+            size = WAV_HEADER_SIZE + int(preallocate_seconds * rate) * channels * sample_width
+            try:
+                os.posix_fallocate(self._file.fileno(), 0, size)
+            except OSError:
+                pass
+        self._file.write(self._header(0))
+
+    def _header(self, data_bytes):
+        return wav_header(data_bytes, self.rate, self.channels, self.sample_width)
+
+    @property
+    def frames_written(self):
+        return self.data_bytes // (self.channels * self.sample_width)
+
+    def write(self, data):
+        """Append raw little-endian PCM bytes (or an int16 array)"""
+        if isinstance(data, np.ndarray):
+            data = data.astype('<i2', copy=False).tobytes()
+        self._file.write(data)
+        self.data_bytes += len(data)
+
+    def close(self):
+        """Drop the unused preallocated space and fill in the sizes in the header"""
+        if self._file.closed:
+            return
+        self._file.truncate(WAV_HEADER_SIZE + self.data_bytes)
+        self._file.seek(0)
+        self._file.write(self._header(self.data_bytes))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of the most recent int16 samples for a live consumer.
+
+    The capture thread writes, one consumer reads whatever arrived since its
+    last read. If the consumer falls more than `capacity` samples behind, the
+    oldest samples are dropped and counted in `overruns`.
+
+    Args:
+        capacity: Number of samples kept
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self._written = 0  # total samples ever written
+        self._read = 0     # total samples handed to the consumer
+        self.overruns = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.int16)
+        if len(samples) > self.capacity:
+            samples = samples[-self.capacity:]
+        with self._cond:
+            start = self._written % self.capacity
+            first = min(len(samples), self.capacity - start)
+            self._data[start:start + first] = samples[:first]
+            self._data[:len(samples) - first] = samples[first:]
+            self._written += len(samples)
+            if self._written - self._read > self.capacity:
+                self.overruns += self._written - self._read - self.capacity
+                self._read = self._written - self.capacity
+            self._cond.notify_all()
+
+    def close(self):
+        """Mark the end of the stream; read() returns what is left, then None"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def read(self, timeout=None):
+        """
+        Wait for new samples and return them.
+
+        Args:
+            timeout: Longest time to wait in seconds, None waits until data arrives
+
+        Returns:
+            int16 array of new samples (empty on timeout), or None once the
+            buffer is closed and drained
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._written > self._read or self.closed, timeout)
+            available = self._written - self._read
+            if not available:
+                return None if self.closed else np.zeros(0, dtype=np.int16)
+            start = self._read % self.capacity
+            first = min(available, self.capacity - start)
+            samples = np.concatenate((self._data[start:start + first], self._data[:available - first]))
+            self._read = self._written
+            return samples
+
+
+class Recorder:
+    """
+    Captures microphone audio on its own thread and streams it to disk.
+
+    Every chunk read from the input stream goes straight to a WavWriter (and to
+    an optional RingBuffer for a live consumer), so memory use stays constant
+    and stop() only has to patch the WAV header.
+
+    Args:
+        filename: WAV file to write, or None to only feed the ring buffer
+        rate: Sample rate in Hz
+        channels: Number of channels
+        chunk: Frames per read from the input stream
+        ring_seconds: Size of the ring buffer for live consumers, None for no ring buffer
+        stream: An already open input stream with read(frames) -> bytes; by
+                default a PyAudio input stream is opened
+        preallocate_seconds: Disk space reserved up front (see WavWriter)
+    """
+
+    def __init__(self, filename, rate=RATE, channels=CHANNELS, chunk=CHUNK, ring_seconds=None,
+                 stream=None, preallocate_seconds=60):
+        self.filename = filename
+        self.rate = rate
+        self.channels = channels
+        self.chunk = chunk
+        self.preallocate_seconds = preallocate_seconds
+        self.ring = RingBuffer(int(ring_seconds * rate * channels)) if ring_seconds else None
+        self.error = None
+        self._stream = stream
+        self._audio = None
+        self._writer = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def frames_recorded(self):
+        return self._writer.frames_written if self._writer else 0
+
+    @property
+    def seconds(self):
+        return self.frames_recorded / self.rate
+
+    def start(self):
+        """Open the input stream and the WAV file and start capturing"""
+        if self._stream is None:
+            import pyaudio
+            self._audio = pyaudio.PyAudio()
+            self._stream = self._audio.open(format=pyaudio.paInt16,
+                                            channels=self.channels,
+                                            rate=self.rate,
+                                            input=True,
+                                            frames_per_buffer=self.chunk)
+        if self.filename:
+            self._writer = WavWriter(self.filename, self.rate, self.channels,
+                                     preallocate_seconds=self.preallocate_seconds)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._capture, name="recorder", daemon=True)
+        self._thread.start()
+        return self
+
+    def _capture(self):
+        try:
+            while not self._stop.is_set():
+                data = self._read_chunk()
+                if not data:
+                    break
+                if self._writer:
+                    self._writer.write(data)
+                if self.ring:
+                    self.ring.write(np.frombuffer(data, dtype='<i2'))
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.ring:
+                self.ring.close()
+
+    def _read_chunk(self):
+        if self._audio is not None:
+            # Don't lose the whole recording to one late read
+            return self._stream.read(self.chunk, exception_on_overflow=False)
+        return self._stream.read(self.chunk)
+
+    def stop(self):
+        """
+        Stop capturing and finish the WAV file.
+
+        Returns:
+            The WAV filename (None without one)
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._audio is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._audio.terminate()
+            self._audio = None
+            self._stream = None
+        if self._writer:
+            self._writer.close()
+        if self.error:
+            raise self.error
+        return self.filename
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def record_audio(output_filename="output.wav", channels=CHANNELS, rate=RATE, chunk=CHUNK):
     """
     Record audio from microphone until manually stopped with Ctrl+C.
-    
+
     Parameters:
     - output_filename: name of the output WAV file
-    - format: audio format (default: 16-bit)
     - channels: number of audio channels (default: 1 for mono)
     - rate: sampling rate in Hz (default: 16000)
     - chunk: number of frames per buffer (default: 1024)
     """
-    # Initialize the PyAudio object
-    audio = pyaudio.PyAudio()
-    
-    # Open the audio stream for capturing input
-    stream = audio.open(format=format,
-                        channels=channels,
-                        rate=rate,
-                        input=True,
-                        frames_per_buffer=chunk)
-    
-    print("Recording... Press Ctrl+C to stop.")
-    
-    frames = []
-    recording = True
-    
+    recorder = Recorder(output_filename, rate=rate, channels=channels, chunk=chunk)
+    stopped = threading.Event()
+
     # Set up signal handler for clean exit on Ctrl+C
     def signal_handler(sig, frame):
-        nonlocal recording
-        recording = False
+        stopped.set()
         print("\nStopping recording...")
-    
+
     # Register the signal handler
     signal.signal(signal.SIGINT, signal_handler)
-    
-    # Record until stopped
+
+    recorder.start()
+    print("Recording... Press Ctrl+C to stop.")
+
+    # Record until stopped; the audio is written to the file as it comes in
     try:
-        while recording:
-            data = stream.read(chunk)
-            frames.append(data)
-    except KeyboardInterrupt:
-        pass
+        while not stopped.wait(0.1):
+            pass
     finally:
-        # Stop and close the stream properly, then terminate PyAudio
         print("Finished recording.")
-        stream.stop_stream()
-        stream.close()
-        audio.terminate()
-        
-        # Save the recorded frames as a WAV file
-        wave_file = wave.open(output_filename, 'wb')
-        wave_file.setnchannels(channels)
-        wave_file.setsampwidth(audio.get_sample_size(format))
-        wave_file.setframerate(rate)
-        wave_file.writeframes(b''.join(frames))
-        wave_file.close()
-        
+        recorder.stop()
         print(f"Audio saved to {output_filename}")
-        
-        return output_filename
+
+    return output_filename
 
 # Example usage
 if __name__ == "__main__":
@@ -1,41 +1,320 @@
-import requests
+import asyncio
+import json
+import logging
+import os
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from revision_cache import RevisionCache, is_non_speech, is_trivial
+
+logger = logging.getLogger(__name__)
 
 # Define constants
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 MODEL_NAME = "qwen2.5:0.5b"
 PROMPT_TEMPLATE = "Please check and fix ONLY the grammar in the following text. Do NOT change any words or rephrase the content. Keep the original meaning and vocabulary intact. Only correct grammatical errors. Return ONLY the corrected text without any explanations, prefixes, or phrases like 'In this revised version...': '{}'."
 
-def correct_and_rephrase(text):
-    payload = {
-        "model": MODEL_NAME,
-        "prompt": PROMPT_TEMPLATE.format(text),
-        "stream": False
-    }
-    try:
-        response = requests.post(OLLAMA_API_URL, json=payload)
+# Explanatory prefixes the model sometimes puts in front of the answer
+PREFIXES = [
+    "here is the corrected text:",
+    "corrected text:",
+    "in this revised version",
+    "the corrected sentence is:",
+    "grammar correction:"
+]
+# How long Ollama keeps the model loaded after a request (it unloads idle
+# models after 5 minutes by default, and reloading takes seconds on the Pi)
+KEEP_ALIVE = "30m"
+# (connect, read) timeouts in seconds
+TIMEOUT = (3.05, 60)
+RETRIES = 2
+# Sentence-by-sentence revision (correct_by_sentence): requests in flight at
+# once, and seconds a sentence may take before its original is kept
+SENTENCE_CONCURRENCY = 3
+SENTENCE_TIMEOUT = 20
+# Revisions are cached here (see revision_cache.py); None turns the cache off
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "revisions.sqlite3")
+
+
+def strip_prefixes(text):
+    """Remove the explanatory prefixes (see PREFIXES) from the start of a model answer"""
+    result = text.strip()
+    for prefix in PREFIXES:
+        if result.lower().startswith(prefix):
+            result = result[len(prefix):].strip()
+    return result
+
+
+class OllamaClient:
+    """
+    Client for Ollama's /api/generate that keeps its connection open.
+
+    Requests go through one pooled requests.Session (so the TCP connection is
+    reused), with timeouts, retries of failed connections and 5xx answers, and
+    keep_alive so Ollama doesn't unload the model between dictations.
+
+    Args:
+        url: The generate endpoint
+        model: Model name
+        timeout: Seconds, or a (connect, read) tuple
+        retries: Retries of failed connections and 502/503/504 answers
+        keep_alive: How long Ollama keeps the model loaded (Ollama duration, e.g. "30m")
+        prompt_template: Prompt with a {} for the text
+    """
+
+    def __init__(self, url=OLLAMA_API_URL, model=MODEL_NAME, timeout=TIMEOUT, retries=RETRIES,
+                 keep_alive=KEEP_ALIVE, prompt_template=PROMPT_TEMPLATE):
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.retries = retries
+        self.keep_alive = keep_alive
+        self.prompt_template = prompt_template
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            # Don't retry read timeouts: the model may just be slow, and a
+            # retry would start the whole generation again
+            retry = Retry(total=self.retries, read=0, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                          allowed_methods=None, raise_on_status=False)
+            self._session = requests.Session()
+            self._session.mount("http://", HTTPAdapter(max_retries=retry, pool_maxsize=4))
+            self._session.mount("https://", HTTPAdapter(max_retries=retry, pool_maxsize=4))
+        return self._session
+
+    def _post(self, prompt, stream, timeout=None):
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive
+        }
+        response = self.session.post(self.url, json=payload, timeout=timeout or self.timeout, stream=stream)
         response.raise_for_status()  # Will raise an exception for 4XX/5XX responses
-        result = response.json().get("response", "").strip()
-        
-        # Post-processing to remove explanatory prefixes if they still appear
-        prefixes = [
-            "here is the corrected text:",
-            "corrected text:",
-            "in this revised version",
-            "the corrected sentence is:",
-            "grammar correction:"
-        ]
-        
-        result_lower = result.lower()
-        for prefix in prefixes:
-            if result_lower.startswith(prefix):
-                result = result[len(prefix):].strip()
-                
-        return result
-    except requests.exceptions.RequestException as e:
-        print(f"Error connecting to Ollama: {e}")
-        print("Make sure Ollama is running with: sudo systemctl start ollama")
+        return response
+
+    def warm_up(self):
+        """
+        Load the model now so the first dictation doesn't wait for it.
+
+        Returns:
+            bool: True if Ollama answered
+        """
+        import requests
+
+        try:
+            # A request without a prompt only loads the model
+            self._post("", False).close()
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.warning("Could not warm up Ollama model %s: %s", self.model, e)
+            return False
+
+    def generate(self, prompt, timeout=None):
+        """Return the model's whole answer to prompt (timeout: overrides the client's)"""
+        return self._post(prompt, False, timeout).json().get("response", "")
+
+    def generate_stream(self, prompt):
+        """Yield the model's answer to prompt piece by piece as it is generated"""
+        with self._post(prompt, True) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                message = json.loads(line)
+                if message.get("error"):
+                    raise RuntimeError(message["error"])
+                if message.get("response"):
+                    yield message["response"]
+                if message.get("done"):
+                    break
+
+    def correct(self, text, timeout=None):
+        """Return the corrected text, without explanatory prefixes"""
+        return strip_prefixes(self.generate(self.prompt_template.format(text), timeout))
+
+    def correct_stream(self, text):
+        """
+        Yield the corrected text as it is generated.
+
+        The start of the answer is held back until it is long enough to tell
+        whether it begins with one of the PREFIXES, then the rest is passed on
+        as it arrives; the pieces join up to the text correct() returns.
+        """
+        longest = max(len(prefix) for prefix in PREFIXES)
+        pieces = self.generate_stream(self.prompt_template.format(text))
+        head = ""
+        for piece in pieces:
+            head += piece
+            if len(strip_prefixes(head)) >= longest:
+                break
+        # Keep the whitespace at the end of the head, it may be between two words
+        pending = head[len(head.rstrip()):] if head.strip() else ""
+        head = strip_prefixes(head)
+        if head:
+            yield head
+        for piece in pieces:
+            piece = pending + piece
+            words = piece.rstrip()
+            # Hold back trailing whitespace so the answer ends stripped like correct()
+            pending = piece[len(words):]
+            if words:
+                yield words
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+# Shared client and cache, created on first use by get_client() / get_cache()
+_client = None
+_cache = None
+
+
+def get_client():
+    """Return the shared OllamaClient"""
+    global _client
+    if _client is None:
+        _client = OllamaClient(OLLAMA_API_URL, MODEL_NAME)
+    return _client
+
+
+def get_cache():
+    """Return the shared RevisionCache, or None if caching is off or the database can't be opened"""
+    global _cache, CACHE_PATH
+    if _cache is None and CACHE_PATH:
+        try:
+            _cache = RevisionCache(CACHE_PATH)
+        except Exception as e:
+            logger.warning("Not caching revisions, could not open %s: %s", CACHE_PATH, e)
+            CACHE_PATH = None
+    return _cache
+
+
+def _timed_out(error):
+    """True if a requests error was a timeout (read timeouts come wrapped in a retry error)"""
+    import requests
+    from urllib3.exceptions import ReadTimeoutError
+
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, ReadTimeoutError)
+
+
+def correct_and_rephrase(text, client=None, cache=None, timeout=None, skip_trivial=True):
+    """
+    Return the grammar-corrected text, or None if Ollama failed.
+
+    Args:
+        client: OllamaClient (default: the shared one)
+        cache: RevisionCache (default: the shared one)
+        timeout: Seconds, or a (connect, read) tuple, the request may take
+                 (default: the client's)
+        skip_trivial: Return trivial text (see is_trivial) without asking Ollama
+    """
+    import requests
+
+    # Nothing for the model to fix in silence or a single clean word
+    if skip_trivial and is_trivial(text):
+        return text.strip()
+    client = client or get_client()
+    if cache is None:
+        cache = get_cache()
+    if cache is not None:
+        cached = cache.get(text, client.model, client.prompt_template)
+        if cached is not None:
+            logger.debug("Using cached revision")
+            return cached
+    try:
+        result = client.correct(text, timeout)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        if _timed_out(e):
+            logger.warning("Ollama did not answer within the timeout")
+            return None
+        logger.error("Error connecting to Ollama: %s", e)
+        logger.error("Make sure Ollama is running with: sudo systemctl start ollama")
         return None
+    if cache is not None and result:
+        cache.put(text, result, client.model, client.prompt_template)
+    return result
+
+
+def split_sentences(text):
+    """Split a transcript after each ., ! or ? that is followed by whitespace"""
+    return [sentence for sentence in re.split(r"(?<=[.!?])\s+", text.strip()) if sentence]
+
+
+async def _correct_sentences(sentences, client, cache, concurrency, timeout):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    # A thread can't be cancelled: a sentence that timed out keeps its thread
+    # until the request's own read timeout (the same timeout) ends it, so
+    # there is a thread per sentence for the next one to start on
+    executor = ThreadPoolExecutor(max_workers=len(sentences), thread_name_prefix="revise")
+    request_timeout = (TIMEOUT[0], timeout)
+
+    async def correct(sentence):
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(executor, correct_and_rephrase, sentence, client, cache, request_timeout,
+                                         False),
+                    timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Revising a sentence took longer than %s s, keeping it as it was", timeout)
+                return None
+
+    try:
+        return await asyncio.gather(*(correct(sentence) for sentence in sentences))
+    finally:
+        # Return without waiting for the requests that timed out
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def correct_by_sentence(text, client=None, cache=None, concurrency=SENTENCE_CONCURRENCY, timeout=SENTENCE_TIMEOUT):
+    """
+    Revise a transcript one sentence at a time, several sentences at once.
+
+    Each sentence is a separate request, so a long transcript takes about as
+    long as its slowest sentence, and a bad answer only affects one sentence.
+    A sentence whose revision fails or times out is kept as it was. Whether
+    the transcript is trivial is decided once for all of it, as in
+    correct_and_rephrase; only sentences without words are kept back from
+    the model.
+
+    Args:
+        text: The transcript
+        client: OllamaClient (default: the shared one)
+        cache: RevisionCache (default: the shared one)
+        concurrency: Sentences being revised at the same time
+        timeout: Seconds one sentence may take
+
+    Returns:
+        The revised transcript in the original sentence order, or None if no
+        sentence could be revised
+    """
+    sentences = split_sentences(text)
+    if len(sentences) <= 1 or is_trivial(text):
+        return correct_and_rephrase(text, client, cache, (TIMEOUT[0], timeout))
+    client = client or get_client()
+    if cache is None:
+        cache = get_cache()
+    speech = [sentence for sentence in sentences if not is_non_speech(sentence)]
+    if not speech:
+        return text.strip()
+    revised = dict(zip(speech, asyncio.run(_correct_sentences(speech, client, cache, concurrency, timeout))))
+    if not any(revised.values()):
+        return None
+    return " ".join(revised.get(sentence) or sentence for sentence in sentences)
+
 
 def save_transcript(original, revised, filename="revised_transcripts.txt"):
     with open(filename, "a") as file:
@@ -49,7 +328,7 @@ if __name__ == "__main__":
     else:
         # Use the example if no input provided
         transcript = "I were good at many dogs at home."
-    
+
     print(f"Original: {transcript}")
     revised_text = correct_and_rephrase(transcript)
     if revised_text:
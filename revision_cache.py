@@ -0,0 +1,115 @@
+"""
+On-disk cache of grammar revisions, so a transcript that was revised before
+(a repeated demo phrase, say) skips the LLM round trip.
+
+Entries are keyed by a hash of the normalized transcript together with the
+model name and the prompt, so changing either one never serves revisions
+made with the old settings. The cache is a small SQLite database; when it
+holds more than max_entries revisions the least recently used ones are
+dropped.
+
+    cache = RevisionCache("revisions.sqlite3")
+    revised = cache.get(text, MODEL_NAME, PROMPT_TEMPLATE)
+    if revised is None:
+        revised = ...
+        cache.put(text, revised, MODEL_NAME, PROMPT_TEMPLATE)
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+MAX_ENTRIES = 2000
+
+# Transcripts whisper produces for silence or noise rather than speech
+_NON_SPEECH = re.compile(r"^[\s\W]*(\[[^\]]*\]|\([^)]*\))?[\s\W]*$")
+# A single word that is already clean: letters only, with an optional final period
+_CLEAN_WORD = re.compile(r"[^\W\d_]+\.?")
+
+
+def normalize(text):
+    """Canonical form of a transcript: Unicode NFKC, lower case, single spaces"""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def cache_key(text, model, prompt):
+    """Hash identifying a revision of text by model with prompt"""
+    return hashlib.sha256("\0".join((normalize(text), model, prompt)).encode()).hexdigest()
+
+
+def is_non_speech(text):
+    """True if text has no words: empty, only punctuation, or a marker like "[BLANK_AUDIO]" """
+    return bool(_NON_SPEECH.match(text))
+
+
+def is_trivial(text):
+    """
+    True if a transcript is not worth sending to the LLM: empty, only
+    punctuation, a whisper marker like "[BLANK_AUDIO]", or a single clean word
+    like "Yes." (short sentences such as "He go." still need revising)
+    """
+    return is_non_speech(text) or bool(_CLEAN_WORD.fullmatch(text.strip()))
+
+
+class RevisionCache:
+    """
+    SQLite-backed map from (transcript, model, prompt) to the revised text.
+
+    Safe to use from several threads.
+
+    Args:
+        path: Database file (":memory:" for a throwaway cache)
+        max_entries: Revisions kept; the least recently used are dropped beyond that
+    """
+
+    def __init__(self, path, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS revisions ("
+                             "key TEXT PRIMARY KEY, revised TEXT NOT NULL, used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS revisions_used ON revisions (used)")
+
+    def get(self, text, model, prompt):
+        """Return the cached revision of text, or None"""
+        key = cache_key(text, model, prompt)
+        with self._lock:
+            row = self._db.execute("SELECT revised FROM revisions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._db:
+                self._db.execute("UPDATE revisions SET used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, text, revised, model, prompt):
+        """Store a revision, dropping the least recently used ones if the cache is full"""
+        key = cache_key(text, model, prompt)
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO revisions (key, revised, used) VALUES (?, ?, ?)",
+                             (key, revised, time.time()))
+            count = self._db.execute("SELECT COUNT(*) FROM revisions").fetchone()[0]
+            if count > self.max_entries:
+                self._db.execute("DELETE FROM revisions WHERE key IN "
+                                 "(SELECT key FROM revisions ORDER BY used LIMIT ?)",
+                                 (count - self.max_entries,))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM revisions").fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM revisions")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
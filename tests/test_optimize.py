@@ -0,0 +1,43 @@
+"""
+Regression tests for the pen-travel optimizer on degenerate input.
+
+Run with: python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from txt_svg.optimize import PointGrid, optimize_paths
+
+
+def test_single_point_contour():
+    plan = optimize_paths([[1 + 1j]], closed=True)
+    assert plan.strokes == [[1 + 1j, 1 + 1j]]
+
+
+def test_tiny_contour():
+    plan = optimize_paths([[100 + 100j, 100.001 + 100j, 100 + 100.001j]])
+    assert len(plan.strokes) == 1
+
+
+def test_coincident_open_paths():
+    plan = optimize_paths([[1 + 1j, 1 + 1j], [1 + 1j]], closed=False)
+    assert plan.merged == 1
+    assert plan.travel_after == abs(1 + 1j)
+
+
+def test_far_offset_contour():
+    contour = [5000 + 5000j, 5010 + 5000j, 5010 + 5010j]
+    plan = optimize_paths([contour], closed=True)
+    assert plan.strokes[0][0] == contour[0]
+
+
+def test_nearest_from_outside_the_grid():
+    points = [0j, 10 + 0j, 10 + 10j, 0 + 10j, 5 + 5j]
+    grid = PointGrid(points, list(range(len(points))))
+    assert grid.nearest(1e6 + 1e6j) == 2
+    assert grid.nearest(-1e6 + 5j) in (0, 3)
+    for item in range(len(points)):
+        grid.remove_item(item)
+    assert grid.nearest(0j) is None
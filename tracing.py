@@ -0,0 +1,224 @@
+"""
+Logging and per-stage timing for the dictation pipeline.
+
+Log messages go through the standard logging module, so their cost when a
+level is disabled is a single level check. Stage timings are recorded in
+spans that belong to a Trace, one per dictation:
+
+    trace = start_trace()
+    with span("transcribe"):
+        ...
+    finish_trace()  # appends one JSON record to the trace file
+
+When tracing is disabled (no trace file configured), start_trace() returns
+None and span() returns a shared no-op context manager, so instrumented code
+costs next to nothing.
+
+Configuration comes from configure() or the environment:
+    PLOTTER_LOG_LEVEL: logging level name (default INFO)
+    PLOTTER_TRACE_FILE: JSON-lines file to append timing records to
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Stages of one dictation, in pipeline order
+STAGES = ("record", "vad", "denoise", "transcribe", "revise", "layout", "write")
+
+_trace_file = None
+_active = None
+_lock = threading.Lock()
+# Trace set by use_trace() for the current thread, overriding _active
+_local = threading.local()
+
+
+def configure(level=None, trace_file=None):
+    """
+    Set up console logging and (optionally) timing traces.
+
+    Args:
+        level: Logging level name or number; defaults to $PLOTTER_LOG_LEVEL or INFO
+        trace_file: File to append one JSON timing record per dictation to;
+                    defaults to $PLOTTER_TRACE_FILE, tracing is off if neither is set
+    """
+    global _trace_file
+    if level is None:
+        level = os.environ.get("PLOTTER_LOG_LEVEL", "INFO")
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logging.getLogger().setLevel(level)
+    _trace_file = trace_file or os.environ.get("PLOTTER_TRACE_FILE") or None
+
+
+def tracing_enabled():
+    return _trace_file is not None
+
+
+class Span:
+    """Times one stage of a trace; use as a context manager"""
+
+    __slots__ = ("trace", "name", "fields", "start", "duration")
+
+    def __init__(self, trace, name, fields):
+        self.trace = trace
+        self.name = name
+        self.fields = fields
+        self.start = None
+        self.duration = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.fields["error"] = exc_type.__name__
+        self.trace.add(self)
+        logger.debug("%s took %.3f s", self.name, self.duration)
+
+    def set(self, **fields):
+        """Attach extra fields (sizes, counts, ...) to the span's record"""
+        self.fields.update(fields)
+
+
+class _NullSpan:
+    """Stand-in for Span when tracing is off"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """
+    Timings of the stages of one dictation.
+
+    Attributes:
+        id: Unique id of the dictation
+        spans: Finished spans, in the order they ended
+    """
+
+    def __init__(self, trace_id=None, **fields):
+        self.id = trace_id or uuid.uuid4().hex[:12]
+        self.fields = fields
+        self.created = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def span(self, name, **fields):
+        return Span(self, name, fields)
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def record(self):
+        """Return the trace as a JSON-serializable dict"""
+        stages = {}
+        for span in self.spans:
+            stages[span.name] = round(stages.get(span.name, 0.0) + span.duration, 6)
+        return {
+            "id": self.id,
+            "time": self.created,
+            "total": round(time.perf_counter() - self.started, 6),
+            "stages": stages,
+            "spans": [dict(name=span.name, start=round(span.start - self.started, 6),
+                           duration=round(span.duration, 6), **span.fields)
+                      for span in self.spans],
+            **self.fields,
+        }
+
+    def write(self, filename=None):
+        """Append the trace as one JSON line to filename (default: the configured trace file)"""
+        filename = filename or _trace_file
+        if not filename:
+            return
+        line = json.dumps(self.record())
+        with _lock:
+            with open(filename, "a") as file:
+                file.write(line + "\n")
+
+
+def start_trace(trace_id=None, **fields):
+    """
+    Start timing a new dictation and make it the active trace.
+
+    Returns:
+        Trace, or None if tracing is disabled
+    """
+    global _active
+    if _trace_file is None:
+        return None
+    _active = Trace(trace_id, **fields)
+    return _active
+
+
+def active_trace():
+    return getattr(_local, "trace", None) or _active
+
+
+@contextmanager
+def use_trace(trace):
+    """
+    Make spans on this thread record into trace, whatever the active trace is.
+
+    For workers that handle stages of several dictations in turn.
+    """
+    previous = getattr(_local, "trace", None)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def finish_trace(trace=None):
+    """Write a trace (default: the active one) to the trace file and return its record"""
+    global _active
+    trace = trace or _active
+    if trace is None:
+        return None
+    if trace is _active:
+        _active = None
+    trace.write()
+    record = trace.record()
+    logger.info("Dictation %s took %.2f s: %s", trace.id, record["total"],
+                ", ".join(f"{name} {duration:.2f} s" for name, duration in record["stages"].items()))
+    return record
+
+
+def span(name, trace=None, **fields):
+    """
+    Time a pipeline stage.
+
+    Args:
+        name: Stage name (see STAGES)
+        trace: Trace to record into; defaults to the active trace
+        **fields: Extra values stored with the span
+
+    Returns:
+        A context manager; a shared no-op one when there is no trace
+    """
+    trace = trace or getattr(_local, "trace", None) or _active
+    if trace is None:
+        return NULL_SPAN
+    return Span(trace, name, fields)
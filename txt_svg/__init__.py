@@ -1,7 +1,39 @@
 # This file can be empty 
 
-# Import and expose the tsvg function at the package level
-from .tsvg import tsvg
+import importlib
+import logging
+
+# Names exposed at the package level and the submodule defining them. They are
+# imported on first access, so `import txt_svg` stays cheap.
+_exports = {
+    'tsvg': 'tsvg',
+    'layout_sentence': 'tsvg',
+    'TextLayout': 'tsvg',
+    'GlyphOutline': 'geometry',
+    'PathBuffer': 'geometry',
+    'GlyphCache': 'glyph_cache',
+    'SVGWriter': 'svg_writer',
+    'write_plan_svg': 'svg_writer',
+    'write_text_svg': 'svg_writer',
+    'GcodeWriter': 'gcode',
+    'write_text_gcode': 'gcode',
+    'optimize_buffer': 'optimize',
+    'optimize_paths': 'optimize',
+    'FontMetrics': 'metrics',
+    'font_metrics': 'metrics',
+}
+
+def __getattr__(name):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    # Cache it; for `tsvg` this replaces the submodule attribute with the function
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + list(_exports))
 
 # Define package metadata
 __version__ = '0.1.0'
@@ -10,5 +42,5 @@ __author__ = 'Your Name'
 # You could also define package-level variables or functions
 default_style = 'basic'
 
-# Initialize package if needed
-print("txt_svg package initialized") 
\ No newline at end of file
+# Layout messages are logged under "txt_svg"; the application decides where they go
+logging.getLogger(__name__).addHandler(logging.NullHandler())
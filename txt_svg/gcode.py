@@ -0,0 +1,171 @@
+from .geometry import iter_contour_polylines
+from .optimize import optimize_buffer
+from .svg_writer import format_number
+from .tsvg import iter_layout_lines, plan_layout
+
+# Defaults matching the Processing sketch (PenPlotter/default.properties.txt):
+# SVG units are mapped to millimetres at svg.pixelsPerInch = 1200, and the
+# drawing origin is the home point (machine.width / 2, machine.homepoint.y).
+DEFAULT_SCALE = 25.4 / 1200
+DEFAULT_ORIGIN = (225.0, 250.0)
+
+# Servo pen lift as sent by comm.pde sendPenUp()/sendPenDown()
+# (servo.upValue = 2350, servo.downValue = 1500, servo.dwell = 250)
+PEN_UP = ("G4 P250", "M340 P3 S2350", "G4 P250")
+PEN_DOWN = ("G4 P250", "M340 P3 S1500", "G4 P250")
+
+
+class GcodeWriter:
+    """
+    Turns laid-out glyph contours into pen-up G0 / pen-down G1 moves.
+
+    Every contour is flattened into a polygon, the pen travels to its first
+    vertex with G0, drops, draws the polygon with G1 and lifts again. Layout
+    coordinates (x right, y down) are mapped to machine coordinates with
+    machine = origin + scale * layout, the same transform the Processing
+    sketch applies to SVG files.
+
+    Args:
+        stream: Open text stream to write to (a file, sys.stdout, or a serial
+                port wrapped in io.TextIOWrapper)
+        scale: Machine units per layout unit
+        origin: Machine coordinates of the layout origin
+        tolerance: Maximum distance (in machine units) between a curve and
+                   the lines drawn for it
+        pen_up: Commands that lift the pen
+        pen_down: Commands that lower the pen
+        feed_rate: If given, feed rate set in the preamble
+        precision: Number of decimals written for each coordinate
+        optimize: Reorder the contours of each buffer to reduce pen-up travel
+                  (see txt_svg.optimize); travel_before/travel_after then
+                  hold the pen-up distance in machine units
+        merge_tolerance: With optimize, largest gap (in machine units) drawn
+                         without lifting the pen
+    """
+
+    def __init__(self, stream, scale=DEFAULT_SCALE, origin=DEFAULT_ORIGIN, tolerance=0.1,
+                 pen_up=PEN_UP, pen_down=PEN_DOWN, feed_rate=None, precision=2,
+                 optimize=False, merge_tolerance=0.0):
+        self.stream = stream
+        self.scale = scale
+        self.origin = complex(*origin)
+        self.tolerance = tolerance
+        self.pen_up = pen_up
+        self.pen_down = pen_down
+        self.feed_rate = feed_rate
+        self.precision = precision
+        self.optimize = optimize
+        self.merge_tolerance = merge_tolerance
+        self.moves = 0
+        self.contours = 0
+        self.travel_before = 0.0
+        self.travel_after = 0.0
+        self._position = self.origin
+        self._started = False
+
+    def _move(self, command, point):
+        x = format_number(point.real, self.precision)
+        y = format_number(point.imag, self.precision)
+        self.stream.write(f"{command} X{x} Y{y}\n")
+        self.moves += 1
+
+    def _commands(self, commands):
+        for command in commands:
+            self.stream.write(command + "\n")
+
+    def start(self):
+        """Write the preamble: absolute positioning (and feed rate) with the pen up"""
+        self._commands(["G90"])
+        if self.feed_rate is not None:
+            self._commands([f"G1 F{format_number(self.feed_rate, self.precision)}"])
+        self._commands(self.pen_up)
+        self._started = True
+
+    def write_polyline(self, vertices, closed=True):
+        """
+        Draw one polyline given in machine coordinates (complex numbers).
+
+        The pen is lifted for the travel move to its first vertex and lifted
+        again afterwards.
+        """
+        if not self._started:
+            self.start()
+        if not vertices:
+            return
+        self._move("G0", vertices[0])
+        self._commands(self.pen_down)
+        for point in vertices[1:] + (vertices[:1] if closed else []):
+            self._move("G1", point)
+        self._commands(self.pen_up)
+        self._position = vertices[0] if closed else vertices[-1]
+        self.contours += 1
+
+    def to_machine(self, vertices):
+        return [self.origin + self.scale * point for point in vertices]
+
+    def write_buffer(self, buffer):
+        """Draw every contour of a PathBuffer (or GlyphOutline)"""
+        tolerance = self.tolerance / self.scale
+        if self.optimize:
+            # Optimize in layout coordinates, starting from the current pen position
+            start = (self._position - self.origin) / self.scale
+            plan = optimize_buffer(buffer, tolerance, start=start,
+                                   merge_tolerance=self.merge_tolerance / self.scale)
+            self.travel_before += plan.travel_before * self.scale
+            self.travel_after += plan.travel_after * self.scale
+            for stroke in plan.strokes:
+                self.write_polyline(self.to_machine(stroke), closed=False)
+            return
+        for vertices in iter_contour_polylines(buffer.points, buffer.tags, buffer.offsets, tolerance):
+            self.write_polyline(self.to_machine(vertices))
+
+    def finish(self):
+        """Lift the pen and return to the origin (the home point by default)"""
+        if not self._started:
+            self.start()
+        self._move("G0", self.origin)
+        self.stream.flush()
+
+
+def write_gcode(buffers, file, **kwargs):
+    """
+    Write laid-out geometry as G-code.
+
+    Args:
+        buffers: A PathBuffer, or an iterable of them (e.g. one per text line)
+        file: Filename or open text stream
+        **kwargs: GcodeWriter options (scale, origin, tolerance, pen_up, ...)
+
+    Returns:
+        GcodeWriter: The writer, for its move and contour counts
+    """
+    if hasattr(buffers, 'points'):
+        buffers = [buffers]
+    owns_file = not hasattr(file, 'write')
+    stream = open(file, 'w') if owns_file else file
+    try:
+        writer = GcodeWriter(stream, **kwargs)
+        writer.start()
+        for buffer in buffers:
+            writer.write_buffer(buffer)
+        writer.finish()
+    finally:
+        if owns_file:
+            stream.close()
+    return writer
+
+
+def write_text_gcode(face, sentence, file, char_spacing=200, word_spacing=400, max_width=2000,
+                     line_spacing=3000, glyph_cache=None, font_spacing=False, line_breaking='greedy', **kwargs):
+    """
+    Lay out a sentence and write it straight to G-code, one line at a time.
+
+    Takes the layout arguments of layout_sentence plus the GcodeWriter options.
+
+    Returns:
+        GcodeWriter: The writer, for its move and contour counts
+    """
+    plan = plan_layout(face, sentence, char_spacing=char_spacing, word_spacing=word_spacing,
+                       max_width=max_width, line_spacing=line_spacing, glyph_cache=glyph_cache,
+                       font_spacing=font_spacing, line_breaking=line_breaking)
+    return write_gcode(iter_layout_lines(face, plan, glyph_cache=glyph_cache), file, **kwargs)
@@ -0,0 +1,229 @@
+import numpy as np
+
+from .outline import TAG_ON, contour_polyline, contour_segments
+
+
+class GlyphOutline:
+    """
+    Compact outline of a single glyph.
+
+    The points of all contours are stored in one contiguous array, with the
+    contours delimited by offsets into it (contour k is points[offsets[k]:offsets[k + 1]]).
+    Coordinates are already normalized for layout: the glyph starts at x=0 and
+    y is flipped so the baseline is at y=0 with positive y going down.
+
+    Attributes:
+        points: float array of shape (N, 2)
+        tags: FreeType point tags, uint8 array of shape (N,)
+        offsets: int array of shape (contours + 1,)
+        width: Horizontal space the glyph takes up in the layout
+    """
+
+    __slots__ = ('points', 'tags', 'offsets', 'width')
+
+    def __init__(self, points, tags, offsets, width):
+        self.points = points
+        self.tags = tags
+        self.offsets = offsets
+        self.width = width
+
+    @classmethod
+    def empty(cls, width=0):
+        return cls(np.empty((0, 2)), np.empty(0, dtype=np.uint8), np.zeros(1, dtype=np.intp), width)
+
+    @property
+    def contour_count(self):
+        return len(self.offsets) - 1
+
+    def to_path(self):
+        return outline_to_path(self.points, self.tags, self.offsets)
+
+
+def load_glyph(face, char, curves=True, tolerance=None):
+    """
+    Load a character from FreeType into a GlyphOutline.
+
+    Args:
+        face: The font face
+        char: The character to load
+        curves: Keep the on/off-curve tags. If False all points are treated as
+                on-curve, so the outline is drawn as a polygon.
+        tolerance: If given, flatten the curves into lines within this distance
+
+    Returns:
+        GlyphOutline: Glyphs without an outline (e.g. space) come back empty
+        with their advance width.
+    """
+    face.load_char(char)
+    outline = face.glyph.outline
+    if not outline.points:
+        return GlyphOutline.empty(face.glyph.advance.x / 64.0)
+
+    # Flip y for SVG (positive y goes down) and shift the glyph so its left
+    # edge (control points included) is at x=0
+    points = np.array(outline.points, dtype=float)
+    points[:, 1] = -points[:, 1]
+    points[:, 0] -= points[:, 0].min()
+    width = points[:, 0].max()
+
+    if curves:
+        tags = np.array(outline.tags, dtype=np.uint8)
+    else:
+        tags = np.full(len(points), TAG_ON, dtype=np.uint8)
+    offsets = np.concatenate(([0], np.asarray(outline.contours, dtype=np.intp) + 1))
+
+    glyph = GlyphOutline(points, tags, offsets, width)
+    if tolerance is not None:
+        glyph = flatten_glyph(glyph, tolerance)
+    return glyph
+
+
+def flatten_glyph(glyph, tolerance):
+    """Return a copy of the glyph with its curves replaced by on-curve points"""
+    contours = list(iter_contour_polylines(glyph.points, glyph.tags, glyph.offsets, tolerance))
+
+    counts = [len(contour) for contour in contours]
+    flat = np.array([point for contour in contours for point in contour], dtype=complex)
+    points = np.column_stack((flat.real, flat.imag)) if len(flat) else np.empty((0, 2))
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.intp)
+    tags = np.full(len(points), TAG_ON, dtype=np.uint8)
+    return GlyphOutline(points, tags, offsets, glyph.width)
+
+
+def iter_contour_polylines(points, tags, offsets, tolerance):
+    """Yield the flattened vertices (complex numbers) of each contour"""
+    complex_points = (points[:, 0] + 1j * points[:, 1]).tolist()
+    tags = tags.tolist()
+    for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        yield contour_polyline(complex_points[start:end], tags[start:end], tolerance)
+
+
+def iter_contour_segments(points, tags, offsets):
+    """Yield the list of svgpathtools segments for each contour"""
+    complex_points = (points[:, 0] + 1j * points[:, 1]).tolist()
+    tags = tags.tolist()
+    for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        yield contour_segments(complex_points[start:end], tags[start:end])
+
+
+def outline_to_path(points, tags, offsets):
+    """Convert compact outline arrays into an svgpathtools Path"""
+    from svgpathtools import Path
+
+    path = Path()
+    for segments in iter_contour_segments(points, tags, offsets):
+        path.extend(segments)
+    return path
+
+
+class PathBuffer:
+    """
+    A laid-out page of glyph outlines in one set of arrays.
+
+    Uses the same layout as GlyphOutline (points, tags and contour offsets),
+    so the whole page can be translated, measured and serialized with array
+    operations, and only turned into svgpathtools objects at the output edge.
+    line_offsets delimits the contours of each text line
+    (line k holds contours line_offsets[k]:line_offsets[k + 1]).
+    first_line is the page line of the first group, for buffers that hold
+    only part of a page (see TextLayout.append).
+    """
+
+    def __init__(self, points, tags, offsets, line_offsets=None, first_line=0):
+        self.points = points
+        self.tags = tags
+        self.offsets = offsets
+        if line_offsets is None:
+            line_offsets = np.array([0, len(offsets) - 1], dtype=np.intp)
+        self.line_offsets = line_offsets
+        self.first_line = first_line
+
+    @property
+    def contour_count(self):
+        return len(self.offsets) - 1
+
+    @property
+    def line_count(self):
+        return len(self.line_offsets) - 1
+
+    def __len__(self):
+        return len(self.points)
+
+    def bbox(self):
+        """Return (xmin, xmax, ymin, ymax) of the points, control points included"""
+        if not len(self.points):
+            return (0.0, 0.0, 0.0, 0.0)
+        xmin, ymin = self.points.min(axis=0)
+        xmax, ymax = self.points.max(axis=0)
+        return (float(xmin), float(xmax), float(ymin), float(ymax))
+
+    def line(self, index):
+        """Return the contours of one text line as a PathBuffer"""
+        first, last = self.line_offsets[index], self.line_offsets[index + 1]
+        start, end = self.offsets[first], self.offsets[last]
+        return PathBuffer(self.points[start:end], self.tags[start:end],
+                          self.offsets[first:last + 1] - start)
+
+    def to_path(self):
+        return outline_to_path(self.points, self.tags, self.offsets)
+
+
+class PathBuilder:
+    """
+    Collects glyph placements and assembles them into a PathBuffer.
+
+    Each placement only records the glyph and its offset vector; the points
+    are copied and translated once, in build().
+    """
+
+    def __init__(self, first_line=0):
+        self.first_line = first_line
+        self._glyphs = []
+        self._positions = []
+        self._line_starts = [0]
+
+    def place(self, glyph, x, y):
+        if glyph.contour_count:
+            self._glyphs.append(glyph)
+            self._positions.append((x, y))
+
+    def new_line(self):
+        """Mark the start of a new text line"""
+        self._line_starts.append(len(self._glyphs))
+
+    def extend(self, other, new_line=False):
+        """
+        Add the placements of another builder after this one's.
+
+        Its first line continues this builder's current line, unless new_line is set.
+        """
+        if new_line:
+            self.new_line()
+        count = len(self._glyphs)
+        self._glyphs.extend(other._glyphs)
+        self._positions.extend(other._positions)
+        self._line_starts.extend(count + start for start in other._line_starts[1:])
+
+    def build(self):
+        glyphs = self._glyphs
+        if not glyphs:
+            return PathBuffer(np.empty((0, 2)), np.empty(0, dtype=np.uint8),
+                              np.zeros(1, dtype=np.intp),
+                              np.zeros(len(self._line_starts) + 1, dtype=np.intp), self.first_line)
+
+        point_counts = np.array([len(glyph.points) for glyph in glyphs])
+        contour_counts = np.array([glyph.contour_count for glyph in glyphs])
+
+        points = np.concatenate([glyph.points for glyph in glyphs])
+        points += np.repeat(np.array(self._positions, dtype=float), point_counts, axis=0)
+        tags = np.concatenate([glyph.tags for glyph in glyphs])
+
+        # Shift each glyph's contour offsets by the number of points before it
+        point_starts = np.concatenate(([0], np.cumsum(point_counts)))
+        offsets = np.concatenate([glyph.offsets[:-1] for glyph in glyphs])
+        offsets += np.repeat(point_starts[:-1], contour_counts)
+        offsets = np.append(offsets, point_starts[-1])
+
+        contour_starts = np.concatenate(([0], np.cumsum(contour_counts)))
+        line_offsets = contour_starts[self._line_starts + [len(glyphs)]]
+        return PathBuffer(points, tags, offsets, line_offsets, self.first_line)
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+
+from .geometry import load_glyph
+
+
+def face_key(face):
+    """
+    Identify a font face at its current character size.
+
+    freetype.Face does not remember the file it was opened from, so the font is
+    identified by its family/style names and glyph count, and the size by the
+    scale factors set through set_char_size().
+    """
+    return (face.family_name, face.style_name, face.num_glyphs,
+            face.size.x_scale, face.size.y_scale)
+
+
+class GlyphCache:
+    """
+    Least-recently-used cache of normalized glyph outlines.
+
+    Entries are keyed by (font, char size, character) and hold a GlyphOutline
+    (already shifted so the glyph starts at x=0 with the baseline at y=0, and
+    carrying its width), so each character is decoded from FreeType only once.
+
+    The cached outlines are shared: callers must not modify their arrays in
+    place (PathBuilder copies them when it assembles a page).
+
+    Args:
+        max_size: Number of glyphs to keep before evicting the least recently used
+        curves: Decode glyphs into Bezier curves (see char_to_path)
+        tolerance: Flatten the curves to lines within this tolerance, if given
+    """
+
+    def __init__(self, max_size=512, curves=True, tolerance=None):
+        self.max_size = max_size
+        self.curves = curves
+        self.tolerance = tolerance
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def glyph(self, face, char):
+        """
+        Return the GlyphOutline for a character of the given face.
+
+        Glyphs without an outline (e.g. spaces) come back empty with their
+        advance width, matching how sentence_to_path spaces them.
+        """
+        key = face_key(face) + (char,)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = self._load(face, char)
+        self._entries[key] = entry
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def _load(self, face, char):
+        return load_glyph(face, char, curves=self.curves, tolerance=self.tolerance)
+
+    def clear(self):
+        """Drop all cached glyphs and reset the hit/miss counters"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Cache shared by sentence_to_path calls that don't pass their own
+default_cache = GlyphCache()
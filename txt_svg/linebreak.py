@@ -0,0 +1,102 @@
+import numpy as np
+
+
+def line_lengths(widths, space, breaks):
+    """
+    Content width of each line: its word widths plus the spaces between them.
+
+    Args:
+        widths: Width of each word
+        space: Space between two words on a line
+        breaks: End index (exclusive) of each line's words, as returned by
+                greedy_breaks or optimal_breaks
+
+    Returns:
+        list: The width of each line
+    """
+    prefix = np.concatenate(([0.0], np.cumsum(widths, dtype=float)))
+    starts = [0] + list(breaks[:-1])
+    return [float(prefix[end] - prefix[start]) + max(end - start - 1, 0) * space
+            for start, end in zip(starts, breaks)]
+
+
+def greedy_breaks(widths, space, max_width):
+    """
+    Fill each line with as many words as fit, in one pass.
+
+    A word that is wider than max_width on its own still gets its own line.
+
+    Args:
+        widths: Width of each word
+        space: Space between two words on a line
+        max_width: Widest a line's content may be
+
+    Returns:
+        list: End index (exclusive) of each line's words; the last one is len(widths)
+    """
+    breaks = []
+    line_width = None
+    for index, width in enumerate(widths):
+        if line_width is not None and line_width + space + width > max_width:
+            breaks.append(index)
+            line_width = None
+        line_width = width if line_width is None else line_width + space + width
+    breaks.append(len(widths))
+    return breaks
+
+
+def optimal_breaks(widths, space, max_width, exponent=2, last_line_free=True):
+    """
+    Break lines to minimize raggedness over the whole paragraph.
+
+    Dynamic program in the style of Knuth-Plass without stretching: every line
+    costs (max_width - line width) ** exponent and the breaks minimizing the
+    total are chosen. Lines only look back as far as words still fit, so the
+    run time is linear in the number of words times the words per line.
+
+    Args:
+        widths: Width of each word
+        space: Space between two words on a line
+        max_width: Widest a line's content may be
+        exponent: How strongly uneven lines are penalized (higher values
+                  prefer evening out the worst lines)
+        last_line_free: Don't charge for the slack of the last line
+
+    Returns:
+        list: End index (exclusive) of each line's words; the last one is len(widths)
+    """
+    n = len(widths)
+    if n == 0:
+        return [0]
+    prefix = np.concatenate(([0.0], np.cumsum(widths, dtype=float))).tolist()
+
+    # best[j]: lowest cost of setting words[:j]; back[j]: where its last line starts
+    best = [0.0] + [float('inf')] * n
+    back = [0] * (n + 1)
+    for end in range(1, n + 1):
+        for start in range(end - 1, -1, -1):
+            width = prefix[end] - prefix[start] + (end - start - 1) * space
+            if width > max_width and start < end - 1:
+                break
+            if end == n and last_line_free:
+                cost = 0.0
+            else:
+                # An overfull single word has no slack to charge
+                cost = max(max_width - width, 0.0) ** exponent
+            total = best[start] + cost
+            if total < best[end]:
+                best[end] = total
+                back[end] = start
+
+    breaks = []
+    end = n
+    while end > 0:
+        breaks.append(end)
+        end = back[end]
+    return breaks[::-1]
+
+
+def split_lines(items, breaks):
+    """Split a sequence into lines at the given break positions"""
+    starts = [0] + list(breaks[:-1])
+    return [list(items[start:end]) for start, end in zip(starts, breaks)]
@@ -0,0 +1,154 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from .glyph_cache import face_key
+
+# Characters measured up front; anything else is added on first use
+DEFAULT_CHARSET = ''.join(chr(code) for code in range(32, 127))
+
+
+class FontMetrics:
+    """
+    Per-character metrics of a font face at one size, held in arrays.
+
+    Built once per (font, size) so words can be measured by summing array
+    entries instead of loading and decoding glyph outlines. All values are in
+    the units of the glyph outlines (1/64 pixel), except `widths`, which holds
+    the width sentence_to_path gives each glyph (outline width, or advance/64
+    for glyphs without an outline) so both spacing modes measure like the layout.
+
+    Attributes:
+        index: Maps each measured character to its row in the arrays
+        widths: Layout width of each glyph (see above)
+        advances: Horizontal advance of each glyph
+        left_bearings: Distance from the pen position to the glyph's left edge
+        right_bearings: Distance from the glyph's right edge to the next pen position
+        kerning: kerning[i, j] is the kerning between characters i and j, or None
+                 if the font has no kerning
+    """
+
+    def __init__(self, face, charset=DEFAULT_CHARSET):
+        self.face = face
+        self.key = face_key(face)
+        self.index = {}
+        self._widths = []
+        self._advances = []
+        self._left = []
+        self._right = []
+        self.has_kerning = bool(face.has_kerning)
+        self.kerning = np.zeros((0, 0)) if self.has_kerning else None
+        self._add(charset)
+
+    def _add(self, chars):
+        new = [char for char in dict.fromkeys(chars) if char not in self.index]
+        if not new:
+            return
+        for char in new:
+            self.index[char] = len(self.index)
+            self.face.load_char(char)
+            glyph = self.face.glyph
+            advance = glyph.advance.x
+            points = glyph.outline.points
+            if points:
+                xs = [p[0] for p in points]
+                left, right = min(xs), max(xs)
+                width = right - left
+            else:
+                left, right, width = 0, 0, advance / 64.0
+            self._widths.append(width)
+            self._advances.append(advance)
+            self._left.append(left)
+            self._right.append(advance - right)
+
+        self.widths = np.array(self._widths, dtype=float)
+        self.advances = np.array(self._advances, dtype=float)
+        self.left_bearings = np.array(self._left, dtype=float)
+        self.right_bearings = np.array(self._right, dtype=float)
+        if self.has_kerning:
+            self._extend_kerning(new)
+
+    def _extend_kerning(self, new):
+        from freetype import FT_KERNING_UNFITTED
+
+        chars = list(self.index)
+        size = len(chars)
+        old = self.kerning.shape[0]
+        kerning = np.zeros((size, size))
+        kerning[:old, :old] = self.kerning
+        for i, left in enumerate(chars):
+            for j, right in enumerate(chars):
+                if i >= old or j >= old:
+                    kerning[i, j] = self.face.get_kerning(left, right, FT_KERNING_UNFITTED).x
+        self.kerning = kerning
+
+    def indices(self, text):
+        """Return the array rows of the characters of text, measuring new ones first"""
+        index = self.index
+        if any(char not in index for char in text):
+            self._add(text)
+        return np.fromiter((index[char] for char in text), dtype=np.intp, count=len(text))
+
+    def kern(self, left, right):
+        """Kerning between two characters"""
+        if not self.has_kerning:
+            return 0.0
+        i, j = self.indices(left + right)
+        return self.kerning[i, j]
+
+    def word_widths(self, words, char_spacing=0, font_spacing=False):
+        """
+        Measure many words at once.
+
+        Args:
+            words: The words to measure
+            char_spacing: Spacing added between the characters of a word
+            font_spacing: Measure with the font's advance widths and kerning
+                          (plus char_spacing as extra tracking) instead of the
+                          glyph widths used by sentence_to_path
+
+        Returns:
+            numpy array: The width of each word
+        """
+        lengths = np.fromiter((len(word) for word in words), dtype=np.intp, count=len(words))
+        if not len(words):
+            return np.zeros(0)
+        idx = self.indices(''.join(words))
+        per_char = self.advances[idx] if font_spacing else self.widths[idx]
+
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        nonempty = lengths > 0
+        totals = np.zeros(len(words))
+        totals[nonempty] = np.add.reduceat(per_char, starts[nonempty])
+        totals += np.maximum(lengths - 1, 0) * char_spacing
+
+        if font_spacing and self.has_kerning and len(idx) > 1:
+            # Kerning between consecutive characters, ignoring pairs that span two words
+            pair_kerning = self.kerning[idx[:-1], idx[1:]]
+            last_in_word = np.cumsum(lengths)[nonempty] - 1
+            pair_kerning[last_in_word[last_in_word < len(pair_kerning)]] = 0
+            cumulative = np.concatenate(([0], np.cumsum(pair_kerning)))
+            ends = np.cumsum(lengths)
+            word_kerning = cumulative[np.maximum(ends - 1, 0)] - cumulative[starts]
+            totals += np.where(lengths > 1, word_kerning, 0)
+        return totals
+
+    def word_width(self, word, char_spacing=0, font_spacing=False):
+        return float(self.word_widths([word], char_spacing, font_spacing)[0])
+
+
+_metrics_cache = OrderedDict()
+
+
+def font_metrics(face, max_fonts=8):
+    """Return the FontMetrics of a face at its current size, building them on first use"""
+    key = face_key(face)
+    metrics = _metrics_cache.get(key)
+    if metrics is None or metrics.face is not face:
+        metrics = FontMetrics(face)
+        _metrics_cache[key] = metrics
+        if len(_metrics_cache) > max_fonts:
+            _metrics_cache.popitem(last=False)
+    else:
+        _metrics_cache.move_to_end(key)
+    return metrics
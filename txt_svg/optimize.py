@@ -0,0 +1,297 @@
+import math
+
+import numpy as np
+
+from .geometry import iter_contour_polylines
+
+# Smallest grid cell (layout units), so points that all coincide still get a usable grid
+MIN_CELL_SIZE = 1.0
+
+
+class PointGrid:
+    """
+    Uniform grid over a set of points for nearest-neighbor queries.
+
+    Points can be removed as they are used; each point belongs to an item
+    (a path) and all points of an item are removed together.
+
+    Args:
+        points: Complex coordinates of the points
+        items: Item index of each point
+    """
+
+    def __init__(self, points, items):
+        self.points = points
+        self.items = items
+        xs = np.array([p.real for p in points])
+        ys = np.array([p.imag for p in points])
+        self.xmin, self.ymin = xs.min(), ys.min()
+        extent = max(xs.max() - self.xmin, ys.max() - self.ymin)
+        # About two points per cell on average
+        cells_per_side = max(1, int(math.sqrt(len(points) / 2)))
+        self.cell_size = max(extent / cells_per_side, MIN_CELL_SIZE)
+        # Cells along each axis; queries are clamped into this range
+        self.width, self.height = (index + 1 for index in self._cell(xs.max(), ys.max()))
+        self.cells = {}
+        for index, (x, y) in enumerate(zip(xs.tolist(), ys.tolist())):
+            self.cells.setdefault(self._cell(x, y), []).append(index)
+        self.removed_items = set()
+        self.remaining = len(set(items))
+
+    def _cell(self, x, y):
+        return (int((x - self.xmin) // self.cell_size), int((y - self.ymin) // self.cell_size))
+
+    def remove_item(self, item):
+        self.removed_items.add(item)
+        self.remaining -= 1
+
+    def nearest(self, point):
+        """Return the index of the closest point whose item is still available"""
+        # A point outside the grid searches from the nearest cell on its edge
+        cx, cy = self._cell(point.real, point.imag)
+        cx = min(max(cx, 0), self.width - 1)
+        cy = min(max(cy, 0), self.height - 1)
+        # Beyond this ring there are no cells left
+        last_ring = max(cx, cy, self.width - 1 - cx, self.height - 1 - cy)
+        best, best_dist = None, math.inf
+        ring = 0
+        while self.remaining and ring <= last_ring:
+            # Points in ring r are at least (r - 1) cells away
+            if best is not None and (ring - 1) * self.cell_size > best_dist:
+                break
+            for cell in self._ring(cx, cy, ring):
+                indices = self.cells.get(cell)
+                if not indices:
+                    continue
+                alive = [i for i in indices if self.items[i] not in self.removed_items]
+                if len(alive) != len(indices):
+                    self.cells[cell] = alive
+                for i in alive:
+                    dist = abs(self.points[i] - point)
+                    if dist < best_dist:
+                        best, best_dist = i, dist
+            ring += 1
+        return best
+
+    @staticmethod
+    def _ring(cx, cy, ring):
+        if ring == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-ring, ring + 1):
+            yield (cx + dx, cy - ring)
+            yield (cx + dx, cy + ring)
+        for dy in range(-ring + 1, ring):
+            yield (cx - ring, cy + dy)
+            yield (cx + ring, cy + dy)
+
+
+class TravelPlan:
+    """
+    Pen-down strokes in drawing order, with the pen-up travel they need.
+
+    Attributes:
+        strokes: Vertex lists (complex numbers) to draw with the pen down; closed
+                 contours already end back on their first vertex
+        travel_before: Pen-up distance of the paths in their original order
+        travel_after: Pen-up distance of the strokes
+        merged: Number of paths joined onto the previous stroke
+    """
+
+    def __init__(self, strokes, travel_before, travel_after, merged):
+        self.strokes = strokes
+        self.travel_before = travel_before
+        self.travel_after = travel_after
+        self.merged = merged
+
+    def __repr__(self):
+        return (f"TravelPlan({len(self.strokes)} strokes, pen-up travel "
+                f"{self.travel_before:.1f} -> {self.travel_after:.1f}, {self.merged} merged)")
+
+
+def travel_distance(strokes, start=0j):
+    """Pen-up distance needed to draw strokes in order, starting from `start`"""
+    distance = 0.0
+    position = start
+    for stroke in strokes:
+        distance += abs(stroke[0] - position)
+        position = stroke[-1]
+    return distance
+
+
+def buffer_polylines(buffer, tolerance):
+    """Flatten the contours of a PathBuffer into closed polylines"""
+    return [vertices for vertices in
+            iter_contour_polylines(buffer.points, buffer.tags, buffer.offsets, tolerance)
+            if vertices]
+
+
+def optimize_paths(polylines, closed=True, start=0j, merge_tolerance=0.0, window=30, passes=4):
+    """
+    Reorder paths to reduce pen-up travel.
+
+    1. Nearest-neighbor seeding: starting from `start`, repeatedly draw the
+       path with the closest entry point. Closed paths can be entered at any
+       vertex, open paths at either end (drawn reversed when entered at the end).
+    2. 2-opt refinement: reverse runs of up to `window` paths whenever that
+       shortens the travel, until no run helps or `passes` is reached.
+    3. Closed paths get the entry vertex that is cheapest between their
+       neighbors in the final order.
+    4. Paths that start within merge_tolerance of where the previous one
+       ended are joined into one pen-down stroke.
+
+    Args:
+        polylines: Vertex lists (complex numbers)
+        closed: Whether the polylines are closed contours
+        start: Pen position before the first path
+        merge_tolerance: Largest gap bridged without lifting the pen
+        window: Longest run of paths considered for a 2-opt reversal
+        passes: Maximum number of 2-opt passes
+
+    Returns:
+        TravelPlan: The strokes and the pen-up distance before and after
+    """
+    polylines = [list(p) for p in polylines if p]
+    if closed:
+        original = [p + p[:1] for p in polylines]
+    else:
+        original = polylines
+    travel_before = travel_distance(original, start)
+    if not polylines:
+        return TravelPlan([], 0.0, 0.0, 0)
+
+    # Entry candidates: every vertex of closed paths, both ends of open ones
+    points, items = [], []
+    for item, vertices in enumerate(polylines):
+        candidates = vertices if closed else [vertices[0], vertices[-1]]
+        points.extend(candidates)
+        items.extend([item] * len(candidates))
+    grid = PointGrid(points, items)
+
+    # entries/exits hold the vertex index each path is entered/left at
+    order, entries, exits = [], [], []
+    candidate_start = np.cumsum([0] + [len(p) if closed else 2 for p in polylines])
+    position = start
+    while grid.remaining:
+        index = grid.nearest(position)
+        item = items[index]
+        grid.remove_item(item)
+        vertices = polylines[item]
+        local = int(index - candidate_start[item])
+        if closed:
+            entry = exit_ = local
+        else:
+            entry, exit_ = (0, len(vertices) - 1) if local == 0 else (len(vertices) - 1, 0)
+        order.append(item)
+        entries.append(entry)
+        exits.append(exit_)
+        position = vertices[exit_]
+
+    order, entries, exits = _two_opt(polylines, order, entries, exits, start, window, passes)
+    if closed:
+        entries = _choose_entries(polylines, order, entries, start)
+        exits = entries
+
+    strokes = []
+    for item, entry, exit_ in zip(order, entries, exits):
+        vertices = polylines[item]
+        if closed:
+            strokes.append(vertices[entry:] + vertices[:entry] + [vertices[entry]])
+        elif entry == 0:
+            strokes.append(list(vertices))
+        else:
+            strokes.append(vertices[::-1])
+
+    strokes, merged = _merge_strokes(strokes, merge_tolerance)
+    return TravelPlan(strokes, travel_before, travel_distance(strokes, start), merged)
+
+
+def _two_opt(polylines, order, entries, exits, start, window, passes):
+    """Windowed 2-opt over the path order, vectorized over the window"""
+    n = len(order)
+    if n < 3:
+        return order, entries, exits
+    order, entries, exits = list(order), list(entries), list(exits)
+
+    def endpoints():
+        entry_points = np.array([polylines[item][e] for item, e in zip(order, entries)])
+        exit_points = np.array([polylines[item][e] for item, e in zip(order, exits)])
+        return entry_points, exit_points
+
+    for _ in range(passes):
+        improved = False
+        entry_points, exit_points = endpoints()
+        for i in range(n - 1):
+            # Pen position before path i
+            before = start if i == 0 else exit_points[i - 1]
+            last = min(n, i + window)
+            js = np.arange(i + 1, last)
+            if not len(js):
+                continue
+            # Reversing paths i..j: before -> exit[j] ... entry[i] -> entry[j + 1]
+            following = entry_points[np.minimum(js + 1, n - 1)]
+            has_next = js + 1 < n
+            old = abs(before - entry_points[i]) + np.where(has_next, np.abs(exit_points[js] - following), 0)
+            new = abs(before - exit_points[js]) + np.where(has_next, np.abs(entry_points[i] - following), 0)
+            gains = old - new
+            best = int(np.argmax(gains))
+            if gains[best] > 1e-9:
+                j = int(js[best])
+                order[i:j + 1] = order[i:j + 1][::-1]
+                # A reversed open path is entered at its old exit
+                entries[i:j + 1], exits[i:j + 1] = exits[i:j + 1][::-1], entries[i:j + 1][::-1]
+                entry_points, exit_points = endpoints()
+                improved = True
+        if not improved:
+            break
+    return order, entries, exits
+
+
+def _choose_entries(polylines, order, entries, start):
+    """Pick each closed path's entry vertex given where the pen comes from and goes next"""
+    entries = list(entries)
+    position = start
+    for k, item in enumerate(order):
+        vertices = np.array(polylines[item])
+        if k + 1 < len(order):
+            following = polylines[order[k + 1]][entries[k + 1]]
+            cost = np.abs(vertices - position) + np.abs(vertices - following)
+        else:
+            cost = np.abs(vertices - position)
+        entries[k] = int(np.argmin(cost))
+        position = vertices[entries[k]]
+    return entries
+
+
+def _merge_strokes(strokes, tolerance):
+    """Join strokes that start where the previous one ended"""
+    if not strokes:
+        return strokes, 0
+    merged = [strokes[0]]
+    count = 0
+    for stroke in strokes[1:]:
+        gap = abs(stroke[0] - merged[-1][-1])
+        if gap <= tolerance:
+            merged[-1] = merged[-1] + (stroke[1:] if gap == 0 else stroke)
+            count += 1
+        else:
+            merged.append(stroke)
+    return merged, count
+
+
+def optimize_buffer(buffer, tolerance, start=0j, merge_tolerance=0.0, **kwargs):
+    """
+    Flatten the contours of a PathBuffer and reorder them for less pen-up travel.
+
+    Args:
+        buffer: The laid-out geometry
+        tolerance: Flattening tolerance (in layout units)
+        start: Pen position before the first contour
+        merge_tolerance: Largest gap bridged without lifting the pen
+        **kwargs: Passed on to optimize_paths (window, passes)
+
+    Returns:
+        TravelPlan: The strokes and the pen-up distance before and after
+    """
+    return optimize_paths(buffer_polylines(buffer, tolerance), closed=True, start=start,
+                          merge_tolerance=merge_tolerance, **kwargs)
@@ -0,0 +1,179 @@
+import math
+
+# FreeType outline point tags (FT_CURVE_TAG_*): bit 0 set means the point is on
+# the curve, otherwise bit 1 tells a cubic control point from a conic one.
+TAG_ON = 1
+TAG_CUBIC = 2
+
+
+def is_on_curve(tag):
+    return tag & TAG_ON
+
+
+def is_cubic(tag):
+    return not tag & TAG_ON and tag & TAG_CUBIC
+
+
+def decode_contour(points, tags):
+    """
+    Decode one closed contour into drawing commands.
+
+    Follows FT_Outline_Decompose: an on-curve point ends a segment, a conic
+    (TrueType) off-curve point is a quadratic control point, and two conic
+    points in a row imply an on-curve point halfway between them. Pairs of
+    cubic off-curve points (PostScript fonts) become cubic control points.
+
+    Args:
+        points: Contour points as complex numbers
+        tags: FreeType tags for each point
+
+    Returns:
+        tuple: (start, commands) where each command is ('L', end),
+        ('Q', control, end) or ('C', control1, control2, end), and the last
+        command ends back on the start point
+    """
+    n = len(points)
+    if n == 0:
+        return None, []
+
+    # Start on an on-curve point; a contour made only of conic points
+    # starts on the implied point between its last and first points
+    first_on = next((i for i, tag in enumerate(tags) if is_on_curve(tag)), None)
+    if first_on is None:
+        start = (points[-1] + points[0]) / 2
+        order = range(n)
+    else:
+        start = points[first_on]
+        order = [(first_on + k) % n for k in range(1, n)]
+
+    commands = []
+    current = start
+    controls = []
+    for i in list(order) + [None]:
+        # None stands for returning to the start point to close the contour
+        if i is None:
+            point, tag = start, TAG_ON
+        else:
+            point, tag = points[i], tags[i]
+
+        if is_on_curve(tag):
+            if not controls:
+                if point != current:
+                    commands.append(('L', point))
+            elif len(controls) == 1:
+                commands.append(('Q', controls[0], point))
+            else:
+                commands.append(('C', controls[0], controls[1], point))
+            current = point
+            controls = []
+        elif is_cubic(tag):
+            controls.append(point)
+        else:
+            if controls:
+                # Two conic control points in a row imply an on-curve point
+                midpoint = (controls[0] + point) / 2
+                commands.append(('Q', controls[0], midpoint))
+                current = midpoint
+            controls = [point]
+
+    return start, commands
+
+
+def contour_segments(points, tags):
+    """
+    Decode one closed contour into svgpathtools segments (see decode_contour).
+
+    Returns:
+        list: Line, QuadraticBezier and CubicBezier segments closing the contour
+    """
+    from svgpathtools import Line, QuadraticBezier, CubicBezier
+
+    current, commands = decode_contour(points, tags)
+    segments = []
+    for command in commands:
+        if command[0] == 'L':
+            segments.append(Line(current, command[1]))
+        elif command[0] == 'Q':
+            segments.append(QuadraticBezier(current, command[1], command[2]))
+        else:
+            segments.append(CubicBezier(current, command[1], command[2], command[3]))
+        current = command[-1]
+    return segments
+
+
+def curve_steps(bpoints, tolerance):
+    """
+    Number of lines needed to stay within tolerance of a Bezier curve.
+
+    Comes from the bound on the distance between a Bezier curve and its
+    chords, which depends on the second differences of the control points.
+    """
+    if len(bpoints) == 3:
+        p0, c, p1 = bpoints
+        steps = math.sqrt(abs(p0 - 2 * c + p1) / (4 * tolerance))
+    else:
+        p0, c1, c2, p1 = bpoints
+        second_diff = max(abs(p0 - 2 * c1 + c2), abs(c1 - 2 * c2 + p1))
+        steps = math.sqrt(3 * second_diff / (4 * tolerance))
+    return max(1, math.ceil(steps))
+
+
+def bezier_point(bpoints, t):
+    """Evaluate a quadratic or cubic Bezier curve given by its control points"""
+    s = 1 - t
+    if len(bpoints) == 3:
+        p0, c, p1 = bpoints
+        return s * s * p0 + 2 * s * t * c + t * t * p1
+    p0, c1, c2, p1 = bpoints
+    return s * s * s * p0 + 3 * s * s * t * c1 + 3 * s * t * t * c2 + t * t * t * p1
+
+
+def flatten_segment(segment, tolerance):
+    """Approximate a segment with lines that stay within tolerance of the curve"""
+    from svgpathtools import Line
+
+    if isinstance(segment, Line):
+        return [segment]
+
+    bpoints = segment.bpoints()
+    steps = curve_steps(bpoints, tolerance)
+    lines = []
+    previous = bpoints[0]
+    for k in range(1, steps + 1):
+        point = bpoints[-1] if k == steps else segment.point(k / steps)
+        lines.append(Line(previous, point))
+        previous = point
+    return lines
+
+
+def flatten_segments(segments, tolerance):
+    """Flatten a list of segments into lines (see flatten_segment)"""
+    lines = []
+    for segment in segments:
+        lines.extend(flatten_segment(segment, tolerance))
+    return lines
+
+
+def contour_polyline(points, tags, tolerance):
+    """
+    Decode and flatten one closed contour straight into polygon vertices.
+
+    Same result as flatten_segments(contour_segments(...)), without building
+    svgpathtools objects.
+
+    Returns:
+        list: Vertices as complex numbers; the contour closes back to the first one
+    """
+    current, commands = decode_contour(points, tags)
+    if current is None:
+        return []
+    vertices = [current]
+    for command in commands:
+        if command[0] != 'L':
+            bpoints = (current,) + command[1:]
+            steps = curve_steps(bpoints, tolerance)
+            vertices.extend(bezier_point(bpoints, k / steps) for k in range(1, steps))
+        vertices.append(command[-1])
+        current = command[-1]
+    # The last command ends on the start point, which is already the first vertex
+    return vertices[:-1] if len(vertices) > 1 else vertices
@@ -0,0 +1,178 @@
+from .outline import decode_contour
+from .tsvg import iter_layout_lines, plan_layout
+
+# Same defaults as svgpathtools.wsvg, so the plotter sees the same kind of file
+RELATIVE_STROKE_WIDTH = 1e-3
+MARGIN = 0.1
+MINDIM = 600
+
+
+def format_number(value, precision):
+    """Format a coordinate with at most `precision` decimals and no trailing zeros"""
+    text = f"{value:.{precision}f}"
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text == '-0':
+        text = '0'
+    return text
+
+
+def contour_data(points, tags, precision=2):
+    """
+    Serialize one closed contour into SVG path data.
+
+    Args:
+        points: Contour points as complex numbers
+        tags: FreeType tags for each point
+        precision: Number of decimals to write
+
+    Returns:
+        str: Path data starting with M and ending with Z
+    """
+    def fmt(point):
+        return f"{format_number(point.real, precision)},{format_number(point.imag, precision)}"
+
+    start, commands = decode_contour(points, tags)
+    if start is None:
+        return ''
+    parts = [f"M {fmt(start)}"]
+    for command in commands:
+        parts.append(command[0] + ' ' + ' '.join(fmt(point) for point in command[1:]))
+    parts.append('Z')
+    return ' '.join(parts)
+
+
+def path_data(buffer, precision=2):
+    """Serialize all contours of a PathBuffer (or GlyphOutline) into SVG path data"""
+    points = (buffer.points[:, 0] + 1j * buffer.points[:, 1]).tolist()
+    tags = buffer.tags.tolist()
+    offsets = buffer.offsets.tolist()
+    return ' '.join(contour_data(points[start:end], tags[start:end], precision)
+                    for start, end in zip(offsets[:-1], offsets[1:]))
+
+
+class SVGWriter:
+    """
+    Writes an SVG file incrementally, without keeping the drawing in memory.
+
+    The page size has to be known up front (see LayoutPlan.bbox), after that
+    paths can be written one line or one glyph at a time. With per_line=False
+    all paths are streamed into a single <path> element instead.
+
+    Args:
+        file: Filename or open text file to write to
+        bbox: (xmin, xmax, ymin, ymax) of the drawing, in layout units
+        precision: Number of decimals written for each coordinate
+        per_line: Write one <path> per write_path() call, grouped in <g> elements
+        stroke: Stroke color of the paths
+        stroke_width: Stroke width, defaults to a small fraction of the page size
+    """
+
+    def __init__(self, file, bbox, precision=2, per_line=True, stroke='black', stroke_width=None):
+        self.precision = precision
+        self.per_line = per_line
+        self.paths_written = 0
+        self._owns_file = not hasattr(file, 'write')
+        self._file = open(file, 'w') if self._owns_file else file
+        self._stroke = stroke
+
+        xmin, xmax, ymin, ymax = bbox
+        dx = (xmax - xmin) or 1
+        dy = (ymax - ymin) or 1
+        if stroke_width is None:
+            stroke_width = max(dx, dy) * RELATIVE_STROKE_WIDTH
+        self._stroke_width = stroke_width
+
+        # Pad the drawing like wsvg does so strokes on the edge stay visible
+        xmin -= MARGIN * dx + stroke_width / 2
+        ymin -= MARGIN * dy + stroke_width / 2
+        dx += 2 * MARGIN * dx + stroke_width
+        dy += 2 * MARGIN * dy + stroke_width
+        if dx > dy:
+            width, height = MINDIM, -(-MINDIM * dy // dx)
+        else:
+            width, height = -(-MINDIM * dx // dy), MINDIM
+        view_box = ' '.join(format_number(v, precision) for v in (xmin, ymin, dx, dy))
+
+        self._file.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+        self._file.write(f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+                         f'width="{int(width)}px" height="{int(height)}px" viewBox="{view_box}">\n')
+        if not per_line:
+            self._file.write(f'<path {self._style()} d="')
+
+    def _style(self):
+        return f'fill="none" stroke="{self._stroke}" stroke-width="{format_number(self._stroke_width, self.precision)}"'
+
+    def write_path(self, buffer, group_id=None):
+        """
+        Write the contours of a PathBuffer or GlyphOutline.
+
+        Args:
+            buffer: The geometry to write
+            group_id: id of the <g> element wrapping the path (per_line mode only)
+        """
+        data = path_data(buffer, self.precision)
+        if not data:
+            return
+        if self.per_line:
+            group = f'<g id="{group_id}">' if group_id is not None else '<g>'
+            self._file.write(f'{group}<path {self._style()} d="{data}" /></g>\n')
+        else:
+            if self.paths_written:
+                self._file.write(' ')
+            self._file.write(data)
+        self.paths_written += 1
+
+    def close(self):
+        if not self.per_line:
+            self._file.write('" />\n')
+        self._file.write('</svg>\n')
+        if self._owns_file:
+            self._file.close()
+        else:
+            self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_text_svg(face, sentence, filename, char_spacing=200, word_spacing=400, max_width=2000,
+                   line_spacing=3000, glyph_cache=None, font_spacing=False, line_breaking='greedy', precision=2, per_line=True):
+    """
+    Lay out a sentence and stream it into an SVG file one line at a time.
+
+    The words are measured first so the viewBox is known before anything is
+    drawn; each line is then drawn and written before the next one is laid out.
+    Takes the layout arguments of layout_sentence plus the SVGWriter options.
+
+    Returns:
+        LayoutPlan: The line breaks and page metrics of the written text
+    """
+    plan = plan_layout(face, sentence, char_spacing=char_spacing, word_spacing=word_spacing,
+                       max_width=max_width, line_spacing=line_spacing, glyph_cache=glyph_cache,
+                       font_spacing=font_spacing, line_breaking=line_breaking)
+    write_plan_svg(face, plan, filename, glyph_cache=glyph_cache, precision=precision, per_line=per_line)
+    return plan
+
+
+def write_plan_svg(face, plan, filename, glyph_cache=None, precision=2, per_line=True):
+    """
+    Draw the lines of a LayoutPlan and stream them into an SVG file.
+
+    Args:
+        face: The face the plan was made with
+        plan: LayoutPlan from plan_layout
+        filename: Filename or open text file to write to
+        glyph_cache: GlyphCache to load outlines from
+        precision, per_line: See SVGWriter
+
+    Returns:
+        int: Number of paths written
+    """
+    with SVGWriter(filename, plan.bbox(), precision=precision, per_line=per_line) as writer:
+        for line_idx, line in enumerate(iter_layout_lines(face, plan, glyph_cache=glyph_cache)):
+            writer.write_path(line, group_id=f"line-{line_idx}")
+    return writer.paths_written
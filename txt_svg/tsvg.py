@@ -1,61 +1,48 @@
-from freetype import Face
-from svgpathtools import wsvg, Line, Path
+import logging
+import os
+import re
 
-def char_to_path(face, char):
-    # Load the character
-    face.load_char(char)
-    
-    # Extract the glyph outline
-    outline = face.glyph.outline
-    points = outline.points
+from .geometry import PathBuilder, load_glyph
+from .glyph_cache import default_cache
+from .linebreak import greedy_breaks, line_lengths, optimal_breaks, split_lines
+from .metrics import font_metrics
+
+logger = logging.getLogger(__name__)
+
+# Fonts bundled with the package
+FONT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Every line starts this far from the left edge (where the old starting marker sat)
+LINE_START = 50
+
+def char_to_path(face, char, curves=True, tolerance=None):
+    """
+    Convert a character's outline into a path starting at x=0 on the baseline.
+
+    Args:
+        face: The font face
+        char: The character to convert
+        curves: Decode the outline's on/off-curve tags into quadratic and cubic
+                Bezier segments. If False, every outline point is joined with
+                a straight line (the old polyline output).
+        tolerance: If given, flatten the curves into lines that stay within
+                   this distance (in font units) of the true outline
+
+    Returns:
+        tuple: (path, glyph_width)
+    """
+    glyph = load_glyph(face, char, curves=curves, tolerance=tolerance)
     # If the glyph has no outline (e.g. space) return an empty path and zero width.
-    if not points:
+    if not glyph.contour_count:
+        from svgpathtools import Path
         return Path(), 0
     
-    # Get font metrics
-    # In FreeType, the baseline is at y=0, with positive y going up
-    # We need to adjust coordinates to work with SVG where positive y goes down
-    bearing_y = face.glyph.metrics.horiBearingY / 64.0  # Distance from baseline to top of glyph
-    
-    # Transform points: 
-    # 1. Shift all points so that the baseline is at y=0 in our coordinate system
-    # 2. Flip y coordinates for SVG (positive y goes down)
-    outline_points = [(p[0], -p[1]) for p in points]
-    
-    # Normalize x coordinates: subtract the left bearing (left edge of the character)
-    # This ensures the character starts at x=0
-    min_x = min(pt[0] for pt in outline_points)
-    outline_points = [(pt[0] - min_x, pt[1]) for pt in outline_points]
-    
-    # Create paths for all contours
-    path = Path()
-    start = 0
-    for end in outline.contours:
-        contour_points = outline_points[start:end + 1]
-        # Create lines for the contour
-        for i in range(len(contour_points) - 1):
-            line = Line(
-                start=contour_points[i][0] + 1j * contour_points[i][1],
-                end=contour_points[i + 1][0] + 1j * contour_points[i + 1][1]
-            )
-            path.append(line)
-        
-        # Close the contour by connecting the last point to the first
-        line = Line(
-            start=contour_points[-1][0] + 1j * contour_points[-1][1],
-            end=contour_points[0][0] + 1j * contour_points[0][1]
-        )
-        path.append(line)
-        
-        start = end + 1
-    
-    # Compute the visible width of the glyph
-    glyph_width = max(pt[0] for pt in outline_points) if outline_points else 0
-    
-    return path, glyph_width
+    return glyph.to_path(), glyph.width
 
 def create_marker(x, y, size=10):
     """Create a simple cross marker at the specified position"""
+    from svgpathtools import Line, Path
+    
     path = Path()
     # Horizontal line
     path.append(Line(complex(x - size, y), complex(x + size, y)))
@@ -63,12 +50,24 @@ def create_marker(x, y, size=10):
     path.append(Line(complex(x, y - size), complex(x, y + size)))
     return path
 
-def sentence_to_path(face, sentence, char_spacing=200, word_spacing=400, max_width=2000, line_spacing=3000):
+def sentence_to_path(face, sentence, char_spacing=200, word_spacing=400, max_width=2000, line_spacing=3000, glyph_cache=None, font_spacing=False, line_breaking='greedy'):
     """
     Converts a sentence (string) into a combined SVG path.
+    Takes the same arguments as layout_sentence, which does the actual layout;
+    this only converts its PathBuffer into an svgpathtools Path.
+    """
+    return layout_sentence(face, sentence, char_spacing=char_spacing, word_spacing=word_spacing,
+                           max_width=max_width, line_spacing=line_spacing,
+                           glyph_cache=glyph_cache, font_spacing=font_spacing,
+                           line_breaking=line_breaking).to_path()
+
+def layout_sentence(face, sentence, char_spacing=200, word_spacing=400, max_width=2000, line_spacing=3000, glyph_cache=None, font_spacing=False, line_breaking='greedy'):
+    """
+    Lays out a sentence (string) into a PathBuffer holding every glyph outline on the page.
     Each character is drawn sequentially by translating it by the cumulative width of previous characters.
     Characters are aligned along the baseline (ground).
     Line breaks are automatically inserted when a line exceeds max_width.
+    The words are measured and broken into lines first (plan_layout), then drawn.
     
     Args:
         face: The font face
@@ -77,121 +76,264 @@ def sentence_to_path(face, sentence, char_spacing=200, word_spacing=400, max_wid
         word_spacing: Additional spacing to add between words (in units)
         max_width: Maximum width of a line before wrapping (in units)
         line_spacing: Vertical spacing between lines (in units)
+        glyph_cache: GlyphCache to look glyphs up in (defaults to the shared cache)
+        font_spacing: Space characters by the font's advance widths and kerning,
+                      with char_spacing added as extra tracking, instead of
+                      butting glyph outlines char_spacing apart
+        line_breaking: 'greedy' to fill each line in turn, 'optimal' to even
+                       out the line lengths over the whole text (see
+                       txt_svg.linebreak), or a function
+                       (word_widths, word_spacing, max_width) -> breaks
+    
+    Returns:
+        PathBuffer: The glyph outlines, with one group of contours per line
     """
-    # Debug - print input parameters
-    print(f"Processing sentence: '{sentence}'")
-    print(f"Using char_spacing={char_spacing}, word_spacing={word_spacing}, max_width={max_width}, line_spacing={line_spacing}")
+    plan = plan_layout(face, sentence, char_spacing=char_spacing, word_spacing=word_spacing,
+                       max_width=max_width, line_spacing=line_spacing, glyph_cache=glyph_cache,
+                       font_spacing=font_spacing, line_breaking=line_breaking)
     
-    combined_path = Path()
-    x_offset = 0
+    builder = PathBuilder()
+    for line_idx in range(plan.line_count):
+        if line_idx > 0:
+            builder.new_line()
+        place_line(builder, face, plan, line_idx, glyph_cache=glyph_cache)
+    return builder.build()
+
+def iter_layout_lines(face, plan, glyph_cache=None):
+    """
+    Draw the lines of a LayoutPlan one at a time.
     
-    # By default in SVG, y increases downward
-    # The baseline in our coordinate system will be at y=0
-    baseline_y = 0
-    current_line = 0  # Track the current line number (0-based)
+    Yields:
+        PathBuffer: The glyph outlines of each line, in order
+    """
+    for line_idx in range(plan.line_count):
+        builder = PathBuilder()
+        place_line(builder, face, plan, line_idx, glyph_cache=glyph_cache)
+        yield builder.build()
+
+class LayoutPlan:
+    """
+    Result of the measuring pass of the layout: which words go on which line.
+    
+    Knowing the line count and widths before anything is drawn lets writers
+    size the page up front and then draw it line by line.
+    """
     
+    def __init__(self, lines, line_widths, char_spacing, word_spacing, line_spacing, ascender, descender,
+                 metrics=None, font_spacing=False):
+        self.lines = lines  # List of word lists, one per line
+        self.line_widths = line_widths  # Right edge of each line's last word
+        self.metrics = metrics  # FontMetrics the words were measured with
+        self.font_spacing = font_spacing
+        self.char_spacing = char_spacing
+        self.word_spacing = word_spacing
+        self.line_spacing = line_spacing
+        self.ascender = ascender
+        self.descender = descender
+    
+    @property
+    def line_count(self):
+        return len(self.lines)
+    
+    def baseline(self, line_idx):
+        return line_idx * self.line_spacing
+    
+    def bbox(self):
+        """Return (xmin, xmax, ymin, ymax) of the page from the font metrics"""
+        width = max(self.line_widths, default=LINE_START)
+        bottom = self.baseline(max(self.line_count - 1, 0)) - self.descender
+        return (0, width, -self.ascender, bottom)
+
+def plan_layout(face, sentence, char_spacing=200, word_spacing=400, max_width=2000, line_spacing=3000, glyph_cache=None, font_spacing=False, line_breaking='greedy'):
+    """
+    Measure the words of a sentence and decide where the lines break.
+    Takes the same arguments as layout_sentence.
+    
+    Words are measured from the precomputed FontMetrics of the face, so no
+    glyph outlines are loaded here.
+    
+    Returns:
+        LayoutPlan: The words on each line and the line widths
+    """
+    metrics = font_metrics(face)
+
     # Split the sentence into words and manually handle the spacing
     words = sentence.split()
-    print(f"Split into {len(words)} words: {words}")
-    
-    # Add a starting marker
-    # combined_path.extend(create_marker(x_offset, baseline_y))
-    x_offset += 50  # Offset from the initial marker
-    
-    # For tracking word boundaries at line break points
-    line_break_before_word = False
-    
-    for word_idx, word in enumerate(words):
-        # Check if this word might exceed the line width
-        # We need to calculate the width of the word + spacing
-        word_width = 0
-        for char in word:
-            face.load_char(char)
-            if not face.glyph.outline.points:
-                char_width = face.glyph.advance.x / 64.0
-            else:
-                _, char_width = char_to_path(face, char)
-            word_width += char_width + char_spacing
-        
-        # Subtract the last character spacing as it doesn't apply to the last character
-        if len(word) > 0:
-            word_width -= char_spacing
-        
-        # Debug: print the word and its width
-        print(f"Word: '{word}', Width: {word_width}, Current x_offset: {x_offset}")
-        
-        # Check if adding this word would exceed max_width
-        # Include word spacing only if it's not the first word on the line
-        word_spacing_to_add = word_spacing if x_offset > 50 and not line_break_before_word else 0
-        
-        # Only break line if BOTH:
-        # 1. Adding this word would exceed max_width
-        # 2. We're not at the start of a line (x_offset > 50)
-        if x_offset + word_width + word_spacing_to_add > max_width and x_offset > 50:
-            print(f"Line break triggered: x_offset ({x_offset}) + word_width ({word_width}) + word_spacing ({word_spacing_to_add}) > max_width ({max_width})")
-            # Start a new line
-            current_line += 1
-            baseline_y = current_line * line_spacing
-            x_offset = 50  # Reset x to beginning of line
-            
-            # Add line break markers - a horizontal line to clearly show line separation
-            # line_width = 50  # Width of the horizontal line marker
-            # line_marker = Line(complex(0, baseline_y - line_spacing/2), complex(line_width, baseline_y - line_spacing/2))
-            # combined_path.append(line_marker)
-            
-            # Add a new line marker
-            # combined_path.extend(create_marker(0, baseline_y))
-            print(f"Line break inserted. New line y-position: {baseline_y}")
-            
-            # Flag that we just did a line break
-            line_break_before_word = True
-        else:
-            line_break_before_word = False
-        
+    
+    # Width of every word: glyph widths plus char_spacing between characters
+    word_widths = metrics.word_widths(words, char_spacing, font_spacing).tolist()
+    
+    # The layout has always kept room for one more word space at the end of
+    # each line, so lines hold max_width - LINE_START - word_spacing of content
+    available = max_width - LINE_START - word_spacing
+    if line_breaking == 'greedy':
+        breaks = greedy_breaks(word_widths, word_spacing, available)
+    elif line_breaking == 'optimal':
+        breaks = optimal_breaks(word_widths, word_spacing, available)
+    else:
+        breaks = line_breaking(word_widths, word_spacing, available)
+    
+    lines = split_lines(words, breaks)
+    line_widths = [LINE_START + width for width in line_lengths(word_widths, word_spacing, breaks)]
+    logger.debug("Laid out %d words on %d lines (char_spacing=%s, word_spacing=%s, max_width=%s, line_spacing=%s)",
+                 len(words), len(lines), char_spacing, word_spacing, max_width, line_spacing)
+    
+    # By default in SVG, y increases downward and the font's descender is negative
+    ascender = face.size.ascender
+    descender = face.size.descender
+    return LayoutPlan(lines, line_widths, char_spacing, word_spacing, line_spacing, ascender, descender,
+                      metrics=metrics, font_spacing=font_spacing)
+
+def place_line(builder, face, plan, line_idx, glyph_cache=None):
+    """Place the glyphs of one planned line into a PathBuilder"""
+    # The baseline in our coordinate system is at y=0 for the first line
+    place_words(builder, face, plan, plan.lines[line_idx], LINE_START, plan.baseline(line_idx), glyph_cache)
+
+def place_words(builder, face, plan, words, x_offset, baseline_y, glyph_cache=None):
+    """
+    Place words on one line into a PathBuilder, starting at x_offset
+    
+    Args:
+        plan: LayoutPlan or TextLayout giving the spacing and metrics
+    
+    Returns:
+        The x position where the next word on the line would start
+    """
+    if glyph_cache is None:
+        glyph_cache = default_cache
+    
+    metrics = plan.metrics
+    
+    for word in words:
         # Process each character in the word
         for char_idx, char in enumerate(word):
-            # Load the character
-            face.load_char(char)
+            # Get the glyph outline (glyphs without outlines, e.g. spaces,
+            # come back empty with their advance width)
+            glyph = glyph_cache.glyph(face, char)
             
-            # Get the glyph path and its width (handle glyphs without outlines)
-            if not face.glyph.outline.points:
-                # For spaces or other characters without outlines
-                glyph_width = face.glyph.advance.x / 64.0
-                glyph_path = Path()
-            else:
-                glyph_path, glyph_width = char_to_path(face, char)
+            if plan.font_spacing:
+                # Place the glyph at its left bearing from the pen position
+                # and advance the pen the way the font says, kerning included
+                i = metrics.indices(char)[0]
+                builder.place(glyph, x_offset + metrics.left_bearings[i], baseline_y)
+                x_offset += metrics.advances[i]
+                if char_idx < len(word) - 1:
+                    x_offset += metrics.kern(char, word[char_idx + 1]) + plan.char_spacing
+                continue
             
-            # Translate and add to combined path
-            translated_path = glyph_path.translated(complex(x_offset, baseline_y))
-            combined_path.extend(translated_path)
+            # Place the glyph; its points are translated when the page is built
+            builder.place(glyph, x_offset, baseline_y)
             
             # Move to the end of the character
-            x_offset += glyph_width
+            x_offset += glyph.width
             
-            # Add a character marker
-            # combined_path.extend(create_marker(x_offset, baseline_y))
-            
-            # Add character spacing - now visual and explicit
-            if char_idx < len(word) - 1:  # Not after the last character in the word
-                x_offset += char_spacing
-                # Add a spacing marker
-                # combined_path.extend(create_marker(x_offset, baseline_y - 20))
+            # Add character spacing between characters of the word
+            if char_idx < len(word) - 1:
+                x_offset += plan.char_spacing
         
-        # After each word, add word spacing (except for the last word)
-        if word_idx < len(words) - 1:
-            # Add word spacing between words, even after a line break
-            # This ensures space is added between words on new lines
-            x_offset += word_spacing
-            # Add a word spacing marker at a different height to distinguish it
-            # combined_path.extend(create_marker(x_offset - word_spacing/2, baseline_y - 40))
-            
-            # If we're at the end of a line and the next word would exceed max_width,
-            # we'll clear this word spacing in the next iteration when we do the line break
-            
-            # Reset the line break flag after we've processed a word
-            line_break_before_word = False
+        # Add word spacing between words on the line
+        x_offset += plan.word_spacing
+    return x_offset
+
+class TextLayout:
+    """
+    A page laid out a few words at a time, for text that arrives in pieces
+    (e.g. while it is being transcribed or revised).
+    
+    Uses the same measurements and greedy line breaking as plan_layout with
+    line_breaking='greedy', so appending a text in any number of pieces gives
+    the same page as laying it out in one go. Each append() only measures and
+    places the new words.
+    
+    Args:
+        face: The font face
+        char_spacing, word_spacing, max_width, line_spacing, glyph_cache,
+        font_spacing: As for layout_sentence
+    """
+    
+    def __init__(self, face, char_spacing=200, word_spacing=400, max_width=2000, line_spacing=3000, glyph_cache=None, font_spacing=False):
+        self.face = face
+        self.metrics = font_metrics(face)
+        self.char_spacing = char_spacing
+        self.word_spacing = word_spacing
+        self.max_width = max_width
+        self.line_spacing = line_spacing
+        self.glyph_cache = glyph_cache
+        self.font_spacing = font_spacing
+        # The same room for a line's content as plan_layout leaves
+        self.available = max_width - LINE_START - word_spacing
+        self.lines = []  # List of word lists, one per line
+        self.line_widths = []  # Right edge of each line's last word
+        self.cursor = LINE_START  # Where the next word on the last line starts
+        self._line_width = None  # Content width of the last line
+        self._pending = ""  # Start of a word that hasn't ended yet
+        self._page = PathBuilder()
     
-    return combined_path
+    @property
+    def line_count(self):
+        return len(self.lines)
+    
+    def baseline(self, line_idx):
+        return line_idx * self.line_spacing
+    
+    def append(self, text, complete=True):
+        """
+        Lay out more words at the end of the page.
+        
+        Args:
+            text: The new text
+            complete: If False, text may stop in the middle of a word; that
+                      word is held back until a later append() finishes it
+        
+        Returns:
+            PathBuffer: The outlines of the new words only, one line group per
+            line they went on; the first group belongs to page line first_line
+        """
+        text = self._pending + text
+        self._pending = ""
+        if not complete:
+            unfinished = re.search(r"\S+$", text)
+            if unfinished:
+                self._pending = unfinished.group()
+                text = text[:unfinished.start()]
+        words = text.split()
+        if not words:
+            return PathBuilder(first_line=max(self.line_count - 1, 0)).build()
+        
+        widths = self.metrics.word_widths(words, self.char_spacing, self.font_spacing).tolist()
+        had_lines = bool(self.lines)
+        # Whether the first new word starts a line (rather than continuing the last one)
+        breaks_first = not had_lines or self._line_width + self.word_spacing + widths[0] > self.available
+        builder = PathBuilder(first_line=self.line_count if breaks_first else self.line_count - 1)
+        for index, (word, width) in enumerate(zip(words, widths)):
+            if not self.lines or self._line_width + self.word_spacing + width > self.available:
+                if index:
+                    builder.new_line()
+                self.lines.append([])
+                self.line_widths.append(LINE_START)
+                self.cursor = LINE_START
+                self._line_width = None
+            line_idx = self.line_count - 1
+            self.cursor = place_words(builder, self.face, self, [word], self.cursor, self.baseline(line_idx),
+                                      self.glyph_cache)
+            self._line_width = width if self._line_width is None else self._line_width + self.word_spacing + width
+            self.lines[-1].append(word)
+            self.line_widths[-1] = LINE_START + self._line_width
+        
+        self._page.extend(builder, new_line=breaks_first and had_lines)
+        return builder.build()
+    
+    def plan(self):
+        """The page so far as a LayoutPlan (e.g. for write_plan_svg)"""
+        lines = [list(line) for line in self.lines] or [[]]
+        line_widths = list(self.line_widths) or [LINE_START]
+        return LayoutPlan(lines, line_widths, self.char_spacing, self.word_spacing, self.line_spacing,
+                          self.face.size.ascender, self.face.size.descender,
+                          metrics=self.metrics, font_spacing=self.font_spacing)
+    
+    def build(self):
+        """The outlines of the whole page so far, one line group per line"""
+        return self._page.build()
 
 def tsvg(text_input, max_width=8000, line_spacing=3000):
     """
@@ -205,8 +347,10 @@ def tsvg(text_input, max_width=8000, line_spacing=3000):
     Returns:
         Path: The SVG path object representing the text
     """
+    from freetype import Face
+    
     # Load the font and set the desired size
-    face = Face('./Vera.ttf')
+    face = Face(os.path.join(FONT_DIR, 'Vera.ttf'))
     face.set_char_size(24 * 64)  # Further reduced font size for more words per line
     
     # Clean up the input text if needed (e.g., handle newlines, remove special characters)
@@ -220,8 +364,11 @@ def tsvg(text_input, max_width=8000, line_spacing=3000):
     return combined_svg_path
 
 if __name__ == '__main__':
+    from freetype import Face
+    from svgpathtools import wsvg
+    
     # Load the font and set the desired size.
-    face = Face('./Vera.ttf')
+    face = Face(os.path.join(FONT_DIR, 'Vera.ttf'))
     face.set_char_size(20 * 28)  # Using smaller font size
     
     # Test with a shorter string to clearly see spacing
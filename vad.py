@@ -0,0 +1,211 @@
+"""
+Voice activity detection: find the parts of a recording that contain speech.
+
+Each short frame is classified from two features: its energy relative to the
+recording's noise floor, and its spectral flatness (noise has a flat spectrum,
+voiced speech a peaky one). Speech frames are then merged into segments,
+padded, and long segments are split at their quietest point so no segment
+is longer than what whisper handles in one window.
+
+    segments = detect_speech(samples, 16000)
+    speech = join_segments(samples, segments)  # for denoise / transcription
+    noise = non_speech(samples, segments)      # e.g. for a noise profile
+"""
+import numpy as np
+
+FRAME_MS = 20
+# Frames this far above the noise floor may be speech...
+ENERGY_MARGIN_DB = 10.0
+# ...if their spectrum is peaky enough (white noise is about 0.56) or they are
+# twice as far above the floor (unvoiced sounds are loud but flat)
+FLATNESS_THRESHOLD = 0.3
+MIN_SPEECH_MS = 60
+MIN_SILENCE_MS = 300
+PAD_MS = 150
+MAX_SEGMENT_SECONDS = 30.0
+# Silence put between segments when they are joined back together
+JOIN_GAP_MS = 200
+
+
+class Segment:
+    """
+    A stretch of speech in a recording.
+
+    Attributes:
+        start, end: Sample indices (end exclusive)
+        sr: Sample rate, for the timestamps
+    """
+
+    __slots__ = ('start', 'end', 'sr')
+
+    def __init__(self, start, end, sr):
+        self.start = start
+        self.end = end
+        self.sr = sr
+
+    @property
+    def start_time(self):
+        return self.start / self.sr
+
+    @property
+    def end_time(self):
+        return self.end / self.sr
+
+    @property
+    def duration(self):
+        return (self.end - self.start) / self.sr
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"Segment({self.start_time:.2f}-{self.end_time:.2f} s)"
+
+
+def frame_features(samples, sr, frame_ms=FRAME_MS):
+    """
+    Energy and spectral flatness of consecutive frames.
+
+    Args:
+        samples: 1-D array of audio
+        sr: Sample rate in Hz
+        frame_ms: Frame length in milliseconds
+
+    Returns:
+        tuple: (energy in dB per frame, flatness per frame in [0, 1], frame length in samples)
+    """
+    frame = max(1, int(sr * frame_ms / 1000))
+    count = len(samples) // frame
+    frames = np.asarray(samples[:count * frame], dtype=np.float32).reshape(count, frame)
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    window = np.hanning(frame).astype(np.float32)
+    power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2 + 1e-10
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return energy_db, flatness, frame
+
+
+def _runs(mask):
+    """Start and end (exclusive) indices of the runs of True in a boolean array"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect_speech(samples, sr, frame_ms=FRAME_MS, energy_margin_db=ENERGY_MARGIN_DB,
+                  flatness_threshold=FLATNESS_THRESHOLD, min_speech_ms=MIN_SPEECH_MS,
+                  min_silence_ms=MIN_SILENCE_MS, pad_ms=PAD_MS, max_segment_seconds=MAX_SEGMENT_SECONDS,
+                  noise_floor_db=None):
+    """
+    Find the speech segments of a recording.
+
+    Args:
+        samples: 1-D array of audio
+        sr: Sample rate in Hz
+        frame_ms: Analysis frame length
+        energy_margin_db: How far above the noise floor speech must be
+        flatness_threshold: Highest spectral flatness of a voiced frame
+        min_speech_ms: Shorter bursts (clicks, the button) are dropped
+        min_silence_ms: Shorter pauses don't split the speech
+        pad_ms: Audio kept before and after each segment
+        max_segment_seconds: Longer segments are split at their quietest frame
+        noise_floor_db: Energy of the background noise; estimated from the
+                        quietest frames if not given
+
+    Returns:
+        list of Segment, in order
+    """
+    energy_db, flatness, frame = frame_features(samples, sr, frame_ms)
+    if not len(energy_db):
+        return []
+    if noise_floor_db is None:
+        noise_floor_db = np.percentile(energy_db, 10)
+    loud = energy_db > noise_floor_db + energy_margin_db
+    speech = loud & ((flatness < flatness_threshold) | (energy_db > noise_floor_db + 2 * energy_margin_db))
+
+    # Close short pauses, then drop short bursts
+    starts, ends = _runs(~speech)
+    for start, end in zip(starts, ends):
+        if start > 0 and end < len(speech) and (end - start) * frame_ms < min_silence_ms:
+            speech[start:end] = True
+    starts, ends = _runs(speech)
+    keep = (ends - starts) * frame_ms >= min_speech_ms
+    starts, ends = starts[keep], ends[keep]
+
+    # Pad, clip to the recording and merge segments the padding made overlap
+    pad = int(pad_ms / frame_ms)
+    merged = []
+    for start, end in zip(np.maximum(starts - pad, 0), np.minimum(ends + pad, len(speech))):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    max_frames = max(1, int(max_segment_seconds * 1000 / frame_ms))
+    segments = []
+    for start, end in merged:
+        for part_start, part_end in _split(energy_db, start, end, max_frames):
+            # A segment reaching the last frame keeps the samples after it too
+            end_sample = part_end * frame if part_end < len(speech) else len(samples)
+            segments.append(Segment(int(part_start * frame), int(end_sample), sr))
+    return segments
+
+
+def _split(energy_db, start, end, max_frames):
+    """Split frames [start, end) into pieces of at most max_frames, cutting at the quietest frame"""
+    parts = []
+    while end - start > max_frames:
+        # Look for the cut in the last quarter of the allowed length
+        low = start + max_frames * 3 // 4
+        cut = low + int(np.argmin(energy_db[low:start + max_frames]))
+        parts.append((start, cut))
+        start = cut
+    parts.append((start, end))
+    return parts
+
+
+def join_segments(samples, segments, gap_ms=JOIN_GAP_MS):
+    """
+    Concatenate the speech segments, separated by short stretches of silence.
+
+    Segments that were split from one stretch of speech are joined without a gap.
+
+    Returns:
+        array of the same dtype as samples
+    """
+    if not segments:
+        return samples[:0]
+    gap = np.zeros(int(segments[0].sr * gap_ms / 1000), dtype=samples.dtype)
+    pieces = []
+    for index, segment in enumerate(segments):
+        if index and segment.start > segments[index - 1].end:
+            pieces.append(gap)
+        pieces.append(samples[segment.start:segment.end])
+    return np.concatenate(pieces)
+
+
+def joined_segments(segments, gap_ms=JOIN_GAP_MS):
+    """
+    Where the segments end up in the audio returned by join_segments().
+
+    Returns:
+        list of Segment with sample positions in the joined audio
+    """
+    moved = []
+    position = 0
+    for index, segment in enumerate(segments):
+        if index and segment.start > segments[index - 1].end:
+            position += int(segment.sr * gap_ms / 1000)
+        moved.append(Segment(position, position + len(segment), segment.sr))
+        position += len(segment)
+    return moved
+
+
+def non_speech(samples, segments):
+    """The samples outside the speech segments (background noise)"""
+    mask = np.ones(len(samples), dtype=bool)
+    for segment in segments:
+        mask[segment.start:segment.end] = False
+    return samples[mask]
+
+
+def speech_seconds(segments):
+    return sum(segment.duration for segment in segments)
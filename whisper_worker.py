@@ -0,0 +1,331 @@
+"""
+Long-lived whisper.cpp transcription worker.
+
+Runs whisper.cpp's HTTP server (whisper-server) as a child process so the
+model is loaded once at startup instead of on every whisper-cli call. Jobs are
+sent to it over a local socket as WAV uploads to /inference.
+
+    worker = WhisperWorker().start()   # loads the model
+    text = worker.transcribe(samples)  # int16 samples at 16 kHz, or a WAV path
+    worker.stop()
+
+The worker is health-checked before each job and restarted if the process
+died or stopped answering; a job that exceeds its timeout kills and restarts
+the server so the next dictation gets a fresh one. fakes.py has a stand-in
+server with the same HTTP interface for testing without the real binary.
+
+WhisperPool runs several servers (each with its own thread count) so the
+segments of a long recording can be transcribed at the same time.
+"""
+import collections
+import logging
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from record import RATE, encode_wav
+
+logger = logging.getLogger(__name__)
+
+WHISPER_SERVER = "./whisper.cpp/build/bin/whisper-server"
+WHISPER_MODEL = "./whisper.cpp/models/ggml-tiny.en.bin"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8910
+# Lines of the server's stderr kept for the error message when it exits
+STDERR_LINES = 50
+
+
+class WhisperError(Exception):
+    """The worker could not transcribe a job"""
+
+
+class WhisperTimeout(WhisperError):
+    """A job took longer than its timeout"""
+
+
+def _drain(pipe, tail):
+    """Read a server's stderr until it closes, keeping the last lines in tail"""
+    try:
+        for line in pipe:
+            line = line.decode(errors="replace").rstrip()
+            tail.append(line)
+            logger.debug("whisper-server: %s", line)
+    finally:
+        pipe.close()
+
+
+def free_port(host=DEFAULT_HOST):
+    """Ask the OS for a TCP port nobody is listening on"""
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class WhisperWorker:
+    """
+    Manages one whisper-server process and sends transcription jobs to it.
+
+    Args:
+        server: Path of the whisper-server binary
+        model: Path of the ggml model to load
+        host, port: Where the server listens (port=None picks a free one)
+        threads: Threads whisper uses per job (-t), None for its default
+        start_timeout: Seconds to wait for the model to load
+        job_timeout: Default seconds one transcription may take
+        max_restarts: Restarts allowed within `restart_window` seconds before giving up
+        restart_window: See max_restarts
+        command: Full command to start the server instead of server/model
+                 (e.g. the fake server in fakes.py); host and port are appended
+        extra_args: More command line arguments for whisper-server
+    """
+
+    def __init__(self, server=WHISPER_SERVER, model=WHISPER_MODEL, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 threads=None, start_timeout=60, job_timeout=120, max_restarts=3, restart_window=300,
+                 command=None, extra_args=()):
+        self.host = host
+        self.port = port or free_port(host)
+        self.start_timeout = start_timeout
+        self.job_timeout = job_timeout
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        if command is None:
+            command = [server, "-m", model, "-nt"]
+            if threads:
+                command += ["-t", str(threads)]
+        self.command = list(command) + ["--host", host, "--port", str(self.port)] + list(extra_args)
+        self.process = None
+        self._stderr = None
+        self._stderr_thread = None
+        self.restarts = []
+        self.jobs = 0
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _http(self):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    def start(self):
+        """Start the server and wait until the model is loaded"""
+        with self._lock:
+            self._start()
+        return self
+
+    def _start(self):
+        logger.info("Starting whisper server: %s", " ".join(self.command))
+        self.process = subprocess.Popen(self.command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        # whisper-server logs to stderr on every job: keep reading it, or the
+        # server blocks once the pipe is full
+        self._stderr = collections.deque(maxlen=STDERR_LINES)
+        self._stderr_thread = threading.Thread(target=_drain, args=(self.process.stderr, self._stderr),
+                                               name="whisper-stderr", daemon=True)
+        self._stderr_thread.start()
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                self._stderr_thread.join(1)
+                error = "\n".join(self._stderr).strip()
+                raise WhisperError(f"whisper server exited with code {self.process.returncode}: {error[-500:]}")
+            if self.healthy(timeout=1):
+                logger.info("Whisper server ready on %s", self.url)
+                return
+            time.sleep(0.1)
+        self._kill()
+        raise WhisperError(f"whisper server did not become ready within {self.start_timeout} s")
+
+    def healthy(self, timeout=2):
+        """True if the server process is up and answers its health check"""
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            response = self._http().get(f"{self.url}/health", timeout=timeout)
+        except Exception:
+            return False
+        return response.status_code == 200
+
+    def _kill(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        # The reader closes the pipe when it reaches the end
+        self._stderr_thread.join(1)
+        self.process = None
+
+    def _restart(self, reason):
+        now = time.monotonic()
+        self.restarts = [t for t in self.restarts if now - t < self.restart_window]
+        if len(self.restarts) >= self.max_restarts:
+            raise WhisperError(f"whisper server restarted {len(self.restarts)} times in "
+                               f"{self.restart_window} s, giving up ({reason})")
+        self.restarts.append(now)
+        logger.warning("Restarting whisper server: %s", reason)
+        self._kill()
+        self._start()
+
+    def ensure_running(self):
+        """Start or restart the server if it isn't answering"""
+        with self._lock:
+            if self.process is None:
+                self._start()
+            elif not self.healthy():
+                self._restart("health check failed")
+
+    def transcribe(self, audio, timeout=None, **params):
+        """
+        Transcribe one recording.
+
+        Args:
+            audio: int16 samples at 16 kHz, WAV bytes, or the path of a WAV file
+            timeout: Seconds the job may take (default: job_timeout)
+            **params: Extra /inference form fields (e.g. temperature, language)
+
+        Returns:
+            str: The transcript
+        """
+        import requests
+
+        if isinstance(audio, str):
+            with open(audio, "rb") as file:
+                data = file.read()
+        elif isinstance(audio, bytes):
+            data = audio
+        else:
+            data = encode_wav(audio, RATE)
+        timeout = timeout or self.job_timeout
+        form = {"response_format": "text", **{key: str(value) for key, value in params.items()}}
+
+        self.ensure_running()
+        for attempt in range(2):
+            try:
+                response = self._http().post(f"{self.url}/inference", data=form,
+                                             files={"file": ("audio.wav", data, "audio/wav")},
+                                             timeout=timeout)
+            except requests.exceptions.Timeout:
+                # A stuck inference would block every later job; start over
+                with self._lock:
+                    self._restart(f"job took longer than {timeout} s")
+                raise WhisperTimeout(f"transcription took longer than {timeout} s")
+            except requests.exceptions.ConnectionError as e:
+                if attempt:
+                    raise WhisperError(f"whisper server unreachable: {e}")
+                with self._lock:
+                    self._restart(f"connection failed: {e}")
+                continue
+            if response.status_code != 200:
+                raise WhisperError(f"whisper server answered {response.status_code}: {response.text[:200]}")
+            self.jobs += 1
+            return response.text
+
+    def stop(self):
+        """Shut the server down"""
+        with self._lock:
+            self._kill()
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class WhisperPool:
+    """
+    A fixed number of WhisperWorkers; each job goes to whichever is idle.
+
+    With one worker this behaves like a plain WhisperWorker. Each server is a
+    separate process with its own copy of the model, so size * threads should
+    not exceed the number of cores.
+
+    Args:
+        size: Number of server processes
+        port: Port of the first server (the others get free ports)
+        **kwargs: Passed on to each WhisperWorker (server, model, threads, ...)
+    """
+
+    def __init__(self, size=1, port=DEFAULT_PORT, **kwargs):
+        self.workers = [WhisperWorker(port=port if index == 0 else None, **kwargs) for index in range(size)]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    @property
+    def size(self):
+        return len(self.workers)
+
+    @property
+    def jobs(self):
+        return sum(worker.jobs for worker in self.workers)
+
+    def start(self):
+        """Start every server, loading the models in parallel"""
+        errors = []
+
+        def start(worker):
+            try:
+                worker.start()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=start, args=(worker,)) for worker in self.workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            self.stop()
+            raise errors[0]
+        return self
+
+    def transcribe(self, audio, timeout=None, **params):
+        """Transcribe one recording on the next idle worker (see WhisperWorker.transcribe)"""
+        worker = self._idle.get()
+        try:
+            return worker.transcribe(audio, timeout=timeout, **params)
+        finally:
+            self._idle.put(worker)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def fake_worker(size=None, **kwargs):
+    """
+    A WhisperWorker running the stand-in server from fakes.py (see fakes.FakeWhisperServer),
+    or a WhisperPool of `size` of them
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fakes.py")
+    options = {key: kwargs.pop(key) for key in ("transcript", "delay", "load_time", "realtime_factor",
+                                                 "words_per_second", "log_bytes") if key in kwargs}
+    command = [sys.executable, script, "whisper-server"]
+    for key, value in options.items():
+        command += [f"--{key.replace('_', '-')}", str(value)]
+    kwargs.setdefault("port", None)
+    if size:
+        return WhisperPool(size, command=command, **kwargs)
+    return WhisperWorker(command=command, **kwargs)